@@ -0,0 +1,193 @@
+"""
+Many schedulers on one backlog at once: per-shift claims under contention (see server.scheduling.claims).
+
+    python -m bench.claims                                # 8 runner processes, 5k shifts, SQLite
+    python -m bench.claims --runners 16 --shifts 20000
+    python -m bench.claims --threads                      # runners as threads of one process (like overlapping jobs)
+    python -m bench.claims --postgres URL                 # ...on a real Postgres (its tables are dropped)
+    python -m bench.claims --pg-standin                   # ...on a throwaway local Postgres (pip install pgserver)
+
+A single greedy job runs first as the reference. Then --runners processes (or threads) each run a greedy job
+over the whole backlog of a fresh copy, all started together. Afterwards the database is checked:
+no shift with two confirmed providers, no provider booked into overlapping shifts, continuity table in step.
+Exits 1 if any check fails.
+"""
+from __future__ import annotations
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy import func, select
+from sqlmodel import Session, SQLModel
+
+from server.db import make_engine
+from server.fixtures import load_fixture
+from server.models import Assignment, FamilyProviderContinuity, Shift
+from server.scheduling.continuity import _aggregate
+from server.scheduling.jobs import Job, run_job
+
+SEED = 1234
+START = datetime(2026, 1, 5)
+SHIFTS_PER_PROVIDER = 10
+
+
+def _seed(url: str, n_shifts: int) -> None:
+    engine = make_engine(url)
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    load_fixture(engine, max(n_shifts // SHIFTS_PER_PROVIDER, 1), n_shifts, seed=SEED, start=START)
+    engine.dispose()
+
+
+def _runner(url: str, name: str, go, out) -> None:
+    engine = make_engine(url)
+    job = Job(id=name, mode="greedy", start=None, end=None)
+    go.wait()
+    t = time.perf_counter()
+    try:
+        with Session(engine, expire_on_commit=False) as session:
+            run_job(job, session)
+        error = None
+    except Exception as exc:
+        error = f"{type(exc).__name__}: {exc}"
+    out.put({"runner": name, "assigned": job.assigned, "lost": job.lost, "considered": job.considered,
+             "seconds": round(time.perf_counter() - t, 2), "error": error})
+    engine.dispose()
+
+
+def _check(url: str) -> Dict[str, int]:
+    engine = make_engine(url)
+    with engine.connect() as conn:
+        double_confirmed = conn.execute(
+            select(func.count()).select_from(
+                select(Assignment.shift_id).where(Assignment.status == "confirmed")
+                .group_by(Assignment.shift_id).having(func.count() > 1).subquery()
+            )
+        ).scalar_one()
+
+        bookings: Dict[int, List[Tuple[datetime, datetime]]] = {}
+        for pid, s, e in conn.execute(
+            select(Assignment.provider_id, Shift.starts, Shift.ends)
+            .join(Shift, Shift.id == Assignment.shift_id).where(Assignment.status != "declined")
+        ).all():
+            bookings.setdefault(pid, []).append((s, e))
+        overlaps = 0
+        for ws in bookings.values():
+            ws.sort()
+            latest_end = None
+            for s, e in ws:
+                if latest_end is not None and s < latest_end:
+                    overlaps += 1
+                latest_end = e if latest_end is None else max(latest_end, e)
+
+        stored = set(conn.execute(select(
+            FamilyProviderContinuity.family_id, FamilyProviderContinuity.provider_id,
+            FamilyProviderContinuity.count, FamilyProviderContinuity.last_seen,
+        )).all())
+        expected = set(conn.execute(_aggregate()).all())
+        confirmed = conn.execute(
+            select(func.count()).select_from(Assignment).where(Assignment.status == "confirmed")
+        ).scalar_one()
+    engine.dispose()
+    return {
+        "confirmed": confirmed,
+        "double_confirmed_shifts": double_confirmed,
+        "overlapping_bookings": overlaps,
+        "continuity_mismatches": len(stored ^ expected),
+    }
+
+
+def _contended(url: str, runners: int, threads: bool) -> dict:
+    if threads:
+        go, out = threading.Event(), queue.Queue()
+        procs = [threading.Thread(target=_runner, args=(url, f"r{i}", go, out)) for i in range(runners)]
+    else:
+        ctx = mp.get_context("spawn")
+        go, out = ctx.Event(), ctx.Queue()
+        procs = [ctx.Process(target=_runner, args=(url, f"r{i}", go, out)) for i in range(runners)]
+    for p in procs:
+        p.start()
+    time.sleep(1.0)  # let every runner import and connect before the start signal
+    t = time.perf_counter()
+    go.set()
+    results = sorted((out.get() for _ in procs), key=lambda r: r["runner"])
+    for p in procs:
+        p.join()
+    return {"wall_s": round(time.perf_counter() - t, 2), "runners": results}
+
+
+def bench_backend(url: str, n_shifts: int, runners: int, threads: bool = False) -> dict:
+    _seed(url, n_shifts)
+    t = time.perf_counter()
+    ctx = mp.get_context("spawn")
+    go, out = ctx.Event(), ctx.Queue()
+    go.set()
+    single = ctx.Process(target=_runner, args=(url, "single", go, out))
+    single.start()
+    reference = out.get()
+    single.join()
+    reference["wall_s"] = round(time.perf_counter() - t, 2)
+
+    _seed(url, n_shifts)
+    contended = _contended(url, runners, threads)
+    contended["assigned"] = sum(r["assigned"] for r in contended["runners"])
+    contended["lost"] = sum(r["lost"] for r in contended["runners"])
+    contended["errors"] = [r["error"] for r in contended["runners"] if r["error"]]
+    return {"reference": reference, "contended": contended, "checks": _check(url)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runners", type=int, default=8)
+    ap.add_argument("--shifts", type=int, default=5000)
+    ap.add_argument("--threads", action="store_true", help="run the runners as threads of this process")
+    ap.add_argument("--postgres", help="postgresql:// URL to include (its tables are dropped and re-created)")
+    ap.add_argument("--pg-standin", action="store_true", help="start a temporary local Postgres via pgserver")
+    ap.add_argument("--skip-sqlite", action="store_true")
+    ap.add_argument("--json", help="also write results to this file")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    backends = {} if args.skip_sqlite else {"sqlite": f"sqlite:///{tmp}/claims.db"}
+    standin = None
+    if args.pg_standin:
+        import pgserver
+        standin = pgserver.get_server(os.path.join(tmp, "pg"))
+        backends["postgres-standin"] = standin.get_uri()
+    if args.postgres:
+        backends["postgres"] = args.postgres
+
+    results, failed = {}, False
+    try:
+        for name, url in backends.items():
+            r = results[name] = bench_backend(url, args.shifts, args.runners, args.threads)
+            ref, con, chk = r["reference"], r["contended"], r["checks"]
+            bad = chk["double_confirmed_shifts"] or chk["overlapping_bookings"] or chk["continuity_mismatches"]
+            failed = failed or bool(bad) or bool(con["errors"])
+            print(f"{name}: 1 runner assigned={ref['assigned']} in {ref['wall_s']}s | "
+                  f"{args.runners} runners assigned={con['assigned']} lost={con['lost']} in {con['wall_s']}s "
+                  f"errors={len(con['errors'])}")
+            print("  per runner: " + ", ".join(f"{x['runner']}={x['assigned']}" for x in con["runners"]))
+            print(f"  checks: {chk}{'  FAILED' if bad else ''}")
+            for err in con["errors"]:
+                print(f"  error: {err}")
+    finally:
+        if standin is not None:
+            standin.cleanup()
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"runners": args.runners, "shifts": args.shifts, "results": results}, fh, indent=2, default=str)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
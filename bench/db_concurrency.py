@@ -0,0 +1,143 @@
+"""
+Concurrent read/write throughput per database backend.
+
+    python -m bench.db_concurrency                       # SQLite: stock engine vs tuned (WAL + busy_timeout)
+    python -m bench.db_concurrency --postgres URL        # ...plus a real Postgres
+    python -m bench.db_concurrency --pg-standin          # ...plus a throwaway local Postgres (pip install pgserver)
+
+Each backend gets the same seeded schema. Reader threads page through shifts, writer threads insert and
+commit one assignment-sized row at a time; the report is ops/s and errors (e.g. "database is locked").
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select, insert
+from sqlmodel import SQLModel
+
+from server.db import make_engine
+from server.models import Family, Provider, Shift, ProviderAvailability
+
+
+def _seed(engine, n_shifts: int = 5000) -> None:
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    rnd = random.Random(42)
+    base = datetime(2026, 1, 5, 8)
+    with engine.begin() as conn:
+        conn.execute(insert(Family), [{"name": f"F{i}", "zip": "98103", "continuity_preference": "flexible"} for i in range(200)])
+        conn.execute(insert(Provider), [{"name": f"P{i}", "home_zip": "98107", "skills": "Nurse", "active": True} for i in range(200)])
+        conn.execute(insert(Shift), [
+            {
+                "family_id": rnd.randint(1, 200),
+                "starts": base + timedelta(hours=rnd.randint(0, 24 * 60)),
+                "ends": base + timedelta(hours=rnd.randint(0, 24 * 60) + 4),
+                "zip": "98103",
+                "required_skills": "Nurse",
+            }
+            for _ in range(n_shifts)
+        ])
+
+
+def _run(engine, readers: int, writers: int, seconds: float) -> dict:
+    stop = time.perf_counter() + seconds
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def reader():
+        rnd = random.Random()
+        n = 0
+        while time.perf_counter() < stop:
+            try:
+                with engine.connect() as conn:
+                    lo = rnd.randint(1, 4900)
+                    conn.execute(select(Shift).where(Shift.id >= lo).order_by(Shift.id).limit(100)).all()
+                n += 1
+            except Exception:
+                with lock:
+                    counts["errors"] += 1
+        with lock:
+            counts["reads"] += n
+
+    def writer():
+        rnd = random.Random()
+        n = 0
+        while time.perf_counter() < stop:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(ProviderAvailability).values(
+                        provider_id=rnd.randint(1, 200), weekday=rnd.randint(0, 6),
+                        start=datetime(2000, 1, 1, 8).time(), end=datetime(2000, 1, 1, 18).time(),
+                    ))
+                n += 1
+            except Exception:
+                with lock:
+                    counts["errors"] += 1
+        with lock:
+            counts["writes"] += n
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    return {
+        "reads_per_s": round(counts["reads"] / elapsed, 1),
+        "writes_per_s": round(counts["writes"] / elapsed, 1),
+        "errors": counts["errors"],
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--readers", type=int, default=8)
+    ap.add_argument("--writers", type=int, default=4)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--postgres", help="postgresql:// URL to include (its tables are dropped and re-created)")
+    ap.add_argument("--pg-standin", action="store_true", help="start a temporary local Postgres via pgserver")
+    ap.add_argument("--json", help="also write results to this file")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    backends = {
+        # what db.py used to build: default pragmas (rollback journal, no busy_timeout)
+        "sqlite-stock": create_engine(f"sqlite:///{tmp}/stock.db", connect_args={"check_same_thread": False, "timeout": 0}),
+        "sqlite-tuned": make_engine(f"sqlite:///{tmp}/tuned.db"),
+    }
+    standin = None
+    if args.pg_standin:
+        import pgserver
+        standin = pgserver.get_server(os.path.join(tmp, "pg"))
+        backends["postgres-standin"] = make_engine(standin.get_uri())
+    if args.postgres:
+        backends["postgres"] = make_engine(args.postgres)
+
+    results = {}
+    try:
+        for name, eng in backends.items():
+            _seed(eng)
+            results[name] = _run(eng, args.readers, args.writers, args.seconds)
+            print(f"{name:18s} reads/s={results[name]['reads_per_s']:>9} "
+                  f"writes/s={results[name]['writes_per_s']:>8} errors={results[name]['errors']}")
+            eng.dispose()
+    finally:
+        if standin is not None:
+            standin.cleanup()
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"readers": args.readers, "writers": args.writers, "seconds": args.seconds,
+                       "results": results}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
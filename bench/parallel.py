@@ -0,0 +1,125 @@
+"""
+mode=parallel scaling: plan time of server.scheduling.parallel against the process count, on a seeded fixture.
+
+    python -m bench.parallel                                  # 100k shifts, 1 2 4 ... up to the core count
+    python -m bench.parallel --shifts 20000 --processes 1 2 4 8
+
+Only planning is timed (the snapshot is loaded beforehand, nothing is written), after a warm-up
+run that starts the worker processes. Each process count is compared with plain greedy on the
+same data: plan time and speedup, fill, total miles, continuity picks, cross-piece conflicts.
+Each plan is also checked: no provider booked into overlapping shifts, and a second run at the
+same process count gives the same picks. Exits 1 if a check fails.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from sqlmodel import Session, SQLModel
+
+from server.db import make_engine
+from server.fixtures import load_fixture
+from server.scheduling import parallel
+from server.scheduling.geo import get_geo
+from server.scheduling.planner import Planned, plan_greedy
+from server.scheduling.snapshot import Snapshot
+
+SEED = 1234
+START = datetime(2026, 1, 5)
+SHIFTS_PER_PROVIDER = 10
+
+
+def _seed(url: str, n_shifts: int) -> None:
+    engine = make_engine(url)
+    SQLModel.metadata.create_all(engine)
+    load_fixture(engine, max(n_shifts // SHIFTS_PER_PROVIDER, 1), n_shifts, seed=SEED, start=START)
+    engine.dispose()
+
+
+def _overlaps(planned: List[Planned]) -> int:
+    windows: Dict[int, List[Tuple[datetime, datetime]]] = {}
+    for pk in planned:
+        windows.setdefault(pk.provider.id, []).append((pk.shift.starts, pk.shift.ends))
+    bad = 0
+    for ws in windows.values():
+        ws.sort()
+        bad += sum(1 for (_, e), (s, _) in zip(ws, ws[1:]) if s < e)
+    return bad
+
+
+def _summary(planned: List[Planned], seconds: float) -> dict:
+    return {
+        "plan_s": round(seconds, 2),
+        "assigned": len(planned),
+        "total_miles": round(sum(pk.miles for pk in planned if pk.miles != float("inf")), 1),
+        "continuity": sum(1 for pk in planned if pk.reason == "continuity"),
+    }
+
+
+def _plan(engine, processes: int) -> Tuple[List[Planned], dict, float]:
+    geo = get_geo()
+    with Session(engine) as session:
+        snap = Snapshot.load(session)
+    geo.precompute(snap.zips())
+    t = time.perf_counter()
+    if processes == 0:
+        planned, stats = plan_greedy(snap.index, snap.shifts.rows(), snap.families, geo), {}
+    else:
+        planned, stats = parallel.plan_parallel(snap, geo, processes)
+    return planned, stats, time.perf_counter() - t
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--shifts", type=int, default=100_000)
+    ap.add_argument("--processes", type=int, nargs="+")
+    ap.add_argument("--json", help="also write results to this file")
+    args = ap.parse_args()
+    cores = os.cpu_count() or 1
+    counts = args.processes or sorted({1, cores} | {2 ** i for i in range(1, cores.bit_length()) if 2 ** i <= cores})
+
+    tmp = tempfile.mkdtemp()
+    url = f"sqlite:///{tmp}/parallel.db"
+    _seed(url, args.shifts)
+    engine = make_engine(url)
+
+    planned, _, seconds = _plan(engine, 0)
+    serial = _summary(planned, seconds)
+    print(f"greedy      {args.shifts} shifts  plan={serial['plan_s']}s  assigned={serial['assigned']} "
+          f"miles={serial['total_miles']} continuity={serial['continuity']}  ({cores} cores)")
+
+    results, failed = {"greedy": serial}, False
+    try:
+        for n in counts:
+            _plan(engine, n)  # warm-up: starts this many workers
+            planned, stats, seconds = _plan(engine, n)
+            again, _, _ = _plan(engine, n)
+            r = results[f"parallel/{n}"] = {**_summary(planned, seconds), **stats}
+            r["speedup"] = round(serial["plan_s"] / seconds, 2) if seconds else None
+            r["overlapping_bookings"] = _overlaps(planned)
+            r["deterministic"] = [(pk.shift.id, pk.provider.id) for pk in planned] == [
+                (pk.shift.id, pk.provider.id) for pk in again
+            ]
+            bad = r["overlapping_bookings"] or not r["deterministic"]
+            failed = failed or bool(bad)
+            print(f"parallel/{n:<3} pieces={r['pieces']:<3} plan={r['plan_s']}s speedup={r['speedup']}x "
+                  f"assigned={r['assigned']} miles={r['total_miles']} continuity={r['continuity']} "
+                  f"conflicts={r['conflicts']} overlaps={r['overlapping_bookings']} "
+                  f"deterministic={r['deterministic']}{'  FAILED' if bad else ''}")
+    finally:
+        parallel.shutdown()
+        engine.dispose()
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"shifts": args.shifts, "cores": cores, "results": results}, indent=2) + "\n")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+run_scheduler at production scale, on seeded fixture datasets (server.fixtures).
+
+    python -m bench.scheduler                              # 1k, 10k, 100k shifts; compare to the baseline
+    python -m bench.scheduler --sizes 1000 10000 --save    # (re)record the baseline for those sizes
+    python -m bench.scheduler --mode optimal --sizes 1000
+
+Per size: end-to-end time of the real /schedule/run handler, a per-phase breakdown
+(load, distance, eligibility, commit), SQL statements issued and peak traced memory, plus the build
+time of the run's input snapshot and the memory its shifts hold per 100k, next to the same shifts as
+ORM instances (see server.scheduling.snapshot).
+Timings are the best of --repeat runs (1 at 100k shifts and up), each on a fresh copy of the dataset;
+the phase runs go first and double as warm-up for the ZIP matrix and the page cache.
+Exits 1 when any metric is more than --tolerance (default 10%) worse than the baseline file.
+"""
+from __future__ import annotations
+import argparse
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict
+
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, select
+
+from server.db import make_engine
+from server.fixtures import load_fixture
+from server.models import Shift
+from server.routers.schedule import run_scheduler
+from server.scheduling.geo import get_geo
+from server.scheduling.planner import plan_greedy, write_plan
+from server.scheduling.snapshot import ShiftColumns, Snapshot
+
+SIZES = (1_000, 10_000, 100_000)
+SHIFTS_PER_PROVIDER = 10
+SEED = 1234
+START = datetime(2026, 1, 5)
+BASELINE = Path(__file__).with_name("scheduler_baseline.json")
+TOLERANCE = 0.10
+MIN_MS_DELTA = 5.0  # ignore timing changes smaller than this; tiny phases are all noise
+SINGLE_RUN_FROM = 100_000  # sizes this large are timed once
+
+
+def _build(path: Path, n_shifts: int) -> None:
+    engine = make_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    load_fixture(engine, max(n_shifts // SHIFTS_PER_PROVIDER, 1), n_shifts, seed=SEED, start=START)
+    engine.dispose()  # checkpoints the WAL so the file can be copied as-is
+
+
+class _Queries:
+    def __init__(self, engine):
+        self.n = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.n += 1
+
+
+def _end_to_end(engine, mode: str) -> dict:
+    with Session(engine) as session:
+        return run_scheduler(mode=mode, start=None, end=None, firm_until=None, session=session)
+
+
+def _phases(engine) -> Dict[str, float]:
+    #the greedy path of run_scheduler with a stopwatch between steps; keep in step with the handler
+    geo = get_geo()
+    spent = {"distance": 0.0}
+
+    def timed(fn: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            t = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                spent["distance"] += time.perf_counter() - t
+        return wrapper
+
+    out = {}
+    with Session(engine) as session:
+        t = time.perf_counter()
+        snap = Snapshot.load(session)
+        out["load"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        geo.precompute(snap.zips())
+        precompute = time.perf_counter() - t
+
+        # per-shift distance lookups are timed in place; what's left of planning is eligibility filtering
+        geo.distance, geo.distances_from = timed(geo.distance), timed(geo.distances_from)
+        try:
+            t = time.perf_counter()
+            planned = plan_greedy(snap.index, snap.shifts.rows(), snap.families, geo)
+            plan = time.perf_counter() - t
+        finally:
+            del geo.distance, geo.distances_from
+        out["distance"] = precompute + spent["distance"]
+        out["eligibility"] = plan - spent["distance"]
+
+        t = time.perf_counter()
+        write_plan(session, planned)
+        out["commit"] = time.perf_counter() - t
+    return {k: round(v * 1000, 1) for k, v in out.items()}
+
+
+def _snapshot(engine, n_shifts: int) -> Dict[str, float]:
+    """
+    The run's inputs on their own: Snapshot.load() time, and the memory its shifts keep, against the
+    same shifts loaded as ORM instances (traced bytes still held after loading, scaled to 100k shifts).
+    """
+    with Session(engine) as session:
+        t = time.perf_counter()
+        Snapshot.load(session)
+        build_ms = (time.perf_counter() - t) * 1000
+
+    def held(load: Callable) -> float:
+        with Session(engine) as session:
+            tracemalloc.start()
+            kept = load(session)
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del kept
+        return size / n_shifts * 100_000 / 2**20
+
+    return {
+        "snapshot_build_ms": round(build_ms, 1),
+        "snapshot_mb_per_100k": round(held(ShiftColumns.load), 1),
+        "orm_mb_per_100k": round(held(lambda session: session.exec(select(Shift)).all()), 1),
+    }
+
+
+def bench_size(n_shifts: int, mode: str, repeat: int, workdir: Path) -> dict:
+    template = workdir / f"fixture_{n_shifts}.db"
+    t = time.perf_counter()
+    _build(template, n_shifts)
+    build_s = time.perf_counter() - t
+
+    def fresh():
+        db = workdir / "run.db"
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{db}{suffix}").unlink(missing_ok=True)
+        shutil.copy(template, db)
+        return make_engine(f"sqlite:///{db}")
+
+    if n_shifts >= SINGLE_RUN_FROM:
+        repeat = 1
+
+    phase_runs = []
+    if mode == "greedy":
+        for _ in range(repeat):
+            eng = fresh()
+            phase_runs.append(_phases(eng))
+            eng.dispose()
+
+    runs, queries, result = [], 0, {}
+    for _ in range(repeat):
+        eng = fresh()
+        q = _Queries(eng)
+        t = time.perf_counter()
+        result = _end_to_end(eng, mode)
+        runs.append((time.perf_counter() - t) * 1000)
+        queries = q.n
+        eng.dispose()
+
+    eng = fresh()
+    inputs = _snapshot(eng, n_shifts)
+    eng.dispose()
+
+    eng = fresh()
+    tracemalloc.start()
+    _end_to_end(eng, mode)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    eng.dispose()
+
+    out = {
+        "shifts": n_shifts,
+        "providers": max(n_shifts // SHIFTS_PER_PROVIDER, 1),
+        "assigned": result.get("assigned"),
+        "end_to_end_ms": round(min(runs), 1),
+        "queries": queries,
+        "peak_mb": round(peak / 2**20, 1),
+        "fixture_build_s": round(build_s, 1),
+        **inputs,
+    }
+    if phase_runs:
+        out["phases_ms"] = {k: round(min(r[k] for r in phase_runs), 1) for k in phase_runs[0]}
+    return out
+
+
+def _metrics(r: dict) -> Dict[str, float]:
+    m = {"end_to_end_ms": r["end_to_end_ms"], "queries": r["queries"], "peak_mb": r["peak_mb"]}
+    m.update({k: r[k] for k in ("snapshot_build_ms", "snapshot_mb_per_100k") if k in r})
+    m.update({f"phases_ms.{k}": v for k, v in r.get("phases_ms", {}).items()})
+    return m
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list:
+    """[(size, metric, old, new)] for every metric worse than old * (1 + tolerance)."""
+    regressions = []
+    for size, cur in current.items():
+        old = baseline.get(size)
+        if old is None or old.get("assigned") != cur.get("assigned"):
+            continue  # different dataset or plan, so not comparable (the assigned count is printed anyway)
+        old_m, cur_m = _metrics(old), _metrics(cur)
+        for name, new in cur_m.items():
+            before = old_m.get(name)
+            if before is None:
+                continue
+            if "_ms" in name and new - before < MIN_MS_DELTA:
+                continue
+            if new > before * (1 + tolerance):
+                regressions.append((size, name, before, new))
+    return regressions
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    ap.add_argument("--mode", choices=["greedy", "optimal"], default="greedy")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--baseline", type=Path, default=BASELINE)
+    ap.add_argument("--tolerance", type=float, default=TOLERANCE)
+    ap.add_argument("--save", action="store_true", help="write these results into the baseline file")
+    ap.add_argument("--json", type=Path, help="also write this run's results here")
+    args = ap.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            r = bench_size(n, args.mode, args.repeat, Path(tmp))
+            results[f"{args.mode}/{n}"] = r
+            phases = " ".join(f"{k}={v}" for k, v in r.get("phases_ms", {}).items())
+            print(f"{args.mode:7s} {n:>7} shifts  {r['end_to_end_ms']:>9.1f} ms  queries={r['queries']:<6} "
+                  f"peak={r['peak_mb']}MB  assigned={r['assigned']}  {phases}")
+            print(f"{'':7s} {'':>7}         snapshot build={r['snapshot_build_ms']} ms  shifts held per 100k: "
+                  f"snapshot={r['snapshot_mb_per_100k']}MB orm={r['orm_mb_per_100k']}MB")
+
+    meta = {"python": platform.python_version(), "machine": platform.machine(), "recorded": datetime.now().isoformat(timespec="seconds")}
+    if args.json:
+        args.json.write_text(json.dumps({"meta": meta, "results": results}, indent=2) + "\n")
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {"results": {}}
+    if args.save:
+        baseline["meta"] = meta
+        baseline["results"].update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return
+
+    regressions = compare(baseline["results"], results, args.tolerance)
+    for size, name, before, new in regressions:
+        print(f"REGRESSION {size} {name}: {before} -> {new} (+{(new / before - 1) * 100:.0f}%)")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
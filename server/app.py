@@ -1,19 +1,33 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 from server.db import init_db
 from fastapi.middleware.cors import CORSMiddleware
 
-from server.db import init_db
+from server.db import init_db, engine
+from server.scheduling.geo import get_geo
+from server.scheduling.warm import warm_index
+from server.scheduling import skills, continuity, parallel
+from server.scheduling.jobs import scheduler_jobs
+from server import metrics
+from sqlmodel import Session
 from server.routers import providers, shifts, assignments, schedule, availabilities, ai, families
 
 import os
 from dotenv import load_dotenv
-load_dotenv #to implement OpenAI LLM
+load_dotenv() #to implement OpenAI LLM
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db() #Init app backend on run
+    get_geo() #Load the ZIP centroid table once, before the first request needs it
+    with Session(engine) as session:
+        skills.backfill(session) #Fill provider_skill for databases that predate it
+        continuity.backfill(session) #Same for family_provider_continuity
+        warm_index.get(session) #Warm the urgent-cover index so the first call doesn't pay for the load
     yield #performs garbage collection on shutdown
+    scheduler_jobs.shutdown() #stop background scheduler jobs at their next shift; committed batches stay
+    parallel.shutdown() #worker processes of mode=parallel runs, if any were started
 
 app = FastAPI(lifespan=lifespan) #on_startup: init_db()
 
@@ -21,6 +35,13 @@ app = FastAPI(lifespan=lifespan) #on_startup: init_db()
 def root():
     return {"message": "Your API is now live"}
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    #Prometheus text exposition; scrape this
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+app.add_middleware(metrics.MetricsMiddleware) #per-route latency + SQL per request; slow requests logged with their queries
+
 app.add_middleware(
     CORSMiddleware, 
     allow_origins=["http://localhost:5173"], 
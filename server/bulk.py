@@ -0,0 +1,158 @@
+import asyncio
+import csv
+import json
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.engine import Connection
+
+from server.db import engine
+
+#Shared by /providers/bulk, /families/bulk and /shifts/bulk. The body may be
+# application/json          [{...}, ...] or {"items": [...]}
+# application/x-ndjson      one JSON object per line, read as it streams in
+# text/csv                  header row + one record per line (no newlines inside quoted fields)
+# Each record goes through the same pydantic model as the single-row POST; bad rows are reported by
+# position (0-based, header excluded) and skipped. Good rows are written BATCH_SIZE at a time with one
+# executemany INSERT ... RETURNING id per batch, each batch in its own transaction.
+BATCH_SIZE = 5000
+MAX_ERRORS = 1000  # errors listed in the response; "failed" still counts all of them
+
+Row = Tuple[int, dict]  # (position in the input, column values)
+Check = Callable[[Connection, List[Row]], Dict[int, str]]
+AfterInsert = Callable[[Connection, List[int], List[dict]], None]
+
+
+async def _lines(request: Request) -> AsyncIterator[List[str]]:
+    #complete lines, one list per received chunk
+    buf = b""
+    async for chunk in request.stream():
+        *complete, buf = (buf + chunk).split(b"\n")
+        if complete:
+            yield [line.decode("utf-8-sig").rstrip("\r") for line in complete]
+    if buf:
+        yield [buf.decode("utf-8-sig").rstrip("\r")]
+
+
+async def records(request: Request) -> AsyncIterator[object]:
+    """
+    Yields one record per input row: a dict, a raw JSON string (NDJSON lines go straight to
+    model_validate_json), or the exception for a row that couldn't be decoded.
+    """
+    ctype = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+    if ctype in ("application/x-ndjson", "application/jsonl", "application/x-jsonlines"):
+        async for lines in _lines(request):
+            for line in lines:
+                if line.strip():
+                    yield line
+    elif ctype in ("text/csv", "application/csv"):
+        header = None
+        async for lines in _lines(request):
+            for values in csv.reader(line for line in lines if line.strip()):
+                if header is None:
+                    header = [h.strip() for h in values]
+                elif len(values) != len(header):
+                    yield ValueError(f"expected {len(header)} columns, got {len(values)}")
+                else:
+                    #empty cells fall back to the model's defaults
+                    yield {h: v for h, v in zip(header, values) if v != ""}
+    else:
+        try:
+            body = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body is not valid JSON")
+        if isinstance(body, dict):
+            body = body.get("items")
+        if not isinstance(body, list):
+            raise HTTPException(status_code=400, detail='Expected a JSON array or {"items": [...]}')
+        for rec in body:
+            yield rec
+
+
+def _describe(exc: Exception) -> str:
+    if isinstance(exc, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in exc.errors())
+    return str(exc)
+
+
+def insert_returning_ids(conn: Connection, table, rows: List[dict]) -> List[int]:
+    """
+    One executemany INSERT ... RETURNING id; the new ids come back in the order of rows.
+    A single INSERT hands out its ids in VALUES order (SQLite rowids, Postgres serials), so sorting restores
+    input order; sort_by_parameter_order=True would guarantee it too but halves throughput.
+    """
+    return sorted(conn.execute(insert(table).returning(table.id), rows).scalars())
+
+
+def _flush(
+    table, batch: List[Row], check: Optional[Check], after_insert: Optional[AfterInsert]
+) -> Tuple[List[int], Dict[int, str]]:
+    #runs in a worker thread; returns (new ids in input order, {row: error} for rows check() rejected)
+    bad: Dict[int, str] = {}
+    with engine.begin() as conn:
+        if check is not None:
+            bad = check(conn, batch)
+            batch = [r for r in batch if r[0] not in bad]
+        if not batch:
+            return [], bad
+        values = [v for _, v in batch]
+        ids = insert_returning_ids(conn, table, values)
+        if after_insert is not None:
+            after_insert(conn, ids, values)
+    return ids, bad
+
+
+async def import_rows(
+    request: Request,
+    model: Type[BaseModel],
+    table,
+    prepare: Callable[[BaseModel], dict],
+    check: Optional[Check] = None,
+    after_insert: Optional[AfterInsert] = None,
+) -> dict:
+    """
+    Validate every record with model, turn it into column values with prepare (which may raise ValueError
+    for cross-field rules), drop rows check() rejects, and insert the rest.
+    While one batch is being written in a worker thread the next one is parsed and validated.
+    Returns {"inserted", "failed", "errors": [{"row", "error"}], "ids"} with ids in input order.
+    """
+    failed: Dict[int, str] = {}
+    ids: List[int] = []
+    writing: Optional[asyncio.Future] = None
+
+    async def collect():
+        new_ids, bad = await writing
+        ids.extend(new_ids)
+        failed.update(bad)
+
+    batch: List[Row] = []
+    row = -1
+    async for rec in records(request):
+        row += 1
+        try:
+            if isinstance(rec, Exception):
+                raise rec
+            obj = model.model_validate_json(rec) if isinstance(rec, str) else model.model_validate(rec)
+            batch.append((row, prepare(obj)))
+        except (ValidationError, ValueError, TypeError) as e:
+            failed[row] = _describe(e)
+        if len(batch) >= BATCH_SIZE:
+            if writing is not None:
+                await collect()
+            writing = asyncio.ensure_future(run_in_threadpool(_flush, table, batch, check, after_insert))
+            batch = []
+    if writing is not None:
+        await collect()
+    if batch:
+        writing = asyncio.ensure_future(run_in_threadpool(_flush, table, batch, check, after_insert))
+        await collect()
+
+    return {
+        "inserted": len(ids),
+        "failed": len(failed),
+        "errors": [{"row": r, "error": failed[r]} for r in sorted(failed)[:MAX_ERRORS]],
+        "ids": ids,
+    }
@@ -0,0 +1,130 @@
+"""
+Conditional GETs and a response cache for the list endpoints (wired into pagination.PageParams.respond).
+
+- Every table has a write version. track_writes() watches each engine's INSERT/UPDATE/DELETE statements
+  and bumps the versions of the tables a connection wrote when it goes back to the pool, i.e. once its
+  transaction has committed (a rollback bumps too, which only costs a miss). Core bulk writes count.
+- A list response's ETag hashes the route, its query string and the versions of the tables its query reads,
+  read before the query runs. If-None-Match with the current ETag gets a 304 without touching the database.
+- Serialized bodies sit in a byte-bounded LRU keyed by that ETag, so polling an unchanged table is a dict
+  lookup. Entries for old versions are never asked for again and age out.
+
+Process-local, like the warm index: a restart starts a new ETag epoch, and writes made by another process
+aren't seen. Run a single worker, or set RESPONSE_CACHE_MB=0 to turn ETags and the cache off.
+"""
+from __future__ import annotations
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.sql.util import find_tables
+
+RESPONSE_CACHE_MB = float(os.getenv("RESPONSE_CACHE_MB", "64"))
+MAX_ENTRY_SHARE = 0.125  # bodies bigger than this share of the budget are served but not kept
+
+EPOCH = uuid.uuid4().hex[:8]
+
+_versions: Dict[str, int] = {}
+_versions_lock = threading.Lock()
+
+
+def bump(tables: Iterable[str]) -> None:
+    with _versions_lock:
+        for t in tables:
+            _versions[t] = _versions.get(t, 0) + 1
+
+
+def versions(tables: Iterable[str]) -> Tuple[Tuple[str, int], ...]:
+    with _versions_lock:
+        return tuple((t, _versions.get(t, 0)) for t in sorted(set(tables)))
+
+
+# ---- write tracking ----
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is None or not (context.isinsert or context.isupdate or context.isdelete):
+        return
+    table = getattr(getattr(context.compiled, "statement", None), "table", None)
+    name = getattr(table, "name", None)
+    if name:
+        conn.info.setdefault("written_tables", set()).add(name)
+
+
+def _checkin(dbapi_connection, connection_record):
+    #after commit/rollback: only now can a reader see the new rows, so only now move the version
+    tables = connection_record.info.pop("written_tables", None)
+    if tables:
+        bump(tables)
+
+
+def track_writes(engine) -> None:
+    #works for sync engines and for AsyncEngine.sync_engine
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine.pool, "checkin", _checkin)
+
+
+# ---- serialized responses ----
+
+class ResponseCache:
+    """LRU of ETag -> (body, extra headers), bounded by total body bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, Tuple[bytes, Dict[str, str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, etag: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None:
+                self._entries.move_to_end(etag)
+            return entry
+
+    def put(self, etag: str, body: bytes, headers: Dict[str, str]) -> None:
+        if len(body) > self.max_bytes * MAX_ENTRY_SHARE:
+            return
+        with self._lock:
+            old = self._entries.pop(etag, None)
+            if old is not None:
+                self.size -= len(old[0])
+            self._entries[etag] = (body, headers)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (dropped, _) = self._entries.popitem(last=False)
+                self.size -= len(dropped)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+response_cache = ResponseCache(int(RESPONSE_CACHE_MB * 2**20))
+
+
+def etag_for(request: Request, stmt) -> Optional[str]:
+    #None when caching is off
+    if not response_cache.enabled:
+        return None
+    query = sorted(request.query_params.multi_items())
+    seen = versions(t.name for t in find_tables(stmt))
+    digest = hashlib.sha1(repr((EPOCH, request.url.path, query, seen)).encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return etag in tags or "*" in tags
@@ -0,0 +1,225 @@
+"""
+Synthetic datasets for load tests, hardware sizing and scheduler regression runs.
+
+    python -m server.fixtures --providers 100000 --shifts 1000000 --seed 42
+    POST /ai/fixtures {"n_providers": 100000, "n_shifts": 1000000, "seed": 42}
+
+The same seed, sizes and start produce the same rows. Rows are generated lazily and written
+BATCH_SIZE at a time with Core executemany, so memory stays flat at any size.
+"""
+from __future__ import annotations
+import argparse
+import bisect
+import itertools
+import math
+import random
+import time
+from datetime import datetime, time as dtime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlmodel import SQLModel
+
+from server.bulk import insert_returning_ids
+from server.models import Family, Provider, ProviderAvailability, Shift
+from server.scheduling.geo import ZipGeo, get_geo
+from server.scheduling.skills import sync_provider_skills
+
+FIRST_NAMES = ["Ava","Maya","Elena","Noah","Lucas","Olivia","Leo","Zoe","Mila","Ethan"]
+LAST_NAMES = ["Chen","Garcia","Johnson","Singh","Patel","Nguyen","Lee","Martinez","Brown","Wilson"]
+FAMILY_FIRST = ["River","Sky","Rowan","Harper","Kai","Ari","Sage","Phoenix","Taylor","Quinn"]
+FAMILY_LAST = ["Nguyen","Johnson","Garcia","Patel","Lee","Brown","Martinez","Wilson","Chen","Singh"]
+SKILLS_POOL = ["Doula","Nurse","Lactation Consultant"]
+CONTINUITY_PREFS = ["consistent", "flexible"]
+
+BATCH_SIZE = 10_000
+SHIFTS_PER_FAMILY = 25  # default family count is n_shifts / this
+FAMILY_ZIP_SHARE = 0.85  # the rest of a family's shifts are elsewhere (grandparents, hospital, ...)
+
+# Weekly patterns providers are drawn from: (weight, weekdays or number of random days, windows)
+AVAILABILITY_PATTERNS: List[Tuple[float, object, List[Tuple[str, str]]]] = [
+    (0.35, (0, 1, 2, 3, 4), [("07:00", "15:00")]),                  # weekday days
+    (0.15, (0, 1, 2, 3, 4), [("15:00", "23:00")]),                  # weekday evenings
+    (0.10, (5, 6), [("08:00", "20:00")]),                           # weekends
+    (0.25, 3, [("09:00", "17:00")]),                                # part time, 3 days
+    (0.15, 4, [("06:00", "10:00"), ("16:00", "22:00")]),            # split shifts, 4 days
+]
+
+
+# ---- row generators (also behind /ai/autogen's local fallback) ----
+
+def fake_providers(n: int, pick_zip: Callable[[], str], rnd=random) -> Iterator[dict]:
+    for _ in range(n):
+        name = f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}"
+        home_zip = pick_zip()
+        sk = rnd.sample(SKILLS_POOL, k=rnd.choice([1, 2]))  # 1–2 skills
+        yield {
+            "name": name,
+            "home_zip": home_zip,
+            "skills": ", ".join(sk),
+            "active": True,
+        }
+
+
+def fake_shifts(n: int, start: datetime, end: datetime, pick_zip: Callable[[], str], rnd=random) -> Iterator[dict]:
+    #within the window, starting 06:00-20:00, durations 4–12h
+    total_days = max((end - start).days, 1)
+    for _ in range(n):
+        day_offset = rnd.randint(0, total_days)
+        shift_start = (start + timedelta(days=day_offset, hours=rnd.randint(6, 20))).replace(minute=0, second=0)
+        hours = rnd.choice([4, 6, 8, 10, 12])
+        yield {
+            "starts": shift_start,
+            "ends": shift_start + timedelta(hours=hours),
+            "zip": pick_zip(),
+            "required_skills": rnd.choice(SKILLS_POOL),
+        }
+
+
+def fake_families(n: int, pick_zip: Callable[[], str], rnd=random) -> Iterator[dict]:
+    for _ in range(n):
+        yield {
+            "name": f"{rnd.choice(FAMILY_FIRST)} {rnd.choice(FAMILY_LAST)}",
+            "zip": pick_zip(),
+            "continuity_preference": rnd.choice(CONTINUITY_PREFS),
+        }
+
+
+_PATTERN_CUM = list(itertools.accumulate(w for w, _, _ in AVAILABILITY_PATTERNS))
+_HHMM = {s: datetime.strptime(s, "%H:%M").time() for _, _, ws in AVAILABILITY_PATTERNS for w in ws for s in w}
+
+
+def fake_week(rnd=random) -> List[Tuple[int, dtime, dtime]]:
+    #one provider's weekly pattern as (weekday, start, end) windows
+    _, days, windows = AVAILABILITY_PATTERNS[bisect.bisect(_PATTERN_CUM, rnd.random() * _PATTERN_CUM[-1])]
+    if isinstance(days, int):
+        days = sorted(rnd.sample(range(7), k=days))
+    return [(d, _HHMM[s], _HHMM[e]) for d in days for s, e in windows]
+
+
+class ZipClusters:
+    """
+    Weighted ZIP picker: a few seeded hub ZIPs get most of the rows and the weight falls off with
+    distance from the nearest hub, like real caseloads bunching in a handful of neighborhoods.
+    """
+
+    def __init__(self, zips: Sequence[str], geo: ZipGeo, rnd: random.Random, hubs: int = 6, scale_miles: float = 4.0):
+        self.zips = list(zips)
+        self.rnd = rnd
+        centers = rnd.sample(self.zips, k=min(hubs, len(self.zips)))
+        nearest = None
+        for c in centers:
+            d = geo.distances_from(c, self.zips)
+            nearest = d if nearest is None else np.minimum(nearest, d)
+        weights = [math.exp(-(m if math.isfinite(m) else 100.0) / scale_miles) + 0.02 for m in nearest]
+        self.cum = list(itertools.accumulate(weights))
+
+    def pick(self) -> str:
+        return self.zips[bisect.bisect(self.cum, self.rnd.random() * self.cum[-1])]
+
+
+def area_zips(geo: ZipGeo, center: str = "98101", radius_miles: float = 30.0) -> List[str]:
+    #every known ZIP within radius of center (default: Greater Seattle)
+    d = geo.distances_from(center, geo.zips)
+    return sorted(z for z, m in zip(geo.zips, d) if m <= radius_miles)
+
+
+def next_monday(now: Optional[datetime] = None) -> datetime:
+    now = now or datetime.now()
+    return (now + timedelta(days=7 - now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+# ---- loader ----
+
+def _batches(rows: Iterator[dict], size: int = BATCH_SIZE) -> Iterator[List[dict]]:
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def load_fixture(
+    engine,
+    n_providers: int,
+    n_shifts: int,
+    n_families: Optional[int] = None,
+    seed: int = 0,
+    start: Optional[datetime] = None,
+    days: int = 28,
+    zip_pool: Optional[Sequence[str]] = None,
+) -> Dict[str, float]:
+    """
+    Generate and insert families, providers (+ skills + weekly availability) and shifts, one transaction per batch.
+    Returns row counts and elapsed seconds. Without start the window begins next Monday, so only the dates move
+    between runs on different days.
+    """
+    t0 = time.perf_counter()
+    rnd = random.Random(seed)
+    geo = get_geo()
+    clusters = ZipClusters(zip_pool or area_zips(geo), geo, rnd)
+    start = start or next_monday()
+    end = start + timedelta(days=days)
+    n_families = n_families if n_families is not None else max(8, n_shifts // SHIFTS_PER_FAMILY)
+    counts = {"families": 0, "providers": 0, "availability": 0, "shifts": 0}
+
+    family_ids: List[int] = []
+    family_zips: List[str] = []
+    for batch in _batches(fake_families(n_families, clusters.pick, rnd)):
+        with engine.begin() as conn:
+            family_ids += insert_returning_ids(conn, Family, batch)
+        family_zips += [f["zip"] for f in batch]
+    counts["families"] = len(family_ids)
+
+    for batch in _batches(fake_providers(n_providers, clusters.pick, rnd)):
+        with engine.begin() as conn:
+            ids = insert_returning_ids(conn, Provider, batch)
+            sync_provider_skills(conn, {pid: p["skills"] for pid, p in zip(ids, batch)})
+            avail = [
+                {"provider_id": pid, "weekday": wd, "start": s, "end": e}
+                for pid in ids for wd, s, e in fake_week(rnd)
+            ]
+            if avail:
+                conn.execute(ProviderAvailability.__table__.insert(), avail)
+        counts["providers"] += len(ids)
+        counts["availability"] += len(avail)
+
+    if family_ids:
+        for batch in _batches(fake_shifts(n_shifts, start, end, clusters.pick, rnd)):
+            for sh in batch:
+                i = rnd.randrange(len(family_ids))
+                sh["family_id"] = family_ids[i]
+                if rnd.random() < FAMILY_ZIP_SHARE:
+                    sh["zip"] = family_zips[i]
+            with engine.begin() as conn:
+                conn.execute(Shift.__table__.insert(), batch)
+            counts["shifts"] += len(batch)
+
+    counts["seconds"] = round(time.perf_counter() - t0, 2)
+    return counts
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--providers", type=int, default=1000)
+    ap.add_argument("--shifts", type=int, default=10000)
+    ap.add_argument("--families", type=int, help=f"default: shifts / {SHIFTS_PER_FAMILY}")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--start", type=datetime.fromisoformat, help="window start, e.g. 2026-01-05 (default: next Monday)")
+    ap.add_argument("--days", type=int, default=28)
+    ap.add_argument("--database-url", help="load into this database instead of DATABASE_URL")
+    args = ap.parse_args()
+
+    if args.database_url:
+        from server.db import make_engine
+        engine = make_engine(args.database_url)
+        SQLModel.metadata.create_all(engine)
+    else:
+        from server.db import engine, init_db
+        init_db()
+    counts = load_fixture(engine, args.providers, args.shifts, args.families, args.seed, args.start, args.days)
+    print(" ".join(f"{k}={v}" for k, v in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+In-process metrics, exposed in Prometheus text format on GET /metrics.
+
+- MetricsMiddleware: per-route latency histogram, plus SQL statements and SQL time per request
+- instrument_engine(): SQLAlchemy cursor events feed the per-request and process-wide SQL counters
+- Requests slower than SLOW_REQUEST_MS (default 500) are logged with their statements,
+  repeated ones collapsed ("120x SELECT ...") so N+1 loops stand out
+
+Deliberately dependency-free: a few counters and histograms don't need prometheus_client.
+"""
+from __future__ import annotations
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+log = logging.getLogger("server.metrics")
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+MAX_LOGGED_STATEMENTS = 200  # per request; past this only the counters keep going
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+_registry: List["_Metric"] = []
+
+
+def _labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return super().render() + [f"{self.name}{_labels(self.labelnames, k)} {v:g}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (+Inf last), sum]
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[i] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s[0])) for k, (c, s) in self._values.items())
+        lines = super().render()
+        for key, (counts, total) in items:
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total:g}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {running}")
+        return lines
+
+
+def render() -> str:
+    return "\n".join(line for m in _registry for line in m.render()) + "\n"
+
+
+# ---- the app's metrics ----
+
+http_requests = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_latency = Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+http_sql_queries = Histogram(
+    "http_request_sql_queries", "SQL statements issued per request.", ("method", "route"), buckets=COUNT_BUCKETS
+)
+http_sql_seconds = Histogram("http_request_sql_seconds", "Time spent in SQL per request.", ("method", "route"))
+sql_queries = Counter("sql_queries_total", "SQL statements executed (in or out of a request).")
+sql_seconds = Counter("sql_seconds_total", "Time spent executing SQL statements.")
+zip_distance_lookups = Counter(
+    "zip_distance_lookups_total",
+    "ZIP distance lookups; hit = served from the precomputed matrix, miss = computed on the fly.",
+    ("call", "result"),
+)
+response_cache_requests = Counter(
+    "response_cache_requests_total", "List responses by cache outcome (hit, miss, not_modified).", ("result",)
+)
+llm_requests = Counter("llm_requests_total", "LLM generation calls by outcome (ok, cached, error, timeout).", ("result",))
+scheduler_phase_seconds = Histogram("scheduler_phase_seconds", "Time per phase of a scheduler run.", ("mode", "phase"))
+
+
+# ---- per-request SQL accounting ----
+
+class RequestStats:
+    __slots__ = ("queries", "sql_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.statements: List[Tuple[str, float]] = []
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_t0", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get("metrics_t0")
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    sql_queries.inc()
+    sql_seconds.inc(elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += elapsed
+        if len(stats.statements) < MAX_LOGGED_STATEMENTS:
+            stats.statements.append((statement, elapsed))
+
+
+def _handle_error(ctx):
+    #a failed statement never reaches after_cursor_execute; drop its start time
+    stack = ctx.connection.info.get("metrics_t0") if ctx.connection is not None else None
+    if stack:
+        stack.pop()
+
+
+def instrument_engine(engine) -> None:
+    #works for sync engines and for AsyncEngine.sync_engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def _summarize(statements: List[Tuple[str, float]]) -> str:
+    tally = _Tally()
+    spent: Dict[str, float] = {}
+    for sql, secs in statements:
+        key = " ".join(sql.split())
+        tally[key] += 1
+        spent[key] = spent.get(key, 0.0) + secs
+    return "\n".join(
+        f"  {n}x {spent[sql] * 1000:.1f}ms  {sql[:300]}" for sql, n in tally.most_common()
+    )
+
+
+class MetricsMiddleware:
+    """Pure ASGI so streaming responses are timed to their last byte."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        t = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"  # template, not the raw path
+            method = scope["method"]
+            http_requests.inc(method=method, route=route, status=str(status["code"]))
+            http_latency.observe(elapsed, method=method, route=route)
+            http_sql_queries.observe(stats.queries, method=method, route=route)
+            http_sql_seconds.observe(stats.sql_seconds, method=method, route=route)
+            if elapsed * 1000 >= SLOW_REQUEST_MS:
+                log.warning(
+                    "slow request %s %s: %.0fms, %d SQL statements (%.0fms)\n%s",
+                    method, scope.get("path"), elapsed * 1000, stats.queries, stats.sql_seconds * 1000,
+                    _summarize(stats.statements),
+                )
@@ -33,6 +33,16 @@ class Provider(SQLModel, table=True):
     skills: str #doulas, nurses, lactation specialists - comma seperated
     active: bool = True
 
+#Canonical skill vocabulary ("doula", "nurse", "lactation consultant", ...) and which providers have which.
+# Kept in sync with Provider.skills by server.scheduling.skills; serves skill lookups without parsing strings.
+class Skill(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(unique=True)
+
+class ProviderSkill(SQLModel, table=True):
+    provider_id: int = Field(foreign_key="provider.id", primary_key=True)
+    skill_id: int = Field(foreign_key="skill.id", primary_key=True)
+
 class ProviderAvailability(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     provider_id: int = Field(foreign_key="provider.id")
@@ -57,20 +67,34 @@ class Shift(SQLModel, table=True):
     ends: datetime #end time
     zip: str #location of shift 
     required_skills: str #"doulas", "lactation consultants", "nurses"
+    max_miles: Optional[float] = None #farthest a provider may live from the shift's ZIP; None = no limit
     
 class Assignment(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     shift_id: int = Field(foreign_key="shift.id")
     provider_id: int = Field(foreign_key="provider.id")
-    status: str = "requested" #"requested", "confirmed", "declined"
+    status: str = "requested" #"requested", "confirmed", "declined", "provisional" (a rolling scheduler run's pick past its firm horizon)
     message: str = "" #description for assignment given by provider
  
     #Unique Constraint to prevent provider being added to the same shift twice
     __table_args__ = (UniqueConstraint("shift_id", "provider_id", name="uq_shift_provider")),
 
+#Running (visits, last visit) per family and provider, so continuity ranking is a primary-key lookup instead of
+# a scan of the family's assignment history. Maintained by server.scheduling.continuity; declined and provisional assignments don't count.
+class FamilyProviderContinuity(SQLModel, table=True):
+    __tablename__ = "family_provider_continuity"
+    family_id: int = Field(foreign_key="family.id", primary_key=True)
+    provider_id: int = Field(foreign_key="provider.id", primary_key=True)
+    count: int = 0
+    last_seen: datetime
+
 #Quick Algorithms ("Shortcuts")
 Index("ix_availability_weekday_provider", ProviderAvailability.weekday, ProviderAvailability.provider_id) #Providers who are available on weekdays
+Index("uq_availability_window", ProviderAvailability.provider_id, ProviderAvailability.weekday, ProviderAvailability.start, ProviderAvailability.end, unique=True) #one row per exact weekly window
 Index("ix_shift_starts", Shift.starts) #all shifts starting after inputted datetime
 Index("ix_shift_ends", Shift.ends) #all shifts ending before inputted datetime
+Index("ix_shift_family_starts", Shift.family_id, Shift.starts) #a family's shifts (continuity refreshes, care team)
+Index("uq_shift_confirmed", Assignment.shift_id, unique=True, sqlite_where=Assignment.status == "confirmed", postgresql_where=Assignment.status == "confirmed") #at most one confirmed provider per shift; concurrent schedulers claim shifts against it
+Index("ix_provider_skill_skill", ProviderSkill.skill_id, ProviderSkill.provider_id) #all providers with a given skill
 
 
@@ -0,0 +1,124 @@
+import base64
+import json
+from datetime import datetime, time
+from typing import Literal, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic_core import to_json
+from sqlalchemy import and_, or_
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from server.cache import etag_for, not_modified, response_cache
+from server.db import get_async_engine
+from server.metrics import response_cache_requests
+
+#Shared by the list endpoints:
+# ?limit=N            one page of N rows; the X-Next-Cursor header carries the position of the last one
+# ?cursor=...         resume after that position (keyset: WHERE key > last, so page 500 costs the same as page 1)
+# ?format=ndjson      stream one JSON object per line from a server-side cursor instead of building one big array
+#                     (with limit, the page is read first and streamed with its X-Next-Cursor, like JSON)
+# Without limit the whole (filtered) list comes back as before, so existing callers keep working.
+# JSON responses carry an ETag from the tables' write versions: If-None-Match gets a 304, and a repeated
+# query of unchanged tables is served from the response cache (see server.cache).
+MAX_PAGE = 1000
+STREAM_BATCH = 500
+NDJSON = "application/x-ndjson"
+
+
+def encode_cursor(values: Sequence) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, (datetime, time)) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Sequence) -> list:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if len(raw) != len(keys):
+            raise ValueError
+        parse = {datetime: datetime.fromisoformat, time: time.fromisoformat}
+        return [parse.get(k.expression.type.python_type, int)(v) for k, v in zip(keys, raw)]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after(keys: Sequence, values: Sequence):
+    """
+    (k1, k2, ...) > (v1, v2, ...) spelled out lexicographically. The leading k1 >= v1 is redundant
+    but gives the planner a plain range on the first column's index.
+    """
+    clauses = []
+    for i in range(len(keys)):
+        eq = [keys[j] == values[j] for j in range(i)]
+        clauses.append(and_(*eq, keys[i] > values[i]))
+    return and_(keys[0] >= values[0], or_(*clauses))
+
+
+class PageParams:
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE),
+        cursor: Optional[str] = Query(None),
+        format: Literal["json", "ndjson"] = Query("json"),
+        request: Request = None,
+    ):
+        self.request = request
+        self.limit = limit
+        self.cursor = cursor
+        self.format = format
+
+    async def respond(self, session: AsyncSession, stmt, keys: Sequence, response: Response):
+        #keys must be unique together (end with the primary key) for the cursor to be exact
+        stmt = stmt.order_by(*keys)
+        if self.cursor:
+            stmt = stmt.where(after(keys, decode_cursor(self.cursor, keys)))
+        if self.format == "ndjson":
+            if self.limit is None:
+                return StreamingResponse(_ndjson(stmt), media_type=NDJSON)
+            # one page is at most MAX_PAGE rows: read it here so X-Next-Cursor can go out with the headers
+            rows, extra = await self._page(session, stmt, keys)
+            return StreamingResponse(_ndjson_rows(rows), media_type=NDJSON, headers=extra)
+
+        etag = etag_for(self.request, stmt)  # versions are read before the query runs
+        if etag is not None:
+            cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+            if not_modified(self.request, etag):
+                response_cache_requests.inc(result="not_modified")
+                return Response(status_code=304, headers=cache_headers)
+            hit = response_cache.get(etag)
+            if hit is not None:
+                response_cache_requests.inc(result="hit")
+                return Response(hit[0], media_type="application/json", headers={**hit[1], **cache_headers})
+            response_cache_requests.inc(result="miss")
+
+        rows, extra = await self._page(session, stmt, keys)
+        if etag is None:
+            response.headers.update(extra)
+            return rows
+
+        body = to_json(rows)
+        response_cache.put(etag, body, extra)
+        return Response(body, media_type="application/json", headers={**extra, **cache_headers})
+
+    async def _page(self, session: AsyncSession, stmt, keys: Sequence) -> Tuple[list, dict]:
+        #(rows, headers): with a limit, one extra row is read to tell whether X-Next-Cursor is needed
+        if self.limit is None:
+            return (await session.exec(stmt)).all(), {}
+        rows = (await session.exec(stmt.limit(self.limit + 1))).all()
+        if len(rows) <= self.limit:
+            return rows, {}
+        rows = rows[: self.limit]
+        return rows, {"X-Next-Cursor": encode_cursor([getattr(rows[-1], k.key) for k in keys])}
+
+
+async def _ndjson_rows(rows: list):
+    for lo in range(0, len(rows), STREAM_BATCH):
+        yield "".join(row.model_dump_json() + "\n" for row in rows[lo:lo + STREAM_BATCH])
+
+
+async def _ndjson(stmt):
+    #own session: the request's dependency session is closed before a streaming body is sent
+    async with AsyncSession(get_async_engine()) as session:
+        result = await session.stream(stmt.execution_options(yield_per=STREAM_BATCH))
+        async for batch in result.scalars().partitions():
+            yield "".join(row.model_dump_json() + "\n" for row in batch)
@@ -1,17 +1,25 @@
 # server/routers/ai.py
-import os, json, random
+import os, json, random, asyncio, hashlib, threading
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
-from fastapi import APIRouter, Depends
-from pydantic import BaseModel
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 from sqlmodel import Session, select
 
-from server.db import get_session
+from server.db import engine
 from server.models import Provider, Shift, ProviderAvailability, Family
+from server.fixtures import (
+    CONTINUITY_PREFS, FAMILY_FIRST, FAMILY_LAST, SKILLS_POOL, fake_providers, fake_shifts, load_fixture,
+)
+from server.metrics import llm_requests
+from server.scheduling.warm import warm_index
 
-# Optional: uses OpenAI if OPENAI_API_KEY is set, otherwise falls back to local generator
-from openai import OpenAI
+# Optional: uses OpenAI if OPENAI_API_KEY is set, otherwise falls back to local generator.
+# OPENAI_BASE_URL points the client at a compatible local stand-in (the SDK reads it itself).
+from openai import AsyncOpenAI
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
@@ -32,6 +40,23 @@ class AutoGenResult(BaseModel):
     created_shifts: int
     used_ai: bool
 
+class FixtureRequest(BaseModel):
+    n_providers: int = Field(1000, ge=0, le=1_000_000)
+    n_shifts: int = Field(10_000, ge=0, le=10_000_000)
+    n_families: Optional[int] = Field(None, ge=1)  # default n_shifts / 25
+    seed: int = 0
+    start: Optional[datetime] = None  # default next Monday; pass it to reproduce a dataset exactly
+    days: int = Field(28, ge=1, le=366)
+    zip_pool: Optional[List[str]] = None  # default every ZIP within 30 mi of downtown Seattle
+
+# The LLM is good for a few hundred believable demo rows; beyond this the local generator is used
+LLM_MAX_ROWS = 400
+LLM_CHUNK_ROWS = 40  # providers + shifts per call, well inside one reply's output-token limit
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))  # calls in flight per request
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))  # seconds for the whole generation; late chunks go local
+LLM_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+LLM_CACHE_SIZE = 256  # parsed replies kept by prompt hash
+
 # -------------------- Helpers --------------------
 
 def _parse_iso_to_naive(iso: str) -> datetime:
@@ -49,68 +74,42 @@ def _fallback_fake_data(payload: AutoGenRequest):
     """
     Local deterministic generator: returns dict with 'providers' and 'shifts'.
     """
-    first_names = ["Ava","Maya","Elena","Noah","Lucas","Olivia","Leo","Zoe","Mila","Ethan"]
-    last_names = ["Chen","Garcia","Johnson","Singh","Patel","Nguyen","Lee","Martinez","Brown","Wilson"]
-    skills_pool = ["Doula","Nurse","Lactation Consultant"]
-
     start = payload.start or (datetime.now().replace(microsecond=0) + timedelta(hours=2))
     end   = payload.end or (start + timedelta(days=7))
+    pick_zip = lambda: random.choice(payload.zip_pool)
 
-    providers = []
-    for _ in range(payload.n_providers):
-        name = f"{random.choice(first_names)} {random.choice(last_names)}"
-        home_zip = random.choice(payload.zip_pool)
-        sk = random.sample(skills_pool, k=random.choice([1, 2]))  # 1–2 skills
-        providers.append({
-            "name": name,
-            "home_zip": home_zip,
-            "skills": ", ".join(sk),
-            "active": True,
-        })
-
-    # Shifts within the window, durations 4–12h
-    shifts = []
-    total_days = max((end - start).days, 1)
-    for _ in range(payload.n_shifts):
-        day_offset = random.randint(0, total_days)
-        shift_start = (start + timedelta(days=day_offset, hours=random.randint(6, 20))).replace(minute=0, second=0)
-        hours = random.choice([4, 6, 8, 10, 12])
-        shift_end = shift_start + timedelta(hours=hours)
-        shifts.append({
-            "starts": shift_start.isoformat(),
-            "ends": shift_end.isoformat(),
-            "zip": random.choice(payload.zip_pool),
-            "required_skills": random.choice(skills_pool),
-        })
-
+    providers = list(fake_providers(payload.n_providers, pick_zip))
+    shifts = [
+        {**s, "starts": s["starts"].isoformat(), "ends": s["ends"].isoformat()}
+        for s in fake_shifts(payload.n_shifts, start, end, pick_zip)
+    ]
     return {"providers": providers, "shifts": shifts}
 
-def get_client() -> OpenAI:
+_client: Optional[AsyncOpenAI] = None
+
+def get_client() -> AsyncOpenAI:
+    #one client per process so calls share its connection pool; no retries, the deadline is LLM_TIMEOUT
+    global _client
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY not set in environment")
-    return OpenAI(api_key=api_key)
-
-def _call_llm(payload: AutoGenRequest):
-    """
-    Ask the LLM to fabricate providers/shifts as JSON.
-    Returns a dict with 'providers' and 'shifts', or None on failure.
-    """
-    try:
-        client = get_client()
-    except RuntimeError:
-        return None
-
-    skills_list = ["Doula","Nurse","Lactation Consultant"]
-    start = (payload.start or (datetime.now(timezone.utc) + timedelta(hours=1))).isoformat()
-    end   = (payload.end or (datetime.now(timezone.utc) + timedelta(days=7))).isoformat()
-
-    sys = (
-        "You are generating seed data for a small healthcare scheduling system. "
-        "Output STRICT JSON with keys 'providers' (array) and 'shifts' (array). "
-        "No commentary, only JSON."
-    )
-    usr = f"""
+    if _client is None:
+        _client = AsyncOpenAI(api_key=api_key, timeout=LLM_TIMEOUT, max_retries=0)
+    return _client
+
+_SYSTEM_PROMPT = (
+    "You are generating seed data for a small healthcare scheduling system. "
+    "Output STRICT JSON with keys 'providers' (array) and 'shifts' (array). "
+    "No commentary, only JSON."
+)
+
+def _prompt(payload: AutoGenRequest, n_providers: int, n_shifts: int, part: int, parts: int) -> str:
+    skills_list = SKILLS_POOL
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)  # hour granularity keeps the prompt cacheable
+    start = (payload.start or (now + timedelta(hours=1))).isoformat()
+    end   = (payload.end or (now + timedelta(days=7))).isoformat()
+    batch = f"- This is batch {part + 1} of {parts}; use different names than other batches would.\n" if parts > 1 else ""
+    return f"""
 {{
   "providers": [
     {{
@@ -131,49 +130,144 @@ def _call_llm(payload: AutoGenRequest):
 }}
 
 Rules:
-- Generate {payload.n_providers} providers and {payload.n_shifts} shifts.
+- Generate {n_providers} providers and {n_shifts} shifts.
 - Provider skills must be from: {skills_list}.
 - Shift required_skills must be ONE of the above.
 - Distribute shifts between {start} and {end}.
 - Use only these ZIPs: {payload.zip_pool}.
 - Keep output compact: no extra keys, no nulls.
-"""
+{batch}"""
+
+class _ReplyCache:
+    """Parsed LLM replies by prompt hash, LRU-bounded; the same request asked twice costs one generation."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._items: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
 
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            hit = self._items.get(key)
+            if hit is not None:
+                self._items.move_to_end(key)
+            return hit
+
+    def put(self, key: str, value: dict) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+_replies = _ReplyCache(LLM_CACHE_SIZE)
+
+async def _call_llm(client: AsyncOpenAI, usr: str) -> Optional[dict]:
+    """
+    One chat completion for one chunk. Returns {'providers': [...], 'shifts': [...]},
+    or None on any failure (timeout, HTTP error, unparseable reply).
+    """
+    key = hashlib.sha256(json.dumps([LLM_MODEL, _SYSTEM_PROMPT, usr]).encode()).hexdigest()
+    cached = _replies.get(key)
+    if cached is not None:
+        llm_requests.inc(result="cached")
+        return cached
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
+        resp = await client.chat.completions.create(
+            model=LLM_MODEL,
             response_format={"type": "json_object"},
-            messages=[{"role": "system", "content": sys},
+            messages=[{"role": "system", "content": _SYSTEM_PROMPT},
                       {"role": "user", "content": usr}],
             temperature=0.7,
         )
-        content = resp.choices[0].message.content
-        return json.loads(content)
+        data = json.loads(resp.choices[0].message.content)
+        if not isinstance(data.get("providers", []), list) or not isinstance(data.get("shifts", []), list):
+            raise ValueError("unexpected reply shape")
+    except asyncio.CancelledError:
+        llm_requests.inc(result="timeout")
+        raise
     except Exception:
+        llm_requests.inc(result="error")
         return None
+    llm_requests.inc(result="ok")
+    _replies.put(key, data)
+    return data
+
+def _split(n_providers: int, n_shifts: int) -> List[Tuple[int, int]]:
+    #(providers, shifts) per chunk, both spread as evenly as possible
+    parts = max(1, -(-(n_providers + n_shifts) // LLM_CHUNK_ROWS))
+    return [
+        (n_providers // parts + (i < n_providers % parts), n_shifts // parts + (i < n_shifts % parts))
+        for i in range(parts)
+    ]
+
+async def _generate(payload: AutoGenRequest) -> Tuple[dict, bool]:
+    """
+    Providers/shifts for autogen and whether any of them came from the LLM.
+    The request is split into chunks generated in parallel (at most LLM_CONCURRENCY at once) under one
+    LLM_TIMEOUT deadline; chunks that fail or miss the deadline are filled by the local generator.
+    No key, or more than LLM_MAX_ROWS rows: the local generator does everything, as before.
+    """
+    try:
+        client = get_client() if payload.n_providers + payload.n_shifts <= LLM_MAX_ROWS else None
+    except RuntimeError:
+        client = None
+    if client is None:
+        return _fallback_fake_data(payload), False
+
+    chunks = _split(payload.n_providers, payload.n_shifts)
+    gate = asyncio.Semaphore(LLM_CONCURRENCY)
+
+    async def one(i: int, n_p: int, n_s: int) -> Optional[dict]:
+        async with gate:
+            return await _call_llm(client, _prompt(payload, n_p, n_s, i, len(chunks)))
+
+    tasks = [asyncio.ensure_future(one(i, n_p, n_s)) for i, (n_p, n_s) in enumerate(chunks)]
+    done, pending = await asyncio.wait(tasks, timeout=LLM_TIMEOUT)
+    for t in pending:
+        t.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    data = {"providers": [], "shifts": []}
+    used_ai = False
+    for t, (n_p, n_s) in zip(tasks, chunks):
+        part = t.result() if t in done else None
+        if part is None:
+            part = _fallback_fake_data(payload.model_copy(update={"n_providers": n_p, "n_shifts": n_s}))
+        else:
+            used_ai = True
+        data["providers"] += part.get("providers", [])
+        data["shifts"] += part.get("shifts", [])
+    return data, used_ai
 
 # -------------------- Route --------------------
 
 @router.post("/autogen", response_model=AutoGenResult)
-def autogen(payload: AutoGenRequest, session: Session = Depends(get_session)):
+async def autogen(payload: AutoGenRequest):
     """
     Create demo Providers, Families, and Shifts.
     - Uses OpenAI if OPENAI_API_KEY is set; otherwise uses a local fallback.
     - Ensures a reasonable number of Families exist.
     - Assigns every Shift a family_id (NOT NULL).
+    The LLM calls are awaited on the event loop, so a slow generation holds no worker thread;
+    only the inserts run in the threadpool.
     """
-    used_ai = False
-    data = _call_llm(payload)
-    if not data:
-        data = _fallback_fake_data(payload)
-    else:
-        used_ai = True
+    data, used_ai = await _generate(payload)
+    return await run_in_threadpool(_store_autogen, payload, data, used_ai)
+
+
+def _store_autogen(payload: AutoGenRequest, data: dict, used_ai: bool) -> AutoGenResult:
+    with Session(engine) as session:
+        return _insert_autogen(session, payload, data, used_ai)
 
+
+def _insert_autogen(session: Session, payload: AutoGenRequest, data: dict, used_ai: bool) -> AutoGenResult:
     providers = data.get("providers", [])
     shifts    = data.get("shifts",    [])
 
     # ---- Insert Providers ----
-    created_p = 0
+    created = []
     for p in providers:
         try:
             prov = Provider(
@@ -183,26 +277,22 @@ def autogen(payload: AutoGenRequest, session: Session = Depends(get_session)):
                 active=bool(p.get("active", True)),
             )
             session.add(prov)
-            created_p += 1
+            created.append(prov)
         except Exception:
             continue
+    session.flush()
+    new_ids = sorted((prov.id for prov in created), reverse=True)  # read before commit expires them
+    created_p = len(created)
     session.commit()
 
     # Seed basic availability for the newly created providers
     if created_p > 0:
-        new_providers = session.exec(
-            Provider.__table__.select().order_by(Provider.id.desc())
-        ).all()[:created_p]
-
-        for row in new_providers:
+        day_start = datetime.strptime("08:00", "%H:%M").time()
+        day_end = datetime.strptime("18:00", "%H:%M").time()
+        for pid in new_ids:
             days = random.sample([0,1,2,3,4,5,6], k=random.choice([2,3,4]))
             for d in days:
-                session.add(ProviderAvailability(
-                    provider_id=row.id,
-                    weekday=d,
-                    start=datetime.strptime("08:00", "%H:%M").time(),
-                    end=datetime.strptime("18:00", "%H:%M").time(),
-                ))
+                session.add(ProviderAvailability(provider_id=pid, weekday=d, start=day_start, end=day_end))
         session.commit()
 
     # ---- Ensure Families exist ----
@@ -211,25 +301,24 @@ def autogen(payload: AutoGenRequest, session: Session = Depends(get_session)):
     to_create = max(target_families - len(existing_ids), 0)
 
     if to_create > 0:
-        fn = ["River","Sky","Rowan","Harper","Kai","Ari","Sage","Phoenix","Taylor","Quinn"]
-        ln = ["Nguyen","Johnson","Garcia","Patel","Lee","Brown","Martinez","Wilson","Chen","Singh"]
-        prefs = ["consistent", "flexible"]
         for _ in range(to_create):
             fam = Family(
-                name=f"{random.choice(fn)} {random.choice(ln)}",
+                name=f"{random.choice(FAMILY_FIRST)} {random.choice(FAMILY_LAST)}",
                 zip=random.choice(payload.zip_pool),
-                continuity_preference=random.choice(prefs),
+                continuity_preference=random.choice(CONTINUITY_PREFS),
             )
             session.add(fam)
         session.commit()
 
-    family_ids = session.exec(select(Family.id)).all()
+    family_zip = dict(session.exec(select(Family.id, Family.zip)).all())
+    family_ids = list(family_zip)
     if not family_ids:
         # Safety fallback (should never happen)
         fam = Family(name="Demo Family", zip=random.choice(payload.zip_pool), continuity_preference="flexible")
         session.add(fam)
         session.commit()
         family_ids = [fam.id]
+        family_zip = {fam.id: fam.zip}
 
     # ---- Insert Shifts (with family_id) ----
     created_s = 0
@@ -240,7 +329,7 @@ def autogen(payload: AutoGenRequest, session: Session = Depends(get_session)):
             fid    = random.choice(family_ids)
 
             # 70%: use the family's ZIP so later continuity/proximity works nicely
-            fam_zip = session.get(Family, fid).zip
+            fam_zip = family_zip[fid]
             zip_code = fam_zip if random.random() < 0.7 else str(s.get("zip") or random.choice(payload.zip_pool)).strip()
 
             sh = Shift(
@@ -261,3 +350,14 @@ def autogen(payload: AutoGenRequest, session: Session = Depends(get_session)):
         created_shifts=created_s,
         used_ai=used_ai,
     )
+
+
+@router.post("/fixtures")
+def fixtures(payload: FixtureRequest):
+    """
+    Load a seeded synthetic dataset sized for load tests (see server.fixtures; same as
+    `python -m server.fixtures`). Returns row counts and seconds taken.
+    """
+    counts = load_fixture(engine, **payload.model_dump())
+    warm_index.invalidate()  # Core inserts bypass the warm-index session hooks
+    return counts
@@ -1,28 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List, Optional
 
-from server.db import get_session
+from server.db import get_session, get_async_session
 from server.models import Assignment
+from server.pagination import PageParams
+from server.scheduling.incremental import notify
 
 router = APIRouter(prefix="/assignments", tags=["assignments"])
 
 @router.get("/", response_model=List[Assignment])
-def list_assignments(session: Session = Depends(get_session)):
-    return session.exec(select(Assignment)).all()
+async def list_assignments(response: Response, session: AsyncSession = Depends(get_async_session), page: PageParams = Depends()):
+    return await page.respond(session, select(Assignment), (Assignment.id,), response)
 
 @router.post("/", response_model=Assignment)
 def create_assignment(assignment: Assignment, session: Session = Depends(get_session)):
     session.add(assignment)
-    session.commit()
+    try:
+        session.commit()
+    except IntegrityError:
+        #uq_shift_provider, or uq_shift_confirmed: the shift already has a confirmed provider
+        session.rollback()
+        raise HTTPException(status_code=409, detail="Provider already on this shift, or shift already confirmed")
     session.refresh(assignment)
     return assignment
 
 @router.delete("/{assignment_id}")
-def delete_assignment(assignment_id: int, session: Session = Depends(get_session)):
+def delete_assignment(assignment_id: int, background_tasks: BackgroundTasks, session: Session = Depends(get_session)):
     row: Optional[Assignment] = session.get(Assignment, assignment_id)
     if not row:
         raise HTTPException(status_code=404, detail="Assignment not found")
+    shift_id = row.shift_id
     session.delete(row)
     session.commit()
+    notify(background_tasks, shifts=[shift_id])
     return {"ok": True}
@@ -1,7 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
-from server.db import get_session
-from server.models import ProviderAvailability
+from sqlmodel.ext.asyncio.session import AsyncSession
+from server.db import get_session, get_async_session, insert_ignoring_duplicates
+from server.models import ProviderAvailability, Shift
+from server.pagination import PageParams
+from server.routers.shifts import _ensure_naive_utc
+from server.scheduling.incremental import notify
+from server.scheduling.warm import warm_index
 from pydantic import BaseModel, field_validator
 from datetime import datetime, time as dtime
 from typing import List, Optional
@@ -55,8 +62,10 @@ def _exists_exact(session: Session, provider_id: int, weekday: int, start: dtime
 
 #routes
 @router.get("/", response_model=List[ProviderAvailability])
-def list_availability(
-    session: Session = Depends(get_session),
+async def list_availability(
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+    page: PageParams = Depends(),
     provider_id: Optional[int] = Query(None),
     weekday: Optional[int] = Query(None, ge=0, le=6),
 ):
@@ -67,20 +76,46 @@ def list_availability(
         stmt = stmt.where(ProviderAvailability.provider_id == provider_id)
     if weekday is not None:
         stmt = stmt.where(ProviderAvailability.weekday == weekday)
-    stmt = stmt.order_by(ProviderAvailability.provider_id, ProviderAvailability.weekday, ProviderAvailability.start)
-    return session.exec(stmt).all()
+    # same order as before pagination; the id makes the cursor exact (uq_availability_window serves the prefix)
+    keys = (ProviderAvailability.provider_id, ProviderAvailability.weekday, ProviderAvailability.start, ProviderAvailability.id)
+    return await page.respond(session, stmt, keys, response)
+
+
+@router.get("/free")
+def free_providers(
+    starts: datetime = Query(...),
+    ends: datetime = Query(...),
+    required_skills: str = Query(""),
+    include_booked: bool = Query(False),
+    session: Session = Depends(get_session),
+):
+    """
+    Who is free for [starts, ends)? Active providers whose weekly availability covers the whole
+    window (overnight and across the week boundary), optionally only those with required_skills.
+    Answered from the warm index with one vectorized bitmap AND; booked providers are left out
+    unless include_booked=true.
+    """
+    starts, ends = _ensure_naive_utc(starts), _ensure_naive_utc(ends)
+    if starts >= ends:
+        raise HTTPException(status_code=400, detail="ends must be after starts")
+    probe = Shift(starts=starts, ends=ends, required_skills=required_skills)
+    with warm_index.lock:
+        index = warm_index.get(session)
+        found = index.available(probe) if include_booked else list(index.candidates(probe))
+    return {"count": len(found), "provider_ids": [p.id for p in found]}
 
 
 @router.post("/", response_model=ProviderAvailability, status_code=201)
-def create_availability(payload: AvailabilityCreate, session: Session = Depends(get_session)):
+def create_availability(payload: AvailabilityCreate, background_tasks: BackgroundTasks, session: Session = Depends(get_session)):
     """
     Create a single availability row.
-    Rejects exact duplicates and invalid ranges (start >= end).
+    Rejects exact duplicates and empty ranges (start == end); an end before the start
+    runs past midnight into the next day (22:00-06:00, 18:00-00:00).
     """
     start_t = _parse_hhmm(payload.start)
     end_t = _parse_hhmm(payload.end)
-    if not (start_t < end_t):
-        raise HTTPException(status_code=400, detail="start must be before end")
+    if start_t == end_t:
+        raise HTTPException(status_code=400, detail="start and end must differ")
 
     dup = _exists_exact(session, payload.provider_id, payload.weekday, start_t, end_t)
     if dup:
@@ -93,44 +128,59 @@ def create_availability(payload: AvailabilityCreate, session: Session = Depends(
         end=end_t,
     )
     session.add(row)
-    session.commit()
+    try:
+        session.commit()
+    except IntegrityError:
+        #lost a race with an identical insert; uq_availability_window caught it
+        session.rollback()
+        raise HTTPException(status_code=409, detail="Exact availability already exists")
     session.refresh(row)
+    notify(background_tasks, providers=[row.provider_id])
     return row
 
 
 @router.post("/bulk", response_model=List[ProviderAvailability], status_code=201)
-def create_availability_bulk(payload: AvailabilityCreateBulk, session: Session = Depends(get_session)):
+def create_availability_bulk(
+    payload: AvailabilityCreateBulk,
+    background_tasks: BackgroundTasks,
+    replace_week: bool = Query(False),
+    session: Session = Depends(get_session),
+):
     """
-    Bulk create availability rows.
-    Skips exact duplicates; returns all created rows.
+    Bulk create availability rows in one INSERT ... ON CONFLICT DO NOTHING ... RETURNING.
+    Skips exact duplicates (already stored, or repeated in the payload); returns the created rows.
+    ?replace_week=true first deletes every existing window of the providers in the payload, so each
+    one's weekly pattern is swapped for the posted one in the same transaction.
     """
-    created: list[ProviderAvailability] = []
+    rows: dict[tuple, dict] = {}
     for item in payload.items:
         start_t = _parse_hhmm(item.start)
         end_t = _parse_hhmm(item.end)
-        if not (start_t < end_t):
-            raise HTTPException(status_code=400, detail=f"Invalid range for weekday {item.weekday}: start >= end")
-
-        if _exists_exact(session, item.provider_id, item.weekday, start_t, end_t):
-            continue
-
-        row = ProviderAvailability(
-            provider_id=item.provider_id,
-            weekday=item.weekday,
-            start=start_t,
-            end=end_t,
-        )
-        session.add(row)
-        created.append(row)
-
+        if start_t == end_t:
+            raise HTTPException(status_code=400, detail=f"Invalid range for weekday {item.weekday}: start == end")
+        key = (item.provider_id, item.weekday, start_t, end_t)
+        rows[key] = {"provider_id": item.provider_id, "weekday": item.weekday, "start": start_t, "end": end_t}
+
+    provider_ids = {item.provider_id for item in payload.items}
+    conn = session.connection()
+    if replace_week and provider_ids:
+        conn.execute(delete(ProviderAvailability).where(ProviderAvailability.provider_id.in_(provider_ids)))
+    created: list[ProviderAvailability] = []
+    if rows:
+        stmt = insert_ignoring_duplicates(conn, ProviderAvailability).returning(*ProviderAvailability.__table__.c)
+        created = [ProviderAvailability(**r._mapping) for r in conn.execute(stmt, list(rows.values()))]
+        created.sort(key=lambda r: r.id)
     session.commit()
-    for r in created:
-        session.refresh(r)
+
+    #Core statements bypass the warm-index session hooks
+    changed = provider_ids if replace_week else {r.provider_id for r in created}
+    warm_index.apply(("provider", pid) for pid in changed)
+    notify(background_tasks, providers=changed)
     return created
 
 
 @router.delete("/{availability_id:int}", status_code=204)
-def delete_availability_by_id(availability_id: int, session: Session = Depends(get_session)): #I have no idea why, but expecting "Int" resolves a 422 error 
+def delete_availability_by_id(availability_id: int, background_tasks: BackgroundTasks, session: Session = Depends(get_session)): #I have no idea why, but expecting "Int" resolves a 422 error 
     """
     Delete a single availability row by its ID.
     """
@@ -139,11 +189,12 @@ def delete_availability_by_id(availability_id: int, session: Session = Depends(g
         raise HTTPException(status_code=404, detail="Availability not found")
     session.delete(row)
     session.commit()
+    notify(background_tasks, providers=[row.provider_id])
     return None
 
 
 @router.delete("/by-key", status_code=204)
-def delete_availability_by_key(payload: AvailabilityKey, session: Session = Depends(get_session)):
+def delete_availability_by_key(payload: AvailabilityKey, background_tasks: BackgroundTasks, session: Session = Depends(get_session)):
     """
     Delete a single availability row by composite key: provider_id + weekday + start + end.
     """
@@ -154,11 +205,13 @@ def delete_availability_by_key(payload: AvailabilityKey, session: Session = Depe
         raise HTTPException(status_code=404, detail="Availability not found")
     session.delete(row)
     session.commit()
+    notify(background_tasks, providers=[row.provider_id])
     return None
 
 
 @router.delete("/provider-day", status_code=204)
 def delete_all_for_provider_day(
+    background_tasks: BackgroundTasks,
     provider_id: int = Query(...),
     weekday: int = Query(..., ge=0, le=6),
     session: Session = Depends(get_session),
@@ -178,4 +231,5 @@ def delete_all_for_provider_day(
     for r in rows:
         session.delete(r)
     session.commit()
+    notify(background_tasks, providers=[provider_id])
     return None
\ No newline at end of file
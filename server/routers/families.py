@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from pydantic import BaseModel
 from sqlmodel import Session, select
-from server.db import get_session
-from server.models import Family
+from sqlmodel.ext.asyncio.session import AsyncSession
+from server.db import get_session, get_async_session
+from server.models import Family, FamilyProviderContinuity, Provider
+from server.pagination import PageParams
+from server.bulk import import_rows
 
 router = APIRouter(prefix="/families", tags=["families"])
 
@@ -12,17 +18,55 @@ class FamilyCreate(BaseModel):
     continuity_preference: str
 
 @router.get("", response_model=list[Family])
-def list_families(session: Session = Depends(get_session)):
-    return session.exec(select(Family)).all()
+async def list_families(response: Response, session: AsyncSession = Depends(get_async_session), page: PageParams = Depends()):
+    return await page.respond(session, select(Family), (Family.id,), response)
+
+def _family_values(payload: FamilyCreate) -> dict:
+    return {
+        "name": payload.name,
+        "zip": payload.zip,
+        "continuity_preference": (payload.continuity_preference or "").strip().lower(),
+    }
 
 @router.post("", response_model=Family)
 def create_family(payload: FamilyCreate, session: Session = Depends(get_session)):
-    fam = Family(
-        name=payload.name,
-        zip=payload.zip,
-        continuity_preference=(payload.continuity_preference or "").strip().lower(),
-    )
+    fam = Family(**_family_values(payload))
     session.add(fam)
     session.commit()
     session.refresh(fam)
-    return fam
\ No newline at end of file
+    return fam
+
+@router.post("/bulk")
+async def create_families_bulk(request: Request):
+    #JSON array, NDJSON or CSV of FamilyCreate rows; see server.bulk
+    return await import_rows(request, FamilyCreate, Family, _family_values)
+
+class CareTeamMember(BaseModel):
+    provider_id: int
+    name: str
+    skills: str
+    home_zip: str
+    active: bool
+    visits: int
+    last_seen: datetime
+
+@router.get("/{family_id}/care-team", response_model=list[CareTeamMember])
+def care_team(family_id: int, limit: Optional[int] = Query(None, ge=1, le=1000), session: Session = Depends(get_session)):
+    """
+    Providers who have served this family, most visits first, then most recent.
+    One primary-key range read of family_provider_continuity (see scheduling.continuity).
+    """
+    if session.get(Family, family_id) is None:
+        raise HTTPException(status_code=404, detail="Family not found")
+    fpc = FamilyProviderContinuity
+    stmt = (
+        select(Provider.id, Provider.name, Provider.skills, Provider.home_zip, Provider.active, fpc.count, fpc.last_seen)
+        .join(Provider, Provider.id == fpc.provider_id)
+        .where(fpc.family_id == family_id)
+        .order_by(fpc.count.desc(), fpc.last_seen.desc(), Provider.id)
+        .limit(limit)
+    )
+    return [
+        CareTeamMember(provider_id=pid, name=name, skills=skills, home_zip=zip_, active=active, visits=n, last_seen=last)
+        for pid, name, skills, zip_, active, n, last in session.exec(stmt).all()
+    ]
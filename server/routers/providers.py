@@ -1,17 +1,106 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
+from pydantic import BaseModel
 from sqlmodel import Session, select
-from server.db import get_session
-from server.models import Provider
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Optional
+from server.db import get_session, get_async_session
+from server.models import Provider, ProviderSkill, Skill
+from server.pagination import PageParams
+from server.scheduling.geo import get_geo
+from server.scheduling.skills import canonical, sync_provider_skills
+from server.scheduling.warm import warm_index
+from server.bulk import import_rows
+from server.scheduling.incremental import notify
 
 router = APIRouter()
 
+class ProviderCreate(BaseModel):
+    name: str
+    home_zip: str
+    skills: str
+    active: bool = True
+
+class ProviderUpdate(BaseModel):
+    name: Optional[str] = None
+    home_zip: Optional[str] = None
+    skills: Optional[str] = None
+    active: Optional[bool] = None
+
 @router.get("/")
-def list_providers(session: Session = Depends(get_session)):
-    return session.exec(select(Provider)).all()
+async def list_providers(
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+    page: PageParams = Depends(),
+    skill: Optional[str] = Query(None),
+):
+    #?skill=Nurse is answered from the provider_skill index, not by scanning Provider.skills strings
+    stmt = select(Provider)
+    if skill:
+        stmt = (
+            stmt.join(ProviderSkill, ProviderSkill.provider_id == Provider.id)
+            .join(Skill, Skill.id == ProviderSkill.skill_id)
+            .where(Skill.name == canonical(skill))
+        )
+    return await page.respond(session, stmt, (Provider.id,), response)
+
+@router.get("/near")
+def providers_near(
+    zip: str = Query(...),
+    k: int = Query(10, ge=1, le=500),
+    max_miles: Optional[float] = Query(None, gt=0),
+    skills: str = Query(""),
+    session: Session = Depends(get_session),
+):
+    """
+    The k active providers living nearest to zip, optionally only those holding every skill in skills
+    and within max_miles. Answered from the warm index's KD-tree over home ZIPs, so only the
+    nearest handful are measured, not the whole roster.
+    """
+    geo = get_geo()
+    if zip not in geo:
+        raise HTTPException(status_code=404, detail="Unknown ZIP")
+    with warm_index.lock:
+        index = warm_index.get(session)
+        pool = index.pool(skills)
+        hits = [(pool[pos], miles) for pos, miles in index.locator(skills, geo).nearest(zip, k, max_miles)]
+    return [
+        {"provider_id": p.id, "name": p.name, "home_zip": p.home_zip, "skills": p.skills, "miles": round(miles, 1)}
+        for p, miles in hits
+    ]
 
 @router.post("/")
 def create_provider(provider: Provider, session: Session = Depends(get_session)):
     session.add(provider)
     session.commit()
     session.refresh(provider)
-    return provider
\ No newline at end of file
+    return provider
+
+@router.patch("/{provider_id:int}")
+def update_provider(provider_id: int, payload: ProviderUpdate, background_tasks: BackgroundTasks, session: Session = Depends(get_session)):
+    #Partial update, e.g. {"active": false} to take a provider off the roster
+    provider = session.get(Provider, provider_id)
+    if not provider:
+        raise HTTPException(status_code=404, detail="Provider not found")
+    for field, value in payload.model_dump(exclude_unset=True).items():
+        setattr(provider, field, value)
+    session.add(provider)
+    session.commit()
+    session.refresh(provider)
+    notify(background_tasks, providers=[provider.id])
+    return provider
+
+def _sync_skills(conn, ids, values):
+    #Core inserts skip the Provider mapper hooks, so keep provider_skill current here
+    sync_provider_skills(conn, {pid: v["skills"] for pid, v in zip(ids, values)})
+
+@router.post("/bulk")
+async def create_providers_bulk(request: Request, background_tasks: BackgroundTasks):
+    """
+    Import a roster in one call: a JSON array, NDJSON or CSV with name, home_zip, skills and optional active.
+    Rows that fail validation are reported and skipped.
+    """
+    result = await import_rows(request, ProviderCreate, Provider, ProviderCreate.model_dump, after_insert=_sync_skills)
+    if result["ids"]:
+        warm_index.invalidate()  # Core writes bypass the warm-index session hooks
+    notify(background_tasks, providers=result["ids"])
+    return result
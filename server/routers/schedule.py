@@ -1,193 +1,405 @@
 from __future__ import annotations
-from typing import Dict, Tuple, List, Optional, Set
-from datetime import datetime, time
-import math
+from typing import Dict, List, Optional, Set
+from datetime import datetime
+import time
 
 from fastapi import APIRouter, Depends, Query, HTTPException
-from sqlmodel import Session, select, col
+from pydantic import BaseModel, Field, field_validator
+from sqlmodel import Session, select
 
 from server.db import get_session
 from server.models import Provider, ProviderAvailability, Shift, Assignment, Family
 
 router = APIRouter(prefix="/schedule", tags=["schedule"])
 
-import subprocess 
-from functools import lru_cache
+from server.scheduling.geo import get_geo
+from server.scheduling.intervals import load_busy
+from server.scheduling.planner import load_horizon, plan_greedy, summarize, write_plan
+from server.scheduling.snapshot import ShiftRow, Snapshot
+from server.scheduling import claims
+from server.scheduling.optimal import plan_optimal
+from server.scheduling.parallel import plan_parallel
+from server.scheduling import incremental
+from server.metrics import scheduler_phase_seconds
+from server.scheduling.warm import warm_index
+from server.scheduling.urgent import lock_family, rank_candidates, reserve_lock
+from server.scheduling.weekmask import week_mask
+from server.scheduling.jobs import HorizonBusy, horizons, scheduler_jobs
+from server.scheduling import whatif
+from server.routers.availabilities import AvailabilityCreate, _parse_hhmm
+from server.routers.shifts import ShiftCreate, _ensure_naive_utc
 
-@lru_cache(maxsize=2048)
-def zip_distance(zip_a: str, zip_b: str) -> float:
-    #uses Node to implement the zipcodes npm package, returns miles (float) if not null
-    try:
-        result = subprocess.run(
-            ["node", "ziphelper.js", zip_a, zip_b],
-            capture_output=True,
-            text=True,
-            cwd="client",  
-            check=False,
-        )
-        val = result.stdout.strip()
-        d = float(val)
-        if d < 0:
-            return float("inf")
-        return d
-    except Exception:
-        return float("inf")
-
-
-def overlaps(a_start: datetime, a_end: datetime, b_start: datetime, b_end: datetime) -> bool:
-    """True if time windows overlap (inclusive)."""
-    return not (a_end <= b_start or b_end <= a_start)
-
-
-def provider_available_on_shift(session: Session, provider_id: int, shift: Shift) -> bool:
+
+@router.get("/conflicts")
+def check_conflicts(
+    starts: datetime = Query(...),
+    ends: datetime = Query(...),
+    provider_id: Optional[List[int]] = Query(None),
+    session: Session = Depends(get_session),
+):
     """
-    Very simple availability check:
-    - Day-of-week matches any availability row for that provider
-    - The shift’s time falls within the availability time window (same day)
-    NOTE: Availability rows are weekday + start/end (time only).
+    Which providers are already booked during [starts, ends)?
+    Checks every active provider unless provider_id is given (repeatable).
+    Only bookings overlapping the window are read, so cost doesn't grow with history.
     """
-    weekday = shift.starts.weekday()  # Monday=0..Sunday=6
-
-    avails = session.exec(
-        select(ProviderAvailability).where(
-            ProviderAvailability.provider_id == provider_id,
-            ProviderAvailability.weekday == weekday,
-        )
-    ).all()
-
-    if not avails:
-        return False
-
-    # Compare time-of-day only
-    s_time = shift.starts.time()
-    e_time = shift.ends.time()
-    for a in avails:
-        if (a.start <= s_time) and (e_time <= a.end):
-            return True
-    return False
-
-
-def provider_has_conflict(session: Session, provider_id: int, shift: Shift) -> bool:
-    #If provider already has an assignment or an overlap, return True
-    existing = session.exec(
-        select(Assignment).where(Assignment.provider_id == provider_id)
-    ).all()
-    if not existing:
-        return False
-
-    # Get all those shifts and check overlap
-    shift_ids = [a.shift_id for a in existing if a.shift_id is not None]
-    if not shift_ids:
-        return False
-
-    other_shifts = session.exec(
-        select(Shift).where(Shift.id.in_(shift_ids))
-    ).all()
-
-    for s in other_shifts:
-        if overlaps(shift.starts, shift.ends, s.starts, s.ends):
-            return True
-    return False
+    starts, ends = _ensure_naive_utc(starts), _ensure_naive_utc(ends)
+    if starts >= ends:
+        raise HTTPException(status_code=400, detail="ends must be after starts")
+
+    if provider_id is None:
+        provider_id = list(session.exec(select(Provider.id).where(Provider.active == True)).all())
+
+    busy = load_busy(session, provider_id, window=(starts, ends))
+    conflicting = [pid for pid in provider_id if pid in busy and busy[pid].overlaps(starts, ends)]
+    return {"checked": len(provider_id), "conflicts": conflicting}
+
 
 @router.post("/run")
-def run_scheduler(session: Session = Depends(get_session)):
-    providers = session.exec(select(Provider).where(Provider.active == True)).all()
-    shifts = session.exec(select(Shift).order_by(Shift.starts)).all()
-
-    assigned_shift_ids = {
-        a.shift_id
-        for a in session.exec(select(Assignment)).all()
-        if a.shift_id is not None
+def run_scheduler(
+    mode: str = Query("greedy", pattern="^(greedy|optimal|parallel)$"),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    firm_until: Optional[datetime] = Query(None),
+    session: Session = Depends(get_session),
+):
+    """
+    greedy (default): shifts in start order, each takes its continuity or nearest provider.
+    optimal: min-cost matching over all open shifts (see scheduling.optimal); the greedy plan is
+             computed as a dry run on the same data and reported alongside for comparison.
+    parallel: greedy, split by skill and region into pieces planned on several cores and merged
+             (see scheduling.parallel); large backlogs only, smaller ones run as plain greedy.
+    from/to: only shifts starting in [from, to), with just the bookings and continuity history those
+             shifts can touch loaded, so the cost follows the horizon rather than the whole history.
+    firm_until (rolling): picks for shifts starting from then on are written "provisional" instead of
+             confirmed. Each run first releases the provisional picks in its horizon and re-plans them.
+    Runs inside the request; POST /schedule/jobs does the same in the background.
+    Greedy runs can overlap other greedy runs and jobs: picks another scheduler confirmed first are
+    dropped and counted as lost (see scheduling.claims). Optimal runs get a 409 while anything else runs.
+    """
+    start, end, firm_until = _naive(start), _naive(end), _naive(firm_until)
+    _check_horizon(start, end)
+    try:
+        with horizons.holding(f"run-{id(session):x}", start, end, exclusive=mode == "optimal"):
+            return _run(mode, session, start, end, firm_until)
+    except HorizonBusy as busy:
+        raise _busy(busy)
+
+
+def _naive(dt: Optional[datetime]) -> Optional[datetime]:
+    #query datetimes may carry an offset; stored ones are naive UTC
+    return None if dt is None else _ensure_naive_utc(dt)
+
+
+def _check_horizon(start: Optional[datetime], end: Optional[datetime]) -> None:
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=400, detail="to must be after from")
+
+
+def _busy(busy: HorizonBusy) -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail={"message": "Another scheduler run holds an overlapping shift horizon", "held_by": busy.holder},
+    )
+
+
+def _run(
+    mode: str,
+    session: Session,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    firm_until: Optional[datetime] = None,
+) -> dict:
+    phase = lambda name: scheduler_phase_seconds.time(mode=mode, phase=name)
+
+    # Bulk-load providers, availability, booked windows and shifts once, as plain rows and arrays
+    # (see scheduling.snapshot); every check below is in-memory
+    with phase("load"):
+        released = claims.release_provisional(session, start, end)
+        snap = Snapshot.load(session, start, end)
+        index, families = snap.index, snap.families
+
+    # Dense distance matrix for every ZIP this run can touch
+    with phase("distance_matrix"):
+        geo = get_geo()
+        geo.precompute(snap.zips())
+
+    rolling = {} if firm_until is None else {
+        "firm_until": firm_until, "released": released, "provisional": 0,
+    }
+    if mode in ("greedy", "parallel"):
+        split = {}
+        with phase("plan"):
+            if mode == "parallel":
+                planned, stats = plan_parallel(snap, geo)
+                split = {"parallel": stats}
+            else:
+                planned = plan_greedy(index, snap.shifts.rows(), families, geo)
+        with phase("commit"):
+            won, lost = write_plan(session, planned, provisional_from=firm_until)
+        if rolling:
+            rolling["provisional"] = sum(1 for pk in won if pk.shift.starts >= firm_until)
+        return {"assigned": len(won), "lost": len(lost), "total_considered": len(snap.shifts), **rolling, **split}
+
+    shifts = list(snap.shifts.rows())
+    open_count = snap.shifts.count_open(index.assigned)
+
+    t0 = time.perf_counter()
+    baseline = plan_greedy(load_horizon(session, start, end), shifts, families, geo)
+    greedy_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    with phase("plan"):
+        planned = plan_optimal(index, shifts, families, geo)
+    optimal_ms = (time.perf_counter() - t0) * 1000
+
+    with phase("commit"):
+        won, lost = write_plan(session, planned, provisional_from=firm_until)
+    if rolling:
+        rolling["provisional"] = sum(1 for pk in won if pk.shift.starts >= firm_until)
+    return {
+        "assigned": len(won),
+        "lost": len(lost),
+        "total_considered": len(snap.shifts),
+        **rolling,
+        "mode": mode,
+        "optimal": summarize(planned, open_count, optimal_ms),
+        "greedy": summarize(baseline, open_count, greedy_ms),
     }
 
-    # Cache families
-    families = {f.id: f for f in session.exec(select(Family)).all()}
-
-    created = 0
-    for sh in shifts:
-        if sh.id in assigned_shift_ids:
-            continue
-
-        fam = families.get(sh.family_id)
-        fam_pref = (fam.continuity_preference or "").strip().lower() if fam else ""
-
-        # Eligible providers by skill + availability + no conflicts
-        def eligible(ps):
-            for p in ps:
-                if not p.skills:
-                    continue
-                # exact skill match
-                if not any(s.strip().lower() == sh.required_skills.strip().lower()
-                           for s in p.skills.split(",")):
-                    continue
-                if not provider_available_on_shift(session, p.id, sh):
-                    continue
-                if provider_has_conflict(session, p.id, sh):
-                    continue
-                yield p
-
-        chosen = None
-
-        # 1) CONTINUITY first (if preference suggests it)
-        wants_continuity = fam_pref in {"consistent", "consistency", "high", "prefers_consistency"}
-        if wants_continuity and fam:
-            # find that family's past providers, ranked by frequency then newest
-            past_asg = session.exec(
-                select(Assignment)
+
+@router.post("/jobs", status_code=202)
+def submit_job(
+    mode: str = Query("greedy", pattern="^(greedy|optimal)$"),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    firm_until: Optional[datetime] = Query(None),
+):
+    """
+    /schedule/run as a background job over shifts starting in [from, to) (everything when omitted);
+    firm_until works as for /schedule/run.
+    Returns at once with the job id; poll GET /schedule/jobs/{id} for progress.
+    Greedy jobs may overlap other greedy jobs; 409 when an optimal run or job is involved in the overlap.
+    """
+    start, end, firm_until = _naive(start), _naive(end), _naive(firm_until)
+    _check_horizon(start, end)
+    try:
+        return scheduler_jobs.submit(mode, start, end, firm_until).to_dict()
+    except HorizonBusy as busy:
+        raise _busy(busy)
+
+
+@router.get("/jobs")
+def list_jobs():
+    #newest first; finished jobs are kept for a while (see scheduling.jobs.MAX_FINISHED)
+    return [job.to_dict() for job in scheduler_jobs.list()]
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = scheduler_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@router.delete("/jobs/{job_id}", status_code=202)
+def cancel_job(job_id: str):
+    """Ask a queued or running job to stop; batches it already committed stay."""
+    job = scheduler_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@router.get("/pending")
+def pending_changes():
+    #how many shifts/providers are waiting for the next incremental pass
+    return incremental.pending()
+
+
+@router.post("/incremental")
+def run_incremental(session: Session = Depends(get_session)):
+    """
+    Re-plan only the shifts touched since the last pass (new shifts, deleted assignments,
+    availability edits, deactivated providers). /schedule/run stays the full nightly rebalance.
+    """
+    return incremental.replan(session)
+
+
+class UrgentRequest(ShiftCreate):
+    family_id: Optional[int] = None  # enables continuity ranking; required to reserve
+    k: int = Field(5, ge=1, le=50)
+    reserve: bool = False  # book the top candidate (creates the shift) in the same call
+
+
+@router.post("/urgent")
+def urgent_cover(payload: UrgentRequest, session: Session = Depends(get_session)):
+    """
+    Last-minute cover: top-k qualified, available, conflict-free providers for one window,
+    answered from the warm in-memory index (no full scheduler pass).
+    With reserve=true the best candidate is booked atomically, across workers and processes too
+    (the family is locked in the database, see urgent.lock_family); a second reservation for the
+    same family and an overlapping window gets a 409 instead of a second provider.
+    """
+    t0 = time.perf_counter()
+    if payload.starts >= payload.ends:
+        raise HTTPException(status_code=400, detail="ends must be after starts")
+    if payload.reserve and payload.family_id is None:
+        raise HTTPException(status_code=400, detail="family_id is required to reserve")
+
+    shift = Shift(
+        family_id=payload.family_id,
+        starts=payload.starts,
+        ends=payload.ends,
+        zip=payload.zip,
+        required_skills=payload.required_skills,
+        max_miles=payload.max_miles,
+    )
+    geo = get_geo()
+
+    def ranked():
+        with warm_index.lock:
+            return rank_candidates(warm_index.get(session), shift, geo, payload.k, payload.family_id)
+
+    reserved = None
+    if not payload.reserve:
+        candidates = ranked()
+    else:
+        with reserve_lock:
+            lock_family(session, payload.family_id)
+            covered = session.exec(
+                select(Assignment.id, Assignment.provider_id, Shift.id)
                 .join(Shift, Shift.id == Assignment.shift_id)
-                .where(Shift.family_id == fam.id, Assignment.provider_id.is_not(None))
-            ).all()
-            if past_asg:
-                # frequency map
-                freq: dict[int, int] = {}
-                last_seen: dict[int, datetime] = {}
-                for a in past_asg:
-                    pid = a.provider_id
-                    if pid is None:
-                        continue
-                    freq[pid] = freq.get(pid, 0) + 1
-                    # track recency using the shift start time
-                    sh_rec = session.get(Shift, a.shift_id)
-                    if sh_rec:
-                        last_seen[pid] = max(last_seen.get(pid, datetime.min), sh_rec.starts)
-
-                prev_providers = [p for p in providers if p.id in freq]
-                # rank: higher frequency first, then most recent last_seen
-                prev_providers.sort(key=lambda p: (-freq[p.id], -(last_seen[p.id].timestamp() if p.id in last_seen else 0)))
-
-                for p in eligible(prev_providers):
-                    chosen = p
-                    break
-
-        # 2) FALLBACK to nearest if none chosen
-        if chosen is None:
-            cands = []
-            for p in eligible(providers):
-                d = zip_distance(p.home_zip, sh.zip)
-                cands.append((d, p))
-            if cands:
-                cands.sort(key=lambda t: t[0])
-                chosen = cands[0][1]
-                dist = cands[0][0]
-                msg = f"Auto-scheduled (nearest, {dist:.1f} mi)"
+                .where(
+                    Shift.family_id == payload.family_id,
+                    Shift.starts < payload.ends,
+                    Shift.ends > payload.starts,
+                    Assignment.status != "declined",
+                )
+            ).first()
+            if covered:
+                raise HTTPException(
+                    status_code=409,
+                    detail={"message": "Family already has a provider for this window",
+                            "assignment_id": covered[0], "provider_id": covered[1], "shift_id": covered[2]},
+                )
+            candidates = ranked()
+            if candidates:
+                top = candidates[0]
+                session.add(shift)
+                session.flush()
+                asg = Assignment(
+                    shift_id=shift.id,
+                    provider_id=top.provider.id,
+                    status="confirmed",
+                    message=f"Urgent cover ({top.miles:.1f} mi)",
+                )
+                session.add(asg)
+                session.commit()
+                reserved = {"assignment_id": asg.id, "shift_id": shift.id, "provider_id": top.provider.id}
             else:
-                # leave unfilled if no fit
-                continue
-        else:
-            # continuity path: compute distance for message
-            dist = zip_distance(chosen.home_zip, sh.zip)
-            msg = f"Auto-scheduled (continuity, {dist:.1f} mi)"
-
-        session.add(
-            Assignment(
-                shift_id=sh.id,
-                provider_id=chosen.id,
-                status="confirmed",
-                message=msg,
-            )
-        )
-        assigned_shift_ids.add(sh.id)
-        created += 1
-
-    session.commit()
-    return {"assigned": created, "total_considered": len(shifts)}
\ No newline at end of file
+                session.rollback()  # nobody to send: release the lock
+
+    return {
+        "candidates": [
+            {
+                "provider_id": c.provider.id,
+                "name": c.provider.name,
+                "home_zip": c.provider.home_zip,
+                "miles": round(c.miles, 1),
+                "past_visits": c.past_visits,
+            }
+            for c in candidates
+        ],
+        "reserved": reserved,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2),
+    }
+
+
+class ScenarioRequest(BaseModel):
+    name: Optional[str] = None
+    deactivate: List[int] = []  # provider ids
+    add_availability: List[AvailabilityCreate] = []
+    remove_availability: List[AvailabilityCreate] = []  # exact (weekday, start, end) windows on file
+    extra_shifts: List[ShiftCreate] = []
+
+
+class SimulateRequest(BaseModel):
+    mode: str = Field("greedy", pattern="^(greedy|optimal)$")
+    start: Optional[datetime] = Field(None, alias="from")
+    end: Optional[datetime] = Field(None, alias="to")
+    scenarios: List[ScenarioRequest] = Field(..., min_length=1, max_length=whatif.MAX_SCENARIOS)
+
+    @field_validator("start", "end")
+    @classmethod
+    def _naive_utc(cls, v: Optional[datetime]) -> Optional[datetime]:
+        #same as ShiftCreate's starts/ends, so the extra shifts compare with the horizon
+        return _naive(v)
+
+
+@router.post("/simulate")
+def simulate_scenarios(payload: SimulateRequest, session: Session = Depends(get_session)):
+    """
+    What-if: plan shifts starting in [from, to) (everything when omitted) once as they are and once
+    per scenario - providers deactivated, availability windows added or removed, extra hypothetical
+    shifts - and report each scenario's fill rate and assignment changes against that baseline.
+    Nothing is written: the scenarios share one in-memory snapshot, copy-on-write (see scheduling.whatif).
+    """
+    t0 = time.perf_counter()
+    start, end = payload.start, payload.end
+    _check_horizon(start, end)
+
+    touched = {a.provider_id for sc in payload.scenarios for a in sc.add_availability + sc.remove_availability}
+    mentioned = touched | {pid for sc in payload.scenarios for pid in sc.deactivate}
+    if mentioned:
+        unknown = mentioned - set(session.exec(select(Provider.id).where(Provider.id.in_(list(mentioned)))).all())
+        if unknown:
+            raise HTTPException(status_code=404, detail={"message": "Unknown provider", "provider_ids": sorted(unknown)})
+    family_ids = {s.family_id for sc in payload.scenarios for s in sc.extra_shifts}
+    if family_ids:
+        unknown = family_ids - set(session.exec(select(Family.id).where(Family.id.in_(list(family_ids)))).all())
+        if unknown:
+            raise HTTPException(status_code=404, detail={"message": "Unknown family", "family_ids": sorted(unknown)})
+    for sc in payload.scenarios:
+        for s in sc.extra_shifts:
+            if s.starts >= s.ends:
+                raise HTTPException(status_code=400, detail="ends must be after starts")
+            if (start is not None and s.starts < start) or (end is not None and s.starts >= end):
+                raise HTTPException(status_code=400, detail="extra shifts must start inside [from, to)")
+
+    # availability on file for the providers whose windows change; each scenario edits its own copy
+    on_file: Dict[int, Set[tuple]] = {pid: set() for pid in touched}
+    if touched:
+        for pid, weekday, s, e in session.exec(
+            select(ProviderAvailability.provider_id, ProviderAvailability.weekday,
+                   ProviderAvailability.start, ProviderAvailability.end)
+            .where(ProviderAvailability.provider_id.in_(list(touched)))
+        ).all():
+            on_file[pid].add((weekday, s, e))
+
+    scenarios: List[whatif.Scenario] = []
+    for i, sc in enumerate(payload.scenarios):
+        windows = {a.provider_id: set(on_file[a.provider_id]) for a in sc.add_availability + sc.remove_availability}
+        for a in sc.remove_availability:
+            windows[a.provider_id].discard((a.weekday, _parse_hhmm(a.start), _parse_hhmm(a.end)))
+        for a in sc.add_availability:
+            windows[a.provider_id].add((a.weekday, _parse_hhmm(a.start), _parse_hhmm(a.end)))
+        extra = [
+            ShiftRow(-(j + 1), s.family_id, s.starts, s.ends, s.zip, s.required_skills, s.max_miles)
+            for j, s in enumerate(sc.extra_shifts)
+        ]
+        scenarios.append(whatif.Scenario(
+            name=sc.name or f"scenario-{i + 1}",
+            deactivate=set(sc.deactivate),
+            weeks={pid: week_mask(ws) for pid, ws in windows.items()},
+            extra=extra,
+        ))
+
+    extra = [sh for sc in scenarios for sh in sc.extra]
+    snap = Snapshot.load(session, start, end, extra=extra)
+    bookings = whatif.horizon_bookings(session, start, end)
+    geo = get_geo()
+    geo.precompute(snap.zips() + [sh.zip for sh in extra])
+    result = whatif.simulate(snap, bookings, scenarios, geo, payload.mode)
+    result["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    return result
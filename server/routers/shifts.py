@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import datetime, timezone
-from pydantic import BaseModel, field_validator
+from typing import Optional
+from pydantic import BaseModel, Field, field_validator
 
-from server.db import get_session
-from server.models import Shift
+from server.db import get_session, get_async_session
+from server.models import Family, Shift
+from server.bulk import import_rows
+from server.pagination import PageParams
+from server.scheduling.incremental import notify
 
 router = APIRouter()
 
@@ -14,6 +19,7 @@ class ShiftCreate(BaseModel):
     ends: datetime
     zip: str
     required_skills: str
+    max_miles: Optional[float] = Field(None, gt=0)  # farthest a provider may live from zip
 
     @field_validator("starts", "ends", mode="before")
     @classmethod
@@ -38,11 +44,23 @@ def _ensure_naive_utc(dt: datetime) -> datetime:
     return dt
 
 @router.get("/", response_model=list[Shift])
-def list_shifts(session: Session = Depends(get_session)):
-    return session.exec(select(Shift).order_by(Shift.starts)).all()
+async def list_shifts(
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+    page: PageParams = Depends(),
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = Query(None),
+):
+    #?from=&to= keeps shifts overlapping the window; each bound is a range on ix_shift_ends / ix_shift_starts
+    stmt = select(Shift)
+    if from_ is not None:
+        stmt = stmt.where(Shift.ends > _ensure_naive_utc(from_))
+    if to is not None:
+        stmt = stmt.where(Shift.starts < _ensure_naive_utc(to))
+    return await page.respond(session, stmt, (Shift.starts, Shift.id), response)
 
 @router.post("/", response_model=Shift, status_code=201)
-def create_shift(payload: ShiftCreate, session: Session = Depends(get_session)):
+def create_shift(payload: ShiftCreate, background_tasks: BackgroundTasks, session: Session = Depends(get_session)):
     starts = _ensure_naive_utc(payload.starts)
     ends = _ensure_naive_utc(payload.ends)
 
@@ -55,12 +73,44 @@ def create_shift(payload: ShiftCreate, session: Session = Depends(get_session)):
         ends=ends,
         zip=payload.zip,
         required_skills=payload.required_skills,
+        max_miles=payload.max_miles,
     )
     session.add(row)
     session.commit()
     session.refresh(row)
+    notify(background_tasks, shifts=[row.id])
     return row
 
+def _shift_values(payload: ShiftCreate) -> dict:
+    #ShiftCreate's validator has already normalized both to naive UTC
+    starts, ends = payload.starts, payload.ends
+    if starts >= ends:
+        raise ValueError("ends must be after starts")
+    return {
+        "family_id": payload.family_id,
+        "starts": starts,
+        "ends": ends,
+        "zip": payload.zip,
+        "required_skills": payload.required_skills,
+        "max_miles": payload.max_miles,
+    }
+
+def _known_families(conn, batch) -> dict:
+    #one lookup per batch instead of relying on SQLite (which doesn't enforce the foreign key by default)
+    wanted = {v["family_id"] for _, v in batch}
+    found = set(conn.execute(select(Family.id).where(Family.id.in_(wanted))).scalars())
+    return {row: f"family {v['family_id']} not found" for row, v in batch if v["family_id"] not in found}
+
+@router.post("/bulk")
+async def create_shifts_bulk(request: Request, background_tasks: BackgroundTasks):
+    """
+    Import many shifts in one call: a JSON array, NDJSON or CSV with the ShiftCreate fields.
+    Rows that fail validation or name an unknown family are reported and skipped.
+    """
+    result = await import_rows(request, ShiftCreate, Shift, _shift_values, check=_known_families)
+    notify(background_tasks, shifts=result["ids"])
+    return result
+
 @router.delete("/{shift_id:int}", status_code=204)
 def delete_shift(shift_id: int, session: Session = Depends(get_session)):
     row = session.get(Shift, shift_id)
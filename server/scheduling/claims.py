@@ -0,0 +1,216 @@
+"""
+Per-shift claims, so several schedulers (threads, workers, processes) can work one backlog at once.
+
+- uq_shift_confirmed (models.py) lets a shift have at most one confirmed assignment; the database
+  enforces it for every writer
+- claim() writes a batch of picks with INSERT ... ON CONFLICT DO NOTHING RETURNING. A pick whose shift
+  another scheduler confirmed first comes back as lost instead of failing the batch
+- in the same transaction it re-checks each won pick against what was committed since the plan was
+  made (optimistic check), and gives back picks whose shift got another assignment or whose provider
+  would now be double-booked.
+  SQLite: the insert takes the write lock first, so the check sees every committed booking.
+  Postgres: the picks' provider rows are locked (FOR NO KEY UPDATE, in id order) before the insert
+- rolling runs write picks past their firm horizon as "provisional"; release_provisional() clears a
+  horizon's provisional picks so the next run re-plans them with fresh data
+- open_shifts() pages through unassigned shifts in start order; on Postgres each page is locked
+  FOR NO KEY UPDATE SKIP LOCKED until its claims commit, so concurrent runners take disjoint pages
+  instead of racing for the same shifts. SQLite has no row locks: runners in one process still skip
+  each other's pages (held in memory until the session commits or rolls back); runners in separate
+  processes all plan the same pages and the claims sort out who gets each shift
+"""
+from __future__ import annotations
+import threading
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import delete, event, exists, or_, and_
+from sqlalchemy.orm import Session as SASession
+from sqlmodel import Session, select
+
+from server.db import insert_ignoring_duplicates
+from server.models import Assignment, Provider, Shift
+from server.scheduling import continuity
+from server.scheduling.intervals import BusyIntervals
+from server.scheduling.snapshot import SHIFT_COLUMNS, ShiftRow
+from server.scheduling.warm import ShiftWindow, warm_index
+
+if TYPE_CHECKING:
+    from server.scheduling.planner import Planned
+
+_table = Assignment.__table__
+
+
+def _chunks(items: List, size: int = continuity.CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+#shift ids on pages handed out by open_shifts() whose session hasn't committed yet (the in-process SKIP LOCKED)
+_held: Set[int] = set()
+_held_lock = threading.Lock()
+
+
+def _is_postgres(session: Session) -> bool:
+    return session.get_bind().dialect.name == "postgresql"
+
+
+def release_provisional(session: Session, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+    """Delete the provisional assignments of shifts starting in [start, end) and commit; returns how many."""
+    stmt = (
+        select(Assignment.id, Assignment.provider_id, Shift.id, Shift.family_id, Shift.starts, Shift.ends)
+        .join(Shift, Shift.id == Assignment.shift_id)
+        .where(Assignment.status == "provisional")
+    )
+    if start is not None:
+        stmt = stmt.where(Shift.starts >= start)
+    if end is not None:
+        stmt = stmt.where(Shift.starts < end)
+    rows = session.exec(stmt).all()
+    if not rows:
+        return 0
+    conn = session.connection()
+    for ids in _chunks([r[0] for r in rows]):
+        conn.execute(delete(_table).where(_table.c.id.in_(ids)))
+    #not visits, so continuity is unchanged; the warm index drops the bookings on commit
+    if warm_index.loaded:
+        session.info.setdefault("warm_changes", []).extend(
+            ("unbook", pid, ShiftWindow(*window)) for _, pid, *window in rows
+        )
+    session.commit()
+    return len(rows)
+
+
+def open_shifts(
+    session: Session,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after: Optional[Tuple[datetime, int]] = None,
+    limit: int = 500,
+) -> List[ShiftRow]:
+    """
+    The next `limit` shifts with no assignment, starting in [start, end), in (starts, id) order after `after`.
+    On Postgres the rows stay locked until the session commits, and rows another runner holds are skipped.
+    """
+    stmt = select(*SHIFT_COLUMNS).where(~exists().where(Assignment.shift_id == Shift.id))
+    if start is not None:
+        stmt = stmt.where(Shift.starts >= start)
+    if end is not None:
+        stmt = stmt.where(Shift.starts < end)
+    if after is not None:
+        stmt = stmt.where(or_(Shift.starts > after[0], and_(Shift.starts == after[0], Shift.id > after[1])))
+    stmt = stmt.order_by(Shift.starts, Shift.id).limit(limit)
+    if _is_postgres(session):
+        #NO KEY UPDATE: still excludes other runners, but not the FK checks of inserts into assignment
+        return [ShiftRow(*r) for r in session.exec(stmt.with_for_update(skip_locked=True, key_share=True)).all()]
+
+    with _held_lock:
+        if _held:
+            stmt = stmt.where(Shift.id.not_in(list(_held)))
+        page = [ShiftRow(*r) for r in session.exec(stmt).all()]
+        ids = {sh.id for sh in page}
+        _held.update(ids)
+    session.info.setdefault("claims_held", set()).update(ids)
+    return page
+
+
+def _foreign_bookings(conn, picks: Sequence["Planned"], own: set) -> Dict[int, BusyIntervals]:
+    """
+    provider_id -> bookings overlapping the batch's span that this claim didn't just write.
+    One range read over the span (ix_shift_starts), filtered to the picks' providers here:
+    a page's span is a few hours to days, and IN lists per provider chunk cost more than they save.
+    """
+    lo = min(pk.shift.starts for pk in picks)
+    hi = max(pk.shift.ends for pk in picks)
+    pids = {pk.provider.id for pk in picks}
+    grouped: Dict[int, List[Tuple[datetime, datetime]]] = {}
+    for aid, pid, s, e in conn.execute(
+        select(Assignment.id, Assignment.provider_id, Shift.starts, Shift.ends)
+        .join(Shift, Shift.id == Assignment.shift_id)
+        .where(Assignment.status != "declined", Shift.starts < hi, Shift.ends > lo)
+    ).all():
+        if pid in pids and aid not in own:
+            grouped.setdefault(pid, []).append((s, e))
+    return {pid: BusyIntervals(ws) for pid, ws in grouped.items()}
+
+
+def _taken(conn, inserted: Dict[int, int]) -> List[int]:
+    #ids just inserted for shifts that already had another assignment (the unique index only sees confirmed ones)
+    own = set(inserted.values())
+    taken: List[int] = []
+    for sids in _chunks(sorted(inserted)):
+        for aid, sid in conn.execute(
+            select(Assignment.id, Assignment.shift_id).where(Assignment.shift_id.in_(sids))
+        ).all():
+            if aid not in own:
+                taken.append(inserted[sid])
+    return taken
+
+
+def claim(
+    session: Session,
+    picks: Sequence["Planned"],
+    provisional_from: Optional[datetime] = None,
+) -> Tuple[List["Planned"], List["Planned"]]:
+    """
+    Write picks as assignments and commit: returns (won, lost).
+    Picks for shifts starting at or after provisional_from are written "provisional", the rest "confirmed".
+    Lost picks wrote nothing; their shift was taken, or their provider got booked elsewhere meanwhile.
+    """
+    if not picks:
+        return [], []
+
+    def status(pk: "Planned") -> str:
+        return "provisional" if provisional_from is not None and pk.shift.starts >= provisional_from else "confirmed"
+
+    conn = session.connection()
+    if _is_postgres(session):
+        for ids in _chunks(sorted({pk.provider.id for pk in picks})):
+            conn.execute(
+                select(Provider.id).where(Provider.id.in_(ids)).order_by(Provider.id).with_for_update(key_share=True)
+            ).all()
+
+    by_shift = {pk.shift.id: pk for pk in picks}
+    rows = conn.execute(
+        insert_ignoring_duplicates(conn, _table).returning(_table.c.id, _table.c.shift_id),
+        [
+            {"shift_id": pk.shift.id, "provider_id": pk.provider.id, "status": status(pk), "message": pk.message}
+            for pk in picks
+        ],
+    ).all()
+    inserted = {sid: aid for aid, sid in rows}
+
+    clashes: List[int] = []
+    if inserted:
+        clashes += _taken(conn, inserted)
+        foreign = _foreign_bookings(conn, [by_shift[sid] for sid in inserted], set(inserted.values()))
+        for sid, aid in inserted.items():
+            pk = by_shift[sid]
+            busy = foreign.get(pk.provider.id)
+            if busy is not None and busy.overlaps(pk.shift.starts, pk.shift.ends):
+                clashes.append(aid)
+        for ids in _chunks(clashes):
+            conn.execute(delete(_table).where(_table.c.id.in_(ids)))
+
+    dropped = set(clashes)
+    won = [pk for pk in picks if pk.shift.id in inserted and inserted[pk.shift.id] not in dropped]
+    lost = [pk for pk in picks if pk.shift.id not in inserted or inserted[pk.shift.id] in dropped]
+    #Core writes skip the session hooks: count the visits here, queue the warm-index bookings for commit
+    continuity.record(conn, [(pk.shift.id, pk.provider.id) for pk in won if status(pk) == "confirmed"])
+    if warm_index.loaded and won:
+        session.info.setdefault("warm_changes", []).extend(
+            ("book", pk.provider.id, ShiftWindow(pk.shift.id, pk.shift.family_id, pk.shift.starts, pk.shift.ends))
+            for pk in won
+        )
+    session.commit()
+    return won, lost
+
+
+@event.listens_for(SASession, "after_transaction_end")
+def _release(session: SASession, transaction) -> None:
+    #commit, rollback or close of the outermost transaction
+    if transaction.parent is not None:
+        return
+    ids = session.info.pop("claims_held", None)
+    if ids:
+        with _held_lock:
+            _held.difference_update(ids)
@@ -0,0 +1,226 @@
+"""
+family_provider_continuity: (count, last_seen) per family and provider, kept in step with Assignment.
+
+- ORM writes are folded in by the session hook below, inside the same flush, so the aggregate commits
+  or rolls back together with the assignment itself
+- a new assignment bumps its row (count + 1, last_seen = max); deletes, status changes, re-pointed
+  assignments and edited or deleted shifts recompute just the (family, provider) pairs they touch
+- declined and provisional assignments don't count as visits
+- Core writes to assignment bypass the hook; call record() / refresh() on the same connection
+- rebuild() recomputes the whole table:  python -m server.scheduling.continuity
+"""
+from __future__ import annotations
+import argparse
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import case, delete, event, func, inspect, insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session as SASession
+from sqlmodel import Session, select
+
+from server.db import upsert
+from server.models import Assignment, FamilyProviderContinuity, Shift
+
+Pair = Tuple[int, int]  # (family_id, provider_id)
+CHUNK = 500  # ids per IN list, well under SQLite's bound-parameter limit
+NOT_VISITS = ("declined", "provisional")
+
+_table = FamilyProviderContinuity.__table__
+
+
+def _chunks(items: List, size: int = CHUNK) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _aggregate():
+    return (
+        select(Shift.family_id, Assignment.provider_id, func.count(), func.max(Shift.starts))
+        .join(Shift, Shift.id == Assignment.shift_id)
+        .where(Assignment.status.not_in(NOT_VISITS))
+        .group_by(Shift.family_id, Assignment.provider_id)
+    )
+
+
+def _insert_from_source(conn: Connection, query) -> int:
+    return conn.execute(
+        insert(_table).from_select(["family_id", "provider_id", "count", "last_seen"], query)
+    ).rowcount
+
+
+# ---- maintenance ----
+
+def record(conn: Connection, assignments: Iterable[Tuple[int, int]]) -> None:
+    """Count new (shift_id, provider_id) assignments: one lookup of their shifts, one upsert."""
+    assignments = [(sid, pid) for sid, pid in assignments if sid is not None and pid is not None]
+    if not assignments:
+        return
+    shifts: Dict[int, Tuple[int, datetime]] = {}
+    for ids in _chunks(sorted({sid for sid, _ in assignments})):
+        shifts.update(
+            (sid, (fid, starts))
+            for sid, fid, starts in conn.execute(
+                select(Shift.id, Shift.family_id, Shift.starts).where(Shift.id.in_(ids))
+            ).all()
+        )
+    bumps: Dict[Pair, Tuple[int, datetime]] = {}
+    for sid, pid in assignments:
+        if sid not in shifts:
+            continue
+        fid, starts = shifts[sid]
+        count, last = bumps.get((fid, pid), (0, starts))
+        bumps[(fid, pid)] = (count + 1, max(last, starts))
+    if not bumps:
+        return
+
+    stmt = upsert(conn, _table)
+    new = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_table.c.family_id, _table.c.provider_id],
+        set_={
+            "count": _table.c["count"] + new["count"],
+            "last_seen": case((new.last_seen > _table.c.last_seen, new.last_seen), else_=_table.c.last_seen),
+        },
+    )
+    conn.execute(stmt, [
+        {"family_id": fid, "provider_id": pid, "count": count, "last_seen": last}
+        for (fid, pid), (count, last) in bumps.items()
+    ])
+
+
+def refresh(conn: Connection, pairs: Iterable[Pair]) -> None:
+    """
+    Recompute rows for these (family_id, provider_id) pairs from Assignment and Shift.
+    Works a chunk of families at a time; every pair within a chunk's families x providers is
+    recomputed, which is a few more rows than asked for and still exact.
+    """
+    by_family: Dict[int, Set[int]] = {}
+    for fid, pid in pairs:
+        if fid is not None and pid is not None:
+            by_family.setdefault(fid, set()).add(pid)
+    for fids in _chunks(sorted(by_family)):
+        pids = sorted(set().union(*(by_family[f] for f in fids)))
+        for pid_chunk in _chunks(pids):
+            conn.execute(delete(_table).where(_table.c.family_id.in_(fids), _table.c.provider_id.in_(pid_chunk)))
+            _insert_from_source(
+                conn, _aggregate().where(Shift.family_id.in_(fids), Assignment.provider_id.in_(pid_chunk))
+            )
+
+
+def rebuild(conn: Connection) -> int:
+    """Recompute the whole table from Assignment and Shift; returns the number of rows."""
+    conn.execute(delete(_table))
+    return _insert_from_source(conn, _aggregate())
+
+
+def backfill(session: Session) -> int:
+    """Populate the table for databases created before it existed. No-op once populated."""
+    if session.exec(select(func.count()).select_from(FamilyProviderContinuity)).one():
+        return 0
+    if not session.exec(select(Assignment.id).limit(1)).first():
+        return 0
+    rows = rebuild(session.connection())
+    session.commit()
+    return rows
+
+
+# ---- reads ----
+
+def history(session: Session, family_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict[int, Tuple[int, datetime]]]:
+    #family_id -> provider_id -> (count, last_seen), for every family or just these
+    stmt = select(
+        FamilyProviderContinuity.family_id, FamilyProviderContinuity.provider_id,
+        FamilyProviderContinuity.count, FamilyProviderContinuity.last_seen,
+    )
+    out: Dict[int, Dict[int, Tuple[int, datetime]]] = {}
+    batches = [None] if family_ids is None else list(_chunks(sorted(set(family_ids))))
+    for fids in batches:
+        q = stmt if fids is None else stmt.where(FamilyProviderContinuity.family_id.in_(fids))
+        for fid, pid, count, last in session.exec(q).all():
+            out.setdefault(fid, {})[pid] = (count, last)
+    return out
+
+
+# ---- session hook: fold ORM assignment/shift writes into the aggregate within the same flush ----
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+#active_history: setting one of these on an expired object loads the old value first, so the flush
+#hook can tell which (family, provider) pair an edit took a visit away from
+for _attr in (Assignment.provider_id, Assignment.shift_id, Assignment.status, Shift.family_id, Shift.starts):
+    event.listen(_attr, "set", _load_old_value, active_history=True)
+
+
+def _counted(a: Assignment) -> bool:
+    return a.provider_id is not None and a.status not in NOT_VISITS
+
+
+@event.listens_for(SASession, "after_flush")
+def _maintain(session: SASession, flush_context) -> None:
+    added: List[Tuple[int, int]] = []       # (shift_id, provider_id) to bump
+    stale: Set[Tuple[int, int]] = set()     # (shift_id, provider_id) whose pair is recomputed
+    old_family: Dict[int, Set[int]] = {}    # shift_id -> family ids before this flush (edited/deleted shifts)
+
+    for obj in session.new:
+        if isinstance(obj, Assignment) and _counted(obj):
+            added.append((obj.shift_id, obj.provider_id))
+    for obj in session.deleted:
+        if isinstance(obj, Assignment):
+            stale.add((obj.shift_id, obj.provider_id))
+        elif isinstance(obj, Shift):
+            old_family[obj.id] = {obj.family_id}
+    for obj in session.dirty:
+        if isinstance(obj, Assignment):
+            state = inspect(obj)
+            pid_hist, sid_hist = state.attrs.provider_id.history, state.attrs.shift_id.history
+            if pid_hist.has_changes() or sid_hist.has_changes() or state.attrs.status.history.has_changes():
+                stale.add(((sid_hist.deleted or [obj.shift_id])[0], (pid_hist.deleted or [obj.provider_id])[0]))
+                stale.add((obj.shift_id, obj.provider_id))
+        elif isinstance(obj, Shift):
+            state = inspect(obj)
+            fam_hist = state.attrs.family_id.history
+            if fam_hist.has_changes() or state.attrs.starts.history.has_changes():
+                old_family[obj.id] = {obj.family_id, *fam_hist.deleted}
+
+    if not (added or stale or old_family):
+        return
+    conn = session.connection()
+    for ids in _chunks(sorted(old_family)):
+        stale.update(conn.execute(
+            select(Assignment.shift_id, Assignment.provider_id).where(Assignment.shift_id.in_(ids))
+        ).all())
+
+    if not stale:
+        record(conn, added)
+        return
+    #mixed flush (rare): recompute the new rows' pairs too rather than bump them twice
+    stale.update(added)
+    families: Dict[int, Set[int]] = {sid: set(f) for sid, f in old_family.items()}
+    for ids in _chunks(sorted({sid for sid, _ in stale if sid is not None})):
+        for sid, fid in conn.execute(select(Shift.id, Shift.family_id).where(Shift.id.in_(ids))).all():
+            families.setdefault(sid, set()).add(fid)
+    refresh(conn, {(fid, pid) for sid, pid in stale for fid in families.get(sid, ())})
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Rebuild family_provider_continuity from assignment history.")
+    ap.add_argument("--database-url", help="rebuild in this database instead of DATABASE_URL")
+    args = ap.parse_args()
+
+    if args.database_url:
+        from server.db import make_engine
+        engine = make_engine(args.database_url)
+        FamilyProviderContinuity.metadata.create_all(engine)
+    else:
+        from server.db import engine, init_db
+        init_db()
+    with engine.begin() as conn:
+        rows = rebuild(conn)
+    print(f"family_provider_continuity: {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+from __future__ import annotations
+import copy
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from datetime import datetime
+
+import numpy as np
+from sqlmodel import Session, select
+
+from server.models import ProviderAvailability, Shift, Assignment
+from server.scheduling import continuity
+from server.scheduling.geo import ZipGeo
+from server.scheduling.intervals import BusyIntervals, load_busy
+from server.scheduling.snapshot import ProviderRow, load_providers
+from server.scheduling.spatial import ProviderLocator
+from server.scheduling.skills import SkillBits, parse_skills
+from server.scheduling.weekmask import WeekMatrix, covers, shift_mask, week_mask
+
+
+class EligibilityIndex:
+    """
+    Everything run_scheduler needs to answer "can provider P take shift S?" without touching the DB.
+    Built from a handful of bulk queries (see load()), then kept current with book() as the run assigns shifts.
+    - masks:        provider_id -> skill bitmask (see SkillBits), parsed once per provider
+    - week:         provider_id -> weekly availability bitmap (see weekmask), compiled once per provider
+    - busy:         provider_id -> BusyIntervals of every shift they're already assigned to
+    - assigned:     shift ids that already have an assignment
+    - history:      family_id -> provider_id -> (count, last_seen) for continuity ranking,
+                    read from the family_provider_continuity aggregate (see scheduling.continuity)
+    """
+
+    def __init__(self, providers: List[ProviderRow]):
+        self.providers = providers
+        self.by_id: Dict[int, ProviderRow] = {p.id: p for p in providers}
+        self._roster: Dict[int, int] = {p.id: i for i, p in enumerate(providers)}
+        self.bits = SkillBits()
+        self.masks: Dict[int, int] = {p.id: self.bits.mask(parse_skills(p.skills)) for p in providers}
+        self._pools: Dict[int, List[ProviderRow]] = {}
+        self._pool_weeks: Dict[int, WeekMatrix] = {}
+        self._locators: Dict[int, ProviderLocator] = {}
+        self.week: Dict[int, int] = {}
+        self.busy: Dict[int, BusyIntervals] = {}
+        self.assigned: Set[int] = set()
+        self.history: Dict[int, Dict[int, Tuple[int, datetime]]] = {}
+        self.window: Optional[Tuple[datetime, datetime]] = None
+
+    @classmethod
+    def load(
+        cls,
+        session: Session,
+        window: Optional[Tuple[datetime, datetime]] = None,
+        family_ids: Optional[Iterable[int]] = None,
+    ) -> "EligibilityIndex":
+        """
+        4 queries total, regardless of how many providers/shifts exist.
+        With a window, only bookings overlapping it are read, and continuity history is looked up
+        for just the given families - enough to plan any shift inside the window.
+        """
+        idx = cls(load_providers(session))  # plain rows: a later commit on this session can't expire them
+        idx.window = window
+
+        idx._compile_weeks(session.exec(
+            select(ProviderAvailability.provider_id, ProviderAvailability.weekday,
+                   ProviderAvailability.start, ProviderAvailability.end)
+        ).all())
+
+        stmt = select(Assignment.shift_id, Assignment.provider_id, Shift.starts, Shift.ends)
+        if window is None:
+            stmt = stmt.join(Shift, Shift.id == Assignment.shift_id, isouter=True)
+        else:
+            stmt = stmt.join(Shift, Shift.id == Assignment.shift_id).where(
+                Shift.starts < window[1], Shift.ends > window[0]
+            )
+        for shift_id, pid, starts, ends in session.exec(stmt).all():
+            idx._record(shift_id, pid, None, starts, ends)
+
+        if window is None:
+            idx.history = continuity.history(session)
+        elif family_ids:
+            idx.history = continuity.history(session, family_ids)
+        return idx
+
+    def _compile_weeks(self, rows: Iterable[tuple]) -> None:
+        windows: Dict[int, List[tuple]] = {}
+        for pid, weekday, start, end in rows:
+            if pid in self.by_id:
+                windows.setdefault(pid, []).append((weekday, start, end))
+        for pid, ws in windows.items():
+            self.week[pid] = week_mask(ws)
+
+    def _record(self, shift_id: Optional[int], provider_id: Optional[int], family_id: Optional[int],
+                starts: Optional[datetime], ends: Optional[datetime]) -> None:
+        if shift_id is not None:
+            self.assigned.add(shift_id)
+        if provider_id is None or starts is None:
+            return
+        busy = self.busy.get(provider_id)
+        if busy is None:
+            busy = self.busy[provider_id] = BusyIntervals()
+        busy.add(starts, ends)
+        if family_id is not None:
+            fam = self.history.setdefault(family_id, {})
+            count, last = fam.get(provider_id, (0, datetime.min))
+            fam[provider_id] = (count + 1, max(last, starts))
+
+    # ---- checks ----
+
+    def has_skill(self, provider_id: int, required: str) -> bool:
+        need = self.bits.need(required)
+        return self.masks.get(provider_id, 0) & need == need
+
+    def pool(self, required: str) -> List[ProviderRow]:
+        """Providers holding every skill in required, in roster order; cached per distinct need."""
+        need = self.bits.need(required)
+        found = self._pools.get(need)
+        if found is None:
+            found = self._pools[need] = [p for p in self.providers if self.masks[p.id] & need == need]
+        return found
+
+    def is_available(self, provider_id: int, shift: Shift) -> bool:
+        #the weekly bitmap covers every 15-minute slot of the shift (see weekmask), so overnight shifts can span two rows
+        return covers(self.week.get(provider_id, 0), shift_mask(shift.starts, shift.ends))
+
+    def _free(self, shift: Shift) -> Tuple[List[ProviderRow], np.ndarray]:
+        #(pool, bool per pool position): one vectorized AND over the pool's WeekMatrix, built on first use per need
+        need = self.bits.need(shift.required_skills)
+        pool = self.pool(shift.required_skills)
+        weeks = self._pool_weeks.get(need)
+        if weeks is None:
+            weeks = self._pool_weeks[need] = WeekMatrix([self.week.get(p.id, 0) for p in pool])
+        return pool, weeks.free(shift_mask(shift.starts, shift.ends))
+
+    def available(self, shift: Shift) -> List[ProviderRow]:
+        """
+        pool(shift.required_skills) narrowed to providers whose week covers the shift: one vectorized
+        AND over the pool's WeekMatrix (built on first use per distinct need) instead of a check per provider.
+        """
+        pool, free = self._free(shift)
+        return [pool[i] for i in free.nonzero()[0]]
+
+    def locator(self, required: str, geo: ZipGeo) -> ProviderLocator:
+        """KD-tree over the home ZIPs of pool(required) (see scheduling.spatial); cached per distinct need."""
+        need = self.bits.need(required)
+        found = self._locators.get(need)
+        if found is None:
+            found = self._locators[need] = ProviderLocator(self.pool(required), geo)
+        return found
+
+    def by_distance(
+        self, shift: Shift, geo: ZipGeo, max_miles: Optional[float] = None,
+    ) -> Iterator[Tuple[ProviderRow, float]]:
+        """
+        candidates(shift) nearest first, with their miles; ties and unknown (inf) distances in roster order.
+        Distances come from the pool's ProviderLocator buckets, one vectorized row per shift ZIP, and
+        only the free providers are ordered. The conflict check runs lazily, so taking the first few
+        checks just those. With max_miles, farther and unknown distances are left out.
+        """
+        pool, free = self._free(shift)
+        loc = self.locator(shift.required_skills, geo)
+        cand = free.nonzero()[0]
+        pts = loc.point_of[cand]
+        placed = pts >= 0
+        miles = np.full(len(cand), np.inf)
+        miles[placed] = loc.point_miles(shift.zip)[pts[placed]]
+        if max_miles is not None:
+            near = miles <= max_miles
+            cand, miles = cand[near], miles[near]
+        for j in np.lexsort((cand, miles)):
+            p = pool[cand[j]]
+            if not self.has_conflict(p.id, shift):
+                yield p, float(miles[j])
+
+    def has_conflict(self, provider_id: int, shift: Shift) -> bool:
+        busy = self.busy.get(provider_id)
+        return busy is not None and busy.overlaps(shift.starts, shift.ends)
+
+    def eligible(self, providers: Iterable[ProviderRow], shift: Shift) -> Iterator[ProviderRow]:
+        need = self.bits.need(shift.required_skills)
+        slots = shift_mask(shift.starts, shift.ends)
+        for p in providers:
+            if self.masks.get(p.id, 0) & need != need:
+                continue
+            if not covers(self.week.get(p.id, 0), slots):
+                continue
+            if self.has_conflict(p.id, shift):
+                continue
+            yield p
+
+    def candidates(self, shift: Shift) -> Iterator[ProviderRow]:
+        #eligible(pool(...), shift), same providers in the same order, with skills + availability vectorized
+        for p in self.available(shift):
+            if not self.has_conflict(p.id, shift):
+                yield p
+
+    def past_providers(self, family_id: int) -> List[ProviderRow]:
+        #active providers who've served this family, most frequent first, then most recent
+        #reads just the family's history, not the roster; equal (count, last) keep roster order
+        seen = self.history.get(family_id, {})
+        ranked = [self.by_id[pid] for pid in seen if pid in self.by_id]
+        ranked.sort(key=lambda p: (-seen[p.id][0], -seen[p.id][1].timestamp(), self._roster[p.id]))
+        return ranked
+
+    def subset(self, provider_ids: Iterable[int], family_ids: Iterable[int], shift_ids: Iterable[int]) -> "EligibilityIndex":
+        """
+        A fresh index over just these providers (in roster order), these families' history and these
+        shifts' assigned flags. Caches start empty, so it pickles small (see scheduling.parallel).
+        """
+        keep = sorted({pid for pid in provider_ids if pid in self.by_id}, key=self._roster.__getitem__)
+        sub = EligibilityIndex([])
+        sub.providers = [self.by_id[pid] for pid in keep]
+        sub.by_id = {p.id: p for p in sub.providers}
+        sub._roster = {pid: i for i, pid in enumerate(keep)}
+        sub.bits = copy.deepcopy(self.bits)  # skills already parsed: masks carry over as they are
+        sub.masks = {pid: self.masks[pid] for pid in keep}
+        sub.week = {pid: self.week[pid] for pid in keep if pid in self.week}
+        sub.busy = {pid: self.busy[pid] for pid in keep if pid in self.busy}
+        sub.assigned = {sid for sid in shift_ids if sid in self.assigned}
+        sub.history = {fid: dict(self.history[fid]) for fid in family_ids if fid in self.history}
+        sub.window = self.window
+        return sub
+
+    # ---- updates ----
+
+    def refresh_bookings(self, session: Session, provider_ids: Iterable[int], shift_ids: Iterable[int]) -> None:
+        """
+        Catch up with bookings another writer committed since load() (2 queries): these providers'
+        busy intervals are re-read within the index's window, and these shifts marked if now assigned.
+        """
+        pids, sids = list(provider_ids), list(shift_ids)
+        if pids:
+            fresh = load_busy(session, pids, self.window)
+            for pid in pids:
+                self.busy[pid] = fresh.get(pid, BusyIntervals())
+        if sids:
+            self.assigned.update(session.exec(
+                select(Assignment.shift_id).where(Assignment.shift_id.in_(sids))
+            ).all())
+
+    def refresh_providers(self, session: Session, provider_ids: Iterable[int]) -> None:
+        """Re-read profile + availability for a few providers (2 queries); inactive ones drop out."""
+        ids = list(provider_ids)
+        if not ids:
+            return
+        fresh = {p.id: p for p in load_providers(session, ids)}
+        self._pools.clear()
+        self._pool_weeks.clear()
+        self._locators.clear()
+        for pid in ids:
+            self.by_id.pop(pid, None)
+            self.masks.pop(pid, None)
+            self.week.pop(pid, None)
+        for p in fresh.values():
+            self.by_id[p.id] = p
+            self.masks[p.id] = self.bits.mask(parse_skills(p.skills))
+        self.providers = sorted(self.by_id.values(), key=lambda p: p.id)
+        self._roster = {p.id: i for i, p in enumerate(self.providers)}
+
+        self._compile_weeks(session.exec(
+            select(ProviderAvailability.provider_id, ProviderAvailability.weekday,
+                   ProviderAvailability.start, ProviderAvailability.end)
+            .where(ProviderAvailability.provider_id.in_(list(fresh)))
+        ).all())
+
+    def book(self, provider_id: int, shift: Shift) -> None:
+        """Record an assignment made during the run so later shifts see it."""
+        self._record(shift.id, provider_id, shift.family_id, shift.starts, shift.ends)
+
+    def unbook(self, provider_id: int, shift: Shift) -> None:
+        """
+        Undo book(). Continuity counts go back down; last_seen is left as-is
+        (it only breaks ties between providers with equal counts).
+        """
+        self.assigned.discard(shift.id)
+        busy = self.busy.get(provider_id)
+        if busy is not None:
+            busy.remove(shift.starts, shift.ends)
+        fam = self.history.get(shift.family_id, {})
+        if provider_id in fam:
+            count, last = fam[provider_id]
+            if count <= 1:
+                del fam[provider_id]
+            else:
+                fam[provider_id] = (count - 1, last)
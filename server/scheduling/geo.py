@@ -0,0 +1,137 @@
+from __future__ import annotations
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+from pathlib import Path
+import csv
+import gzip
+import threading
+
+import numpy as np
+
+from server.metrics import zip_distance_lookups
+
+# US ZIP -> centroid table (MIT-licensed `zipcodes` dataset, same source as the npm package the client ships)
+DATA_FILE = Path(__file__).resolve().parent.parent / "data" / "zip_centroids.csv.gz"
+
+EARTH_RADIUS_MI = 3958.8
+MAX_MATRIX_ZIPS = 4096  # 4096^2 float64 = 128MB, beyond that fall back to per-row vectors
+
+
+def normalize_zip(z: Optional[str]) -> str:
+    #"98103-1234" / " 98103 " -> "98103"
+    return (z or "").strip()[:5]
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    #all args in radians, broadcasts like numpy does; returns miles
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_MI * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class ZipGeo:
+    """
+    In-process ZIP distance engine.
+    - Centroids are held as two radian arrays indexed by a zip -> row map
+    - distances_from() scores one ZIP against many in a single vectorized call
+    - precompute() builds a dense matrix for the ZIPs actually in use so lookups are O(1)
+    Unknown ZIPs are reported as inf miles (same contract as the old Node helper).
+    """
+
+    def __init__(self, table: Dict[str, Tuple[float, float]]):
+        self.zips = list(table)
+        self.row = {z: i for i, z in enumerate(self.zips)}
+        coords = np.array([table[z] for z in self.zips], dtype=np.float64).reshape(-1, 2)
+        self.lat = np.radians(coords[:, 0])
+        self.lon = np.radians(coords[:, 1])
+
+        self._lock = threading.Lock()
+        # (zip -> matrix position, matrix) kept in one tuple so readers never see a mismatched pair
+        self._dense: Tuple[Dict[str, int], np.ndarray] = ({}, np.empty((0, 0), dtype=np.float64))
+
+    @classmethod
+    def from_file(cls, path: Path = DATA_FILE) -> "ZipGeo":
+        table: Dict[str, Tuple[float, float]] = {}
+        with gzip.open(path, "rt", newline="") as fh:
+            for rec in csv.DictReader(fh):
+                table[rec["zip"]] = (float(rec["lat"]), float(rec["lon"]))
+        return cls(table)
+
+    def __contains__(self, z: str) -> bool:
+        return normalize_zip(z) in self.row
+
+    def coords(self, z: str) -> Optional[Tuple[float, float]]:
+        #(lat, lon) in degrees, or None if unknown
+        i = self.row.get(normalize_zip(z))
+        if i is None:
+            return None
+        return float(np.degrees(self.lat[i])), float(np.degrees(self.lon[i]))
+
+    def _rows(self, zips: Sequence[str]) -> np.ndarray:
+        return np.array([self.row.get(normalize_zip(z), -1) for z in zips], dtype=np.int64)
+
+    def distance(self, zip_a: str, zip_b: str) -> float:
+        a, b = normalize_zip(zip_a), normalize_zip(zip_b)
+        pos, matrix = self._dense
+        if a in pos and b in pos:
+            zip_distance_lookups.inc(call="distance", result="hit")
+            return float(matrix[pos[a], pos[b]])
+        zip_distance_lookups.inc(call="distance", result="miss")
+        ia, ib = self.row.get(a), self.row.get(b)
+        if ia is None or ib is None:
+            return float("inf")
+        return float(_haversine(self.lat[ia], self.lon[ia], self.lat[ib], self.lon[ib]))
+
+    def distances_from(self, zip_a: str, zips: Sequence[str]) -> np.ndarray:
+        """Miles from zip_a to every ZIP in zips (inf where either side is unknown)."""
+        out = np.full(len(zips), np.inf, dtype=np.float64)
+        if not len(zips):
+            return out
+        a = normalize_zip(zip_a)
+        pos, matrix = self._dense
+        if a in pos:
+            cols = np.array([pos.get(normalize_zip(z), -1) for z in zips], dtype=np.int64)
+            if (cols >= 0).all():
+                zip_distance_lookups.inc(call="distances_from", result="hit")
+                return matrix[pos[a], cols]
+        zip_distance_lookups.inc(call="distances_from", result="miss")
+        ia = self.row.get(a)
+        if ia is None:
+            return out
+        rows = self._rows(zips)
+        known = rows >= 0
+        out[known] = _haversine(self.lat[ia], self.lon[ia], self.lat[rows[known]], self.lon[rows[known]])
+        return out
+
+    def precompute(self, zips: Iterable[str]) -> int:
+        """
+        Build the dense distance matrix for the given ZIPs (plus any already cached).
+        Returns the matrix size; a no-op when nothing new is requested.
+        """
+        wanted = {normalize_zip(z) for z in zips} & self.row.keys()
+        with self._lock:
+            pos = self._dense[0]
+            if wanted <= pos.keys():
+                return len(pos)
+            keys = sorted(wanted | pos.keys())
+            if len(keys) > MAX_MATRIX_ZIPS:
+                return len(pos)
+            rows = self._rows(keys)
+            lat, lon = self.lat[rows], self.lon[rows]
+            matrix = _haversine(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+            self._dense = ({z: i for i, z in enumerate(keys)}, matrix)
+            return len(keys)
+
+
+_geo: Optional[ZipGeo] = None
+_geo_lock = threading.Lock()
+
+
+def get_geo() -> ZipGeo:
+    #loaded once per process (app startup calls this), every caller shares the same table
+    global _geo
+    if _geo is None:
+        with _geo_lock:
+            if _geo is None:
+                _geo = ZipGeo.from_file()
+    return _geo
@@ -0,0 +1,187 @@
+from __future__ import annotations
+from typing import Dict, Iterable, Optional, Set, Tuple
+from datetime import datetime, timedelta, timezone
+import logging
+import os
+import threading
+
+from fastapi import BackgroundTasks
+from sqlmodel import Session, select, func
+
+from server.db import engine
+from server.models import Provider, ProviderAvailability, Shift, Assignment, Family
+from server.scheduling.eligibility import EligibilityIndex
+from server.scheduling.skills import parse_skills, spellings
+from server.scheduling.geo import get_geo
+from server.scheduling.planner import plan_greedy, write_plan
+from server.scheduling.weekmask import covers, shift_mask, week_mask
+
+log = logging.getLogger(__name__)
+
+# Dirty-set bookkeeping for incremental scheduling.
+# Process-local on purpose: a restart drops pending marks, and the nightly full /schedule/run covers those.
+_lock = threading.Lock()
+_dirty_shifts: Set[int] = set()
+_dirty_providers: Set[int] = set()
+
+# AUTO_SCHEDULE=1 re-plans in a background task right after each triggering write
+AUTO_SCHEDULE = os.getenv("AUTO_SCHEDULE", "").strip().lower() in {"1", "true", "yes"}
+
+# Open shifts a provider change pulls in are limited to this many days ahead; later ones wait for the
+# nightly full run, so a pass stays sized by the near horizon rather than the whole backlog
+INCREMENTAL_HORIZON_DAYS = int(os.getenv("INCREMENTAL_HORIZON_DAYS", "14"))
+
+
+def mark_shifts(shift_ids: Iterable[Optional[int]]) -> None:
+    #shift was added or lost its provider: it needs (re)planning
+    with _lock:
+        _dirty_shifts.update(sid for sid in shift_ids if sid is not None)
+
+
+def mark_providers(provider_ids: Iterable[Optional[int]]) -> None:
+    #availability/active flag changed: their upcoming bookings need re-checking, open shifts may now fit them
+    with _lock:
+        _dirty_providers.update(pid for pid in provider_ids if pid is not None)
+
+
+def pending() -> Dict[str, int]:
+    with _lock:
+        return {"shifts": len(_dirty_shifts), "providers": len(_dirty_providers)}
+
+
+def _drain() -> Tuple[Set[int], Set[int]]:
+    with _lock:
+        shifts, providers = set(_dirty_shifts), set(_dirty_providers)
+        _dirty_shifts.clear()
+        _dirty_providers.clear()
+    return shifts, providers
+
+
+def notify(
+    background_tasks: Optional[BackgroundTasks],
+    shifts: Iterable[Optional[int]] = (),
+    providers: Iterable[Optional[int]] = (),
+) -> None:
+    """Called by mutating routes once their write has committed."""
+    mark_shifts(shifts)
+    mark_providers(providers)
+    if AUTO_SCHEDULE and background_tasks is not None:
+        background_tasks.add_task(run_pending)
+
+
+def run_pending() -> dict:
+    #background-task entry point: own session, never raises into the response cycle
+    try:
+        with Session(engine) as session:
+            return replan(session)
+    except Exception:
+        log.exception("incremental scheduling failed")
+        return {}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _provider_shifts(session: Session, provider_ids: Set[int]) -> Set[int]:
+    """
+    Upcoming shifts a provider change can affect:
+    - shifts they're booked on (may no longer be valid)
+    - open shifts in the next INCREMENTAL_HORIZON_DAYS that one of them, still active, has the skill for
+      and the weekly availability to cover (may now be coverable)
+    """
+    now = _now()
+    ids = list(provider_ids)
+    affected = set(session.exec(
+        select(Assignment.shift_id)
+        .join(Shift, Shift.id == Assignment.shift_id)
+        .where(Assignment.provider_id.in_(ids), Shift.starts >= now)
+    ).all())
+
+    #inactive providers can't cover anything; an open shift counts when one provider has both its skill and its time
+    covering: Dict[int, Tuple[Set[str], int]] = {
+        pid: (parse_skills(raw), 0)
+        for pid, raw in session.exec(select(Provider.id, Provider.skills).where(Provider.id.in_(ids), Provider.active == True)).all()
+    }
+    windows: Dict[int, list] = {}
+    if covering:
+        for pid, weekday, start, end in session.exec(
+            select(ProviderAvailability.provider_id, ProviderAvailability.weekday,
+                   ProviderAvailability.start, ProviderAvailability.end)
+            .where(ProviderAvailability.provider_id.in_(list(covering)))
+        ).all():
+            windows.setdefault(pid, []).append((weekday, start, end))
+    covering = {pid: (skills, week_mask(windows[pid])) for pid, (skills, _) in covering.items() if skills and pid in windows}
+    if covering:
+        skills = set().union(*(sk for sk, _ in covering.values()))
+        has_assignment = select(Assignment.id).where(Assignment.shift_id == Shift.id).exists()
+        for sid, starts, ends, required in session.exec(
+            select(Shift.id, Shift.starts, Shift.ends, Shift.required_skills).where(
+                Shift.starts >= now,
+                Shift.starts < now + timedelta(days=INCREMENTAL_HORIZON_DAYS),
+                ~has_assignment,
+                func.lower(func.trim(Shift.required_skills)).in_(list(spellings(skills))),
+            )
+        ).all():
+            need, slots = parse_skills(required), shift_mask(starts, ends)
+            if any(need <= sk and covers(week, slots) for sk, week in covering.values()):
+                affected.add(sid)
+    return affected
+
+
+def replan(session: Session) -> dict:
+    """
+    Re-plan only what changed since the last pass:
+    1) expand dirty providers into the upcoming shifts they touch
+    2) drop bookings on those shifts whose provider is no longer active, qualified or available (displaced)
+    3) greedily fill every dirty shift that is now open, using an index loaded for just their time window
+    """
+    shift_ids, provider_ids = _drain()
+    try:
+        if provider_ids:
+            shift_ids |= _provider_shifts(session, provider_ids)
+        if not shift_ids:
+            return {"assigned": 0, "displaced": 0, "considered": 0}
+
+        shifts = session.exec(
+            select(Shift).where(Shift.id.in_(list(shift_ids))).order_by(Shift.starts)
+        ).all()
+        if not shifts:
+            return {"assigned": 0, "displaced": 0, "considered": 0}
+
+        window = (min(sh.starts for sh in shifts), max(sh.ends for sh in shifts))
+        index = EligibilityIndex.load(session, window=window, family_ids={sh.family_id for sh in shifts})
+        by_id = {sh.id: sh for sh in shifts}
+
+        displaced = 0
+        for a in session.exec(select(Assignment).where(Assignment.shift_id.in_(list(by_id)))).all():
+            sh = by_id[a.shift_id]
+            still_ok = (
+                a.provider_id in index.by_id
+                and index.has_skill(a.provider_id, sh.required_skills)
+                and index.is_available(a.provider_id, sh)
+            )
+            if still_ok:
+                continue
+            index.unbook(a.provider_id, sh)
+            session.delete(a)
+            displaced += 1
+        # a shift with a valid booking left (e.g. a second provider) stays assigned
+        if displaced:
+            session.flush()
+            index.assigned.update(session.exec(
+                select(Assignment.shift_id).where(Assignment.shift_id.in_(list(by_id)))
+            ).all())
+
+        families = {f.id: f for f in session.exec(
+            select(Family).where(Family.id.in_(list({sh.family_id for sh in shifts})))
+        ).all()}
+        geo = get_geo()
+        planned = plan_greedy(index, shifts, families, geo)
+        won, _ = write_plan(session, planned)
+    except Exception:
+        # put the work back so the next pass (or the nightly full run) retries it
+        mark_shifts(shift_ids)
+        mark_providers(provider_ids)
+        raise
+    return {"assigned": len(won), "displaced": displaced, "considered": len(shifts)}
@@ -0,0 +1,98 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Tuple
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+
+from sqlmodel import Session, select
+
+from server.models import Shift, Assignment
+
+
+class BusyIntervals:
+    """
+    One provider's booked time, kept as sorted, non-overlapping [start, end) windows.
+    Overlapping/touching bookings are merged on insert, so both the starts and ends lists stay sorted
+    and "does [s, e) hit anything?" is a single bisect: O(log n) however long the history gets.
+    Windows that only touch at an endpoint don't conflict.
+    The raw bookings are kept alongside so remove() can rebuild the merged view.
+    """
+
+    __slots__ = ("starts", "ends", "_raw")
+
+    def __init__(self, windows: Iterable[Tuple[datetime, datetime]] = ()):
+        self._raw: List[Tuple[datetime, datetime]] = sorted((s, e) for s, e in windows if s < e)
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        self.starts: List[datetime] = []
+        self.ends: List[datetime] = []
+        for s, e in self._raw:
+            self._append_sorted(s, e)
+
+    def _append_sorted(self, s: datetime, e: datetime) -> None:
+        if not s < e:
+            return
+        if self.ends and s <= self.ends[-1]:
+            if e > self.ends[-1]:
+                self.ends[-1] = e
+            return
+        self.starts.append(s)
+        self.ends.append(e)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def copy(self) -> "BusyIntervals":
+        #independent copy, without re-sorting or re-merging
+        out = BusyIntervals.__new__(BusyIntervals)
+        out._raw, out.starts, out.ends = list(self._raw), list(self.starts), list(self.ends)
+        return out
+
+    def overlaps(self, s: datetime, e: datetime) -> bool:
+        # last window starting before e is the only candidate; it conflicts iff it ends after s
+        i = bisect_left(self.starts, e) - 1
+        return i >= 0 and self.ends[i] > s
+
+    def add(self, s: datetime, e: datetime) -> None:
+        """Book [s, e), merging with any window it overlaps or touches."""
+        if not s < e:
+            return
+        insort(self._raw, (s, e))
+        lo = bisect_left(self.ends, s)     # first window ending at/after s
+        hi = bisect_right(self.starts, e)  # windows from hi on start after e
+        if lo < hi:
+            s = min(s, self.starts[lo])
+            e = max(e, self.ends[hi - 1])
+        self.starts[lo:hi] = [s]
+        self.ends[lo:hi] = [e]
+
+    def remove(self, s: datetime, e: datetime) -> bool:
+        """Drop one booking of exactly [s, e). O(n) for this provider, only used when plans are undone."""
+        i = bisect_left(self._raw, (s, e))
+        if i == len(self._raw) or self._raw[i] != (s, e):
+            return False
+        del self._raw[i]
+        self._rebuild()
+        return True
+
+
+def load_busy(
+    session: Session,
+    provider_ids: Optional[Iterable[int]] = None,
+    window: Optional[Tuple[datetime, datetime]] = None,
+) -> Dict[int, BusyIntervals]:
+    """
+    provider_id -> BusyIntervals in one query.
+    With a window, only bookings overlapping it are read (served by ix_shift_starts/ix_shift_ends).
+    """
+    stmt = select(Assignment.provider_id, Shift.starts, Shift.ends).join(Shift, Shift.id == Assignment.shift_id)
+    if provider_ids is not None:
+        stmt = stmt.where(Assignment.provider_id.in_(list(provider_ids)))
+    if window is not None:
+        stmt = stmt.where(Shift.starts < window[1], Shift.ends > window[0])
+
+    grouped: Dict[int, List[Tuple[datetime, datetime]]] = {}
+    for pid, s, e in session.exec(stmt).all():
+        if pid is not None:
+            grouped.setdefault(pid, []).append((s, e))
+    return {pid: BusyIntervals(ws) for pid, ws in grouped.items()}
@@ -0,0 +1,288 @@
+"""
+Scheduler runs as background jobs: POST /schedule/jobs, then GET / DELETE /schedule/jobs/{id}.
+
+- Jobs run on a small thread pool (SCHEDULER_JOB_WORKERS, default 2), each with its own session, so the
+  submitting request returns at once and a long run ties up no request worker
+- Greedy jobs work through the open shifts of their horizon a page (JOB_BATCH) at a time and commit each
+  page's picks as a claim (see scheduling.claims). Picks another scheduler beat them to are re-planned
+  once against the fresh bookings. Optimal jobs plan first, then claim in the same batches.
+  A cancelled or failed job keeps what it already committed
+- A job first releases the provisional picks in its horizon (see claims.release_provisional) and re-plans
+  those shifts with everything else; with firm_until (rolling), picks for shifts starting from then on
+  are written provisional, to be firmed up by a later run
+- Each job registers its shift horizon, shifts starting in [from, to), open-ended when omitted.
+  Greedy runs may overlap each other (claims keep them from double-booking; on Postgres they split
+  the pages between them); an optimal run needs its horizon to itself, since shifts taken from under
+  a min-cost matching just come back lost. Overlapping an exclusive holder raises HorizonBusy
+- Job state is process-local, like the incremental dirty sets; the last MAX_FINISHED finished jobs are kept
+"""
+from __future__ import annotations
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import exists, func
+from sqlmodel import Session
+
+from server.db import engine
+from server.models import Assignment, Shift
+from server.scheduling import claims
+from server.scheduling.eligibility import EligibilityIndex
+from server.scheduling.geo import get_geo
+from server.scheduling.optimal import plan_optimal
+from server.scheduling.planner import Planned, greedy_steps, horizon, load_horizon, write_plan
+from server.scheduling.snapshot import Snapshot, load_families
+
+log = logging.getLogger(__name__)
+
+JOB_BATCH = 500
+SCHEDULER_JOB_WORKERS = int(os.getenv("SCHEDULER_JOB_WORKERS", "2"))
+MAX_FINISHED = 100
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class HorizonBusy(Exception):
+    def __init__(self, holder: str):
+        super().__init__(f"horizon held by {holder}")
+        self.holder = holder
+
+
+class Horizons:
+    """
+    Shift windows [start, end) registered by running schedulers; a missing bound is open-ended.
+    Shared holders may overlap each other; an exclusive holder overlaps nobody.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._held: Dict[str, Tuple[datetime, datetime, bool]] = {}
+
+    def claim(self, owner: str, start: Optional[datetime], end: Optional[datetime], exclusive: bool = True) -> None:
+        lo, hi = start or datetime.min, end or datetime.max
+        with self._lock:
+            for other, (s, e, excl) in self._held.items():
+                if s < hi and lo < e and (exclusive or excl):
+                    raise HorizonBusy(other)
+            self._held[owner] = (lo, hi, exclusive)
+
+    def release(self, owner: str) -> None:
+        with self._lock:
+            self._held.pop(owner, None)
+
+    @contextmanager
+    def holding(
+        self, owner: str, start: Optional[datetime] = None, end: Optional[datetime] = None, exclusive: bool = True,
+    ) -> Iterator[None]:
+        self.claim(owner, start, end, exclusive)
+        try:
+            yield
+        finally:
+            self.release(owner)
+
+
+horizons = Horizons()
+
+
+@dataclass
+class Job:
+    id: str
+    mode: str
+    start: Optional[datetime]
+    end: Optional[datetime]
+    firm_until: Optional[datetime] = None  # rolling: picks for shifts starting later stay provisional
+    status: str = "queued"  # queued | running | done | failed | cancelled
+    phase: str = ""         # loading | planning | committing, while running
+    total: int = 0          # open shifts in the horizon when the job started
+    considered: int = 0
+    assigned: int = 0       # committed so far
+    lost: int = 0           # picks another scheduler got to first (re-planned once)
+    error: Optional[str] = None
+    submitted_at: datetime = field(default_factory=_now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    cancel_requested: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_requested.is_set()
+
+    def eta_seconds(self) -> Optional[float]:
+        #straight-line from the rate so far; None until the first shift is through
+        if self.status != "running" or not self.considered or self.started_at is None:
+            return None
+        elapsed = (_now() - self.started_at).total_seconds()
+        return round(elapsed / self.considered * (self.total - self.considered), 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "mode": self.mode,
+            "from": self.start,
+            "to": self.end,
+            "firm_until": self.firm_until,
+            "status": self.status,
+            "phase": self.phase,
+            "total": self.total,
+            "considered": self.considered,
+            "assigned": self.assigned,
+            "lost": self.lost,
+            "eta_seconds": self.eta_seconds(),
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def _commit(job: Job, session: Session, picks: List[Planned], index: EligibilityIndex) -> List[Planned]:
+    #claim in JOB_BATCH chunks; returns the lost picks, already unbooked from index
+    lost: List[Planned] = []
+    for i in range(0, len(picks), JOB_BATCH):
+        if job.cancelled:
+            break
+        won, missed = write_plan(session, picks[i:i + JOB_BATCH], index, job.firm_until)
+        job.assigned += len(won)
+        job.lost += len(missed)
+        lost += missed
+    return lost
+
+
+def _replan(job: Job, session: Session, lost: List[Planned], index: EligibilityIndex, families, geo) -> None:
+    #one more try for shifts whose pick lost: re-read what the other writers booked, plan, claim
+    if not lost or job.cancelled:
+        return
+    index.refresh_bookings(session, {pk.provider.id for pk in lost}, {pk.shift.id for pk in lost})
+    retry = [pick for _, pick in greedy_steps(index, [pk.shift for pk in lost], families, geo) if pick is not None]
+    _commit(job, session, retry, index)
+
+
+def _horizon(job: Job, *columns):
+    return horizon(job.start, job.end, *columns)
+
+
+def run_job(job: Job, session: Session) -> None:
+    """The /schedule/run pass over the job's horizon, with progress on job and a cancel check per shift."""
+    job.phase = "loading"
+    claims.release_provisional(session, job.start, job.end)
+    job.total = session.exec(
+        _horizon(job, func.count()).where(~exists().where(Assignment.shift_id == Shift.id))
+    ).one()
+    if not job.total:
+        return
+    geo = get_geo()
+    if job.mode == "optimal":
+        snap = Snapshot.load(session, job.start, job.end)
+        geo.precompute(snap.zips())
+        job.phase = "planning"
+        planned = plan_optimal(snap.index, list(snap.shifts.rows()), snap.families, geo)
+        job.considered = job.total
+        job.phase = "committing"
+        _commit(job, session, planned, snap.index)
+        return
+
+    #greedy: pages of open shifts in start order
+    index = load_horizon(session, job.start, job.end)
+    families = load_families(session)
+    zips = session.exec(_horizon(job, Shift.zip).distinct()).all()
+    geo.precompute([p.home_zip for p in index.providers] + list(zips))
+    job.phase = "planning"
+    after = None
+    while not job.cancelled:
+        page = claims.open_shifts(session, job.start, job.end, after, JOB_BATCH)
+        if not page:
+            break
+        after = (page[-1].starts, page[-1].id)
+        planned = []
+        for _, pick in greedy_steps(index, page, families, geo):
+            if job.cancelled:
+                session.rollback()  # releases the page's row locks on Postgres
+                return
+            job.considered += 1
+            if pick is not None:
+                planned.append(pick)
+        job.phase = "committing"
+        lost = _commit(job, session, planned, index)
+        if not planned:
+            session.commit()  # nothing claimed; still end the transaction holding the page
+        _replan(job, session, lost, index, families, geo)
+        job.phase = "planning"
+
+
+class JobQueue:
+    def __init__(self, workers: int = SCHEDULER_JOB_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scheduler-job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        mode: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        firm_until: Optional[datetime] = None,
+    ) -> Job:
+        """Queue a run over [start, end); raises HorizonBusy if that overlaps an unfinished run."""
+        job = Job(id=uuid.uuid4().hex[:12], mode=mode, start=start, end=end, firm_until=firm_until)
+        horizons.claim(job.id, start, end, exclusive=mode == "optimal")
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim()
+        self._pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        #the worker stops at its next shift (or batch) and releases the horizon
+        job = self.get(job_id)
+        if job is not None and job.status in ("queued", "running"):
+            job.cancel_requested.set()
+        return job
+
+    def shutdown(self) -> None:
+        for job in self.list():
+            job.cancel_requested.set()
+        self._pool.shutdown(wait=True)
+
+    def _trim(self) -> None:
+        finished = [j.id for j in self._jobs.values() if j.finished_at is not None]
+        for job_id in finished[:max(len(finished) - MAX_FINISHED, 0)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: Job) -> None:
+        try:
+            if job.cancelled:
+                return
+            job.status, job.started_at = "running", _now()
+            # expire_on_commit=False: batches commit mid-run and the loaded shifts must stay usable
+            with Session(engine, expire_on_commit=False) as session:
+                run_job(job, session)
+        except Exception as exc:
+            log.exception("scheduler job %s failed", job.id)
+            job.error = str(exc)
+            job.status = "failed"
+        finally:
+            if job.status != "failed":
+                job.status = "cancelled" if job.cancelled else "done"
+            job.phase = ""
+            job.finished_at = _now()
+            horizons.release(job.id)
+
+
+scheduler_jobs = JobQueue()
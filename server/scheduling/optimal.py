@@ -0,0 +1,235 @@
+from __future__ import annotations
+from typing import Dict, List, Sequence
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+from server.models import Family, Shift
+from server.scheduling.eligibility import EligibilityIndex
+from server.scheduling.geo import ZipGeo
+from server.scheduling.planner import Planned, wants_continuity
+
+# Costs are in miles-equivalent
+UNFILLED_PENALTY = 1000.0  # leaving a shift open is worse than any real drive
+UNKNOWN_MILES = 250.0      # unknown ZIP: keep the edge, but rank it behind every known distance
+CONTINUITY_BONUS = 15.0    # discount for a provider the family has already seen
+MAX_CANDIDATES = 12        # cheapest edges kept per shift; keeps the matrix sparse
+BLOCKING_WEIGHT = 0.2      # share of UNFILLED_PENALTY charged per unit of crowded-out demand (see _Demand)
+
+
+def _cliques(shifts: Sequence[Shift]) -> List[List[Shift]]:
+    """
+    Split shifts (sorted by starts) into runs that all share a common instant.
+    Every shift in a run overlaps every other, so "one shift per provider" is exact inside a run;
+    bookings from earlier runs are already in the index when a later run is matched.
+    """
+    groups: List[List[Shift]] = []
+    first_end = None
+    for sh in shifts:
+        if first_end is None or sh.starts >= first_end:
+            groups.append([])
+            first_end = sh.ends
+        else:
+            first_end = min(first_end, sh.ends)
+        groups[-1].append(sh)
+    return groups
+
+
+class _Demand:
+    """
+    Look-ahead term for the matching. Each open shift j with n_j qualified providers carries a scarcity
+    weight of 1/n_j^2 for each of them. Booking provider P on [s, e) crowds out the weight of the later
+    shifts P qualifies for that start inside that window; charging it keeps the matching from spending
+    scarce providers on long early shifts that later shifts needed, while barely moving costs when the
+    roster is deep. Built once, O(log n) per lookup.
+    """
+
+    def __init__(self, index: EligibilityIndex, shifts: Sequence[Shift]):
+        per_provider: Dict[int, List[tuple]] = {}
+        for sh in shifts:
+            qualified = [p.id for p in index.available(sh)]
+            for pid in qualified:
+                per_provider.setdefault(pid, []).append((sh.starts, 1.0 / len(qualified) ** 2))
+        self.starts: Dict[int, List[datetime]] = {}
+        self.cumulative: Dict[int, np.ndarray] = {}
+        for pid, rows in per_provider.items():
+            rows.sort(key=lambda r: r[0])
+            self.starts[pid] = [r[0] for r in rows]
+            self.cumulative[pid] = np.concatenate(([0.0], np.cumsum([r[1] for r in rows])))
+
+    def crowded_out(self, provider_id: int, after: datetime, until: datetime) -> float:
+        #demand weight of P's qualified shifts starting in (after, until)
+        starts = self.starts.get(provider_id)
+        if not starts:
+            return 0.0
+        lo = bisect_right(starts, after)
+        hi = bisect_left(starts, until)
+        if hi <= lo:
+            return 0.0
+        cum = self.cumulative[provider_id]
+        return float(cum[hi] - cum[lo])
+
+
+def _match(
+    index: EligibilityIndex,
+    shifts: Sequence[Shift],
+    families: Dict[int, Family],
+    geo: ZipGeo,
+    max_candidates: int,
+    demand: _Demand,
+) -> List[Planned]:
+    """
+    One min-cost bipartite matching: each shift gets at most one provider, each provider at most one shift.
+    Every shift also has a private "unfilled" column at UNFILLED_PENALTY, so a full matching always exists.
+    """
+    rows: List[int] = []
+    cols: List[int] = []
+    costs: List[float] = []
+    col_of: Dict[int, int] = {}
+    providers = []
+    miles_of: Dict[tuple, float] = {}
+    continuity: set = set()
+    offset = CONTINUITY_BONUS + 1.0  # sparse matching treats 0 as "no edge", keep every cost positive
+    group_last_start = max(sh.starts for sh in shifts)
+
+    for i, sh in enumerate(shifts):
+        cands = list(index.candidates(sh))
+        if cands:
+            miles = geo.distances_from(sh.zip, [p.home_zip for p in cands])
+            if sh.max_miles is not None:
+                near = miles <= sh.max_miles
+                cands, miles = [p for p, ok in zip(cands, near) if ok], miles[near]
+        if cands:
+            cost = np.where(np.isinf(miles), UNKNOWN_MILES, miles)
+            fam = families.get(sh.family_id)
+            bonus = np.zeros(len(cands), dtype=bool)
+            if wants_continuity(fam):
+                seen = index.history.get(fam.id, {})
+                bonus = np.array([p.id in seen for p in cands])
+                cost = cost - CONTINUITY_BONUS * bonus
+            crowd = np.array([demand.crowded_out(p.id, group_last_start, sh.ends) for p in cands])
+            cost = cost + BLOCKING_WEIGHT * UNFILLED_PENALTY * crowd
+            keep = np.argsort(cost, kind="stable")[:max_candidates]
+            for k in keep:
+                p = cands[k]
+                if p.id not in col_of:
+                    col_of[p.id] = len(providers)
+                    providers.append(p)
+                rows.append(i)
+                cols.append(col_of[p.id])
+                costs.append(float(cost[k]) + offset)
+                miles_of[(i, p.id)] = float(miles[k])
+                if bonus[k]:
+                    continuity.add((i, p.id))
+
+    if not providers:
+        return []
+
+    n_prov = len(providers)
+    for i in range(len(shifts)):
+        rows.append(i)
+        cols.append(n_prov + i)
+        costs.append(UNFILLED_PENALTY + offset)
+
+    graph = csr_matrix((costs, (rows, cols)), shape=(len(shifts), n_prov + len(shifts)))
+    row_ind, col_ind = min_weight_full_bipartite_matching(graph)
+
+    picks: List[Planned] = []
+    for i, c in zip(row_ind, col_ind):
+        if c >= n_prov:
+            continue  # matched to its "unfilled" column
+        p = providers[c]
+        reason = "continuity" if (i, p.id) in continuity else "optimal"
+        picks.append(Planned(shifts[i], p, miles_of[(i, p.id)], reason))
+    return picks
+
+
+def _repair(
+    index: EligibilityIndex,
+    unfilled: Sequence[Shift],
+    planned: List[Planned],
+    geo: ZipGeo,
+    max_candidates: int,
+) -> None:
+    """
+    Ejection-chain pass for shifts the matching left open: if a qualified, available provider P is blocked
+    only by one shift X planned in this run, and some other provider Q can take X, move X to Q and give
+    the open shift to P. Edits planned in place; never touches bookings that existed before the run.
+    """
+    by_shift = {pk.shift.id: pk for pk in planned}
+    run_shifts: Dict[int, List[Shift]] = {}
+    for pk in planned:
+        run_shifts.setdefault(pk.provider.id, []).append(pk.shift)
+
+    for u in unfilled:
+        qualified = index.available(u)
+        if not qualified:
+            continue
+        miles = geo.distances_from(u.zip, [p.home_zip for p in qualified])
+        if u.max_miles is not None:
+            miles = np.where(miles <= u.max_miles, miles, np.inf)
+        for k in np.argsort(miles, kind="stable")[:max_candidates]:
+            if u.max_miles is not None and np.isinf(miles[k]):
+                break
+            p = qualified[k]
+            blockers = [x for x in run_shifts.get(p.id, ()) if x.starts < u.ends and u.starts < x.ends]
+            if len(blockers) != 1:
+                continue
+            x = blockers[0]
+            index.unbook(p.id, x)
+            q = None
+            if not index.has_conflict(p.id, u):  # P might also be blocked by an older booking
+                alts = [a for a in index.candidates(x) if a.id != p.id]
+                if alts:
+                    alt_miles = geo.distances_from(x.zip, [a.home_zip for a in alts])
+                    best = int(alt_miles.argmin())
+                    if x.max_miles is None or alt_miles[best] <= x.max_miles:
+                        q, q_miles = alts[best], float(alt_miles[best])
+            if q is None:
+                index.book(p.id, x)
+                continue
+
+            index.book(q.id, x)
+            index.book(p.id, u)
+            run_shifts[p.id].remove(x)
+            run_shifts[p.id].append(u)
+            run_shifts.setdefault(q.id, []).append(x)
+            moved = by_shift[x.id]
+            moved.provider, moved.miles, moved.reason = q, q_miles, "optimal"
+            pk = Planned(u, p, float(miles[k]), "optimal")
+            planned.append(pk)
+            by_shift[u.id] = pk
+            break
+
+
+def plan_optimal(
+    index: EligibilityIndex,
+    shifts: Sequence[Shift],
+    families: Dict[int, Family],
+    geo: ZipGeo,
+    max_candidates: int = MAX_CANDIDATES,
+) -> List[Planned]:
+    """
+    Batch alternative to plan_greedy: minimizes total miles (less continuity bonuses) plus unfilled penalties.
+    Open shifts are split into runs of mutually overlapping shifts; each run is solved as one sparse
+    min-cost matching (with the _Demand look-ahead charge) instead of letting the earliest shift grab
+    the nearest provider.
+    Shifts still open afterwards get one repair pass (see _repair).
+    A shift's max_miles rules out providers living farther away, in both passes.
+    """
+    open_shifts = sorted((s for s in shifts if s.id not in index.assigned), key=lambda s: (s.starts, s.id))
+    planned: List[Planned] = []
+    demand = _Demand(index, open_shifts)
+    for group in _cliques(open_shifts):
+        picks = _match(index, group, families, geo, max_candidates, demand)
+        for pk in picks:
+            index.book(pk.provider.id, pk.shift)
+        planned.extend(picks)
+
+    filled = {pk.shift.id for pk in planned}
+    _repair(index, [s for s in open_shifts if s.id not in filled], planned, geo, max_candidates)
+    planned.sort(key=lambda pk: (pk.shift.starts, pk.shift.id))
+    return planned
@@ -0,0 +1,178 @@
+"""
+Process-parallel greedy planning (POST /schedule/run?mode=parallel).
+
+Shifts only compete through providers who could take both, so the open shifts are split where that's rare:
+1) by skill: needs with no qualified provider in common can't compete at all; needs linked through
+   some provider (a doula who is also a nurse) stay in one group (union-find over the pools)
+2) by region: each group's shifts are bisected along the longer side of their families' ZIP centroids'
+   extent, into as many pieces as the group's share of PIECES_PER_PROCESS x processes. A family's shifts
+   stay in one piece, so continuity picks made earlier in the run still count. Every piece of a group
+   sees the group's whole roster, so a shift near a border still gets its nearest provider
+Pieces are planned greedily in a ProcessPoolExecutor (SCHEDULER_PROCESSES, default one per core), each
+from a small copy of the index (EligibilityIndex.subset). Merging books the picks into the full index in
+(starts, shift id) order; a pick whose provider an earlier pick from another piece already holds for an
+overlapping shift is dropped, and those shifts get one more greedy pass here against the merged index.
+The merge doesn't depend on which worker finishes first, so the same data and process count always
+give the same plan.
+It can differ from mode=greedy: pieces don't see each other's picks (bookings or continuity) while planning.
+Backlogs too small for MIN_PIECE_SHIFTS-sized pieces, or a single process, just run plan_greedy.
+"""
+from __future__ import annotations
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from server.scheduling.eligibility import EligibilityIndex
+from server.scheduling.geo import ZipGeo, get_geo, normalize_zip
+from server.scheduling.planner import Planned, plan_greedy
+from server.scheduling.snapshot import FamilyRow, ShiftColumns, ShiftRow, Snapshot
+
+SCHEDULER_PROCESSES = int(os.getenv("SCHEDULER_PROCESSES", "0")) or os.cpu_count() or 1
+PIECES_PER_PROCESS = 2  # a little slack so one slow piece doesn't leave the other workers idle
+MIN_PIECE_SHIFTS = 1000  # below this a piece costs more to ship to a worker than to plan here
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def _executor(processes: int) -> ProcessPoolExecutor:
+    #one pool per process, reused across runs so worker start-up (imports, ZIP table) is paid once
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != processes:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn, not fork: the app process has threads (job pool, warm index) that fork would copy mid-flight
+            _pool = ProcessPoolExecutor(max_workers=processes, mp_context=mp.get_context("spawn"), initializer=get_geo)
+            _pool_size = processes
+        return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def _plan_piece(
+    index: EligibilityIndex, shifts: ShiftColumns, families: Dict[int, FamilyRow],
+) -> List[Tuple[int, int, float, str]]:
+    #worker side: (position in shifts, provider id, miles, reason) per pick
+    geo = get_geo()
+    geo.precompute([p.home_zip for p in index.providers] + shifts.zips)
+    position = {sid: i for i, sid in enumerate(shifts.ids.tolist())}
+    return [
+        (position[pk.shift.id], pk.provider.id, pk.miles, pk.reason)
+        for pk in plan_greedy(index, shifts.rows(), families, geo)
+    ]
+
+
+def _skill_groups(index: EligibilityIndex, needs: Sequence[str]) -> List[int]:
+    #group number per need code: needs whose pools share a provider end up in the same group
+    parent = list(range(len(needs)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    first_need: Dict[int, int] = {}
+    for code, need in enumerate(needs):
+        for p in index.pool(need):
+            other = first_need.setdefault(p.id, code)
+            if other != code:
+                parent[find(code)] = find(other)
+    roots = [find(code) for code in range(len(needs))]
+    numbered = {r: i for i, r in enumerate(dict.fromkeys(roots))}
+    return [numbered[r] for r in roots]
+
+
+def _bisect(pos: np.ndarray, lat: np.ndarray, lon: np.ndarray, pieces: int) -> List[np.ndarray]:
+    """
+    Split shift positions into `pieces` regions of near-equal size, cutting across the longer side
+    of their extent each time. Shifts at unknown ZIPs (nan) sort to the far end. Each piece stays sorted.
+    """
+    if pieces <= 1 or len(pos) < 2:
+        return [pos]
+    la, lo = lat[pos], lon[pos]
+    known = np.isfinite(la)
+    if known.any():
+        lat_span = np.ptp(la[known])
+        lon_span = np.ptp(lo[known]) * np.cos(np.mean(la[known]))
+        axis = la if lat_span >= lon_span else lo
+    else:
+        axis = np.zeros(len(pos))
+    order = np.argsort(axis, kind="stable")
+    left = pieces // 2
+    cut = len(pos) * left // pieces
+    return (
+        _bisect(np.sort(pos[order[:cut]]), lat, lon, left)
+        + _bisect(np.sort(pos[order[cut:]]), lat, lon, pieces - left)
+    )
+
+
+def plan_parallel(
+    snap: Snapshot, geo: ZipGeo, processes: Optional[int] = None,
+) -> Tuple[List[Planned], dict]:
+    """
+    Greedy plan for the snapshot's open shifts, pieces solved in worker processes (see module doc).
+    Returns (picks in (starts, id) order, stats); picks are booked into snap.index like plan_greedy's.
+    """
+    processes = processes or SCHEDULER_PROCESSES
+    index, shifts, families = snap.index, snap.shifts, snap.families
+    open_pos = shifts.open_positions(index.assigned)
+    pieces = min(processes * PIECES_PER_PROCESS, len(open_pos) // MIN_PIECE_SHIFTS)
+    if processes <= 1 or pieces <= 1:
+        planned = plan_greedy(index, shifts.rows(open_pos), families, geo)
+        return planned, {"processes": 1, "pieces": 1, "conflicts": 0}
+
+    # skill groups, then regions within each, sized by the group's share of the open shifts
+    group_of = np.array(_skill_groups(index, shifts.needs), dtype=np.int64)[shifts.need_codes[open_pos]]
+    # a shift is placed by its family's ZIP, so all of a family's shifts land in one piece and its
+    # continuity picks made during the run stay visible; shift ZIP when the family has none on file
+    fam_row = {fid: geo.row.get(normalize_zip(f.zip), -1) for fid, f in families.items()}
+    zip_row = np.array([geo.row.get(normalize_zip(z), -1) for z in shifts.zips], dtype=np.int64)[shifts.zip_codes]
+    at = np.array([fam_row.get(fid, -1) for fid in shifts.family_ids.tolist()], dtype=np.int64)
+    at = np.where(at >= 0, at, zip_row)
+    lat = np.where(at >= 0, geo.lat[at], np.nan)
+    lon = np.where(at >= 0, geo.lon[at], np.nan)
+    parts: List[np.ndarray] = []
+    for g in np.unique(group_of):
+        members = open_pos[group_of == g]
+        parts += _bisect(members, lat, lon, max(1, round(pieces * len(members) / len(open_pos))))
+
+    payloads = []
+    for part in parts:
+        needs = {shifts.needs[code] for code in np.unique(shifts.need_codes[part]).tolist()}
+        fams = np.unique(shifts.family_ids[part]).tolist()
+        sub = index.subset({p.id for need in needs for p in index.pool(need)}, fams, shifts.ids[part].tolist())
+        payloads.append((sub, shifts.take(part), {fid: families[fid] for fid in fams if fid in families}))
+
+    pool = _executor(processes)
+    futures = [pool.submit(_plan_piece, *payload) for payload in payloads]
+    found = [
+        (int(part[i]), pid, miles, reason) for part, fut in zip(parts, futures) for i, pid, miles, reason in fut.result()
+    ]
+
+    # merge in (starts, id) order, which is position order: the earlier shift keeps a provider two pieces both picked
+    found.sort()
+    planned: List[Planned] = []
+    clashed: List[ShiftRow] = []
+    for sh, (_, pid, miles, reason) in zip(shifts.rows(np.array([f[0] for f in found], dtype=np.int64)), found):
+        if index.has_conflict(pid, sh):
+            clashed.append(sh)
+            continue
+        index.book(pid, sh)
+        planned.append(Planned(sh, index.by_id[pid], miles, reason))
+    if clashed:
+        planned += plan_greedy(index, clashed, families, geo)
+        planned.sort(key=lambda pk: (pk.shift.starts, pk.shift.id))
+    return planned, {"processes": processes, "pieces": len(parts), "conflicts": len(clashed)}
@@ -0,0 +1,125 @@
+from __future__ import annotations
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlmodel import Session
+
+from server.models import Family, Shift
+from server.scheduling import claims
+from server.scheduling.eligibility import EligibilityIndex
+from server.scheduling.geo import ZipGeo
+from server.scheduling.snapshot import ProviderRow, horizon
+
+CONTINUITY_PREFS = {"consistent", "consistency", "high", "prefers_consistency"}
+
+
+@dataclass
+class Planned:
+    shift: Shift
+    provider: ProviderRow
+    miles: float
+    reason: str  # "continuity" | "nearest" | "optimal"
+
+    @property
+    def message(self) -> str:
+        return f"Auto-scheduled ({self.reason}, {self.miles:.1f} mi)"
+
+
+def wants_continuity(fam: Optional[Family]) -> bool:
+    return fam is not None and (fam.continuity_preference or "").strip().lower() in CONTINUITY_PREFS
+
+
+def plan_greedy(
+    index: EligibilityIndex,
+    shifts: Sequence[Shift],
+    families: Dict[int, Family],
+    geo: ZipGeo,
+) -> List[Planned]:
+    """
+    The original run_scheduler pass, minus the DB writes.
+    Shifts are taken in the given order (callers pass them sorted by starts); each one gets:
+    1) the family's most frequent/recent eligible past provider, if the family wants continuity
+    2) otherwise the nearest eligible provider
+    A shift's max_miles, when set, rules out providers living farther away for both.
+    Every pick is booked into the index so later shifts see it.
+    """
+    return [pk for _, pk in greedy_steps(index, shifts, families, geo) if pk is not None]
+
+
+def greedy_steps(
+    index: EligibilityIndex,
+    shifts: Sequence[Shift],
+    families: Dict[int, Family],
+    geo: ZipGeo,
+) -> Iterator[Tuple[Shift, Optional[Planned]]]:
+    #plan_greedy one shift at a time: (shift, pick or None), for callers that report progress or stop early
+    for sh in shifts:
+        if sh.id in index.assigned:
+            yield sh, None
+            continue
+
+        fam = families.get(sh.family_id)
+        pick = None
+        if wants_continuity(fam):
+            for p in index.eligible(index.past_providers(fam.id), sh):
+                miles = geo.distance(p.home_zip, sh.zip)
+                if sh.max_miles is None or miles <= sh.max_miles:
+                    pick = Planned(sh, p, miles, "continuity")
+                    break
+
+        if pick is None:
+            # candidates in distance order, conflict-checked lazily: only the first one that fits is checked
+            found = next(index.by_distance(sh, geo, sh.max_miles), None)
+            if found is None:
+                yield sh, None  # leave unfilled if no fit
+                continue
+            pick = Planned(sh, found[0], found[1], "nearest")
+
+        index.book(pick.provider.id, sh)
+        yield sh, pick
+
+
+def write_plan(
+    session: Session,
+    planned: Sequence[Planned],
+    index: Optional[EligibilityIndex] = None,
+    provisional_from: Optional[datetime] = None,
+) -> Tuple[List[Planned], List[Planned]]:
+    """
+    Write the picks as one claim (see scheduling.claims) and commit: returns (won, lost).
+    Picks for shifts starting at or after provisional_from stay provisional (rolling runs).
+    Picks that lost to another scheduler write nothing and are unbooked from index, if given.
+    """
+    won, lost = claims.claim(session, planned, provisional_from)
+    if index is not None:
+        for pk in lost:
+            index.unbook(pk.provider.id, pk.shift)
+    return won, lost
+
+
+def load_horizon(session: Session, start: Optional[datetime] = None, end: Optional[datetime] = None) -> EligibilityIndex:
+    """
+    An index good for planning any shift starting in [start, end): bookings overlapping those shifts'
+    span (ix_shift_starts/ix_shift_ends) and continuity for just their families. Unbounded, the whole history.
+    """
+    if start is None and end is None:
+        return EligibilityIndex.load(session)
+    lo, hi = session.exec(horizon(start, end, func.min(Shift.starts), func.max(Shift.ends))).one()
+    if lo is None:
+        return EligibilityIndex([])
+    family_ids = session.exec(horizon(start, end, Shift.family_id).distinct()).all()
+    return EligibilityIndex.load(session, window=(lo, hi), family_ids=family_ids)
+
+
+def summarize(planned: Sequence[Planned], considered: int, solve_ms: float) -> dict:
+    #fill rate is over the shifts that were open when the run started
+    miles = sum(p.miles for p in planned if p.miles != float("inf"))
+    return {
+        "assigned": len(planned),
+        "open_shifts": considered,
+        "fill_rate": round(len(planned) / considered, 4) if considered else 1.0,
+        "total_miles": round(miles, 1),
+        "solve_ms": round(solve_ms, 1),
+    }
@@ -0,0 +1,107 @@
+from __future__ import annotations
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy import event, inspect, insert, delete, func
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, select
+
+from server.models import Provider, Skill, ProviderSkill
+
+# Spellings seen in the wild -> canonical vocabulary entry
+ALIASES = {
+    "doulas": "doula",
+    "nurses": "nurse",
+    "rn": "nurse",
+    "lactation consultants": "lactation consultant",
+    "lactation specialist": "lactation consultant",
+    "lactation specialists": "lactation consultant",
+}
+
+
+def canonical(name: Optional[str]) -> str:
+    #" Lactation  Consultants" -> "lactation consultant"
+    n = " ".join((name or "").strip().lower().split())
+    return ALIASES.get(n, n)
+
+
+def parse_skills(raw: Optional[str]) -> Set[str]:
+    #"Doula, Nurses" -> {"doula", "nurse"}
+    return {canonical(s) for s in (raw or "").split(",") if s.strip()}
+
+
+def spellings(names: Iterable[str]) -> Set[str]:
+    #every lowercase spelling that canonicalizes into names (for matching raw Shift.required_skills in SQL)
+    wanted = set(names)
+    return wanted | {alias for alias, c in ALIASES.items() if c in wanted}
+
+
+class SkillBits:
+    """
+    Index-local skill -> bit assignment. A provider's skills become one int, and
+    "has every skill this shift needs" is (have & need) == need.
+    Names only a shift mentions still get a bit, so nobody matches them.
+    """
+
+    def __init__(self):
+        self.bits: Dict[str, int] = {}
+        self._needs: Dict[str, int] = {}
+
+    def mask(self, names: Iterable[str]) -> int:
+        m = 0
+        for n in names:
+            bit = self.bits.get(n)
+            if bit is None:
+                bit = self.bits[n] = 1 << len(self.bits)
+            m |= bit
+        return m
+
+    def need(self, required: Optional[str]) -> int:
+        #memoized per raw string: shifts repeat the same few values
+        m = self._needs.get(required or "")
+        if m is None:
+            m = self._needs[required or ""] = self.mask(parse_skills(required))
+        return m
+
+
+# ---- ProviderSkill maintenance ----
+
+def _skill_ids(conn: Connection, names: Set[str]) -> Dict[str, int]:
+    if not names:
+        return {}
+    ids = dict(conn.execute(select(Skill.name, Skill.id).where(Skill.name.in_(list(names)))).all())
+    for n in names - ids.keys():
+        ids[n] = conn.execute(insert(Skill).values(name=n)).inserted_primary_key[0]
+    return ids
+
+
+def sync_provider_skills(conn: Connection, providers: Dict[int, Optional[str]]) -> None:
+    """Rewrite ProviderSkill rows for {provider_id: raw skills string} with Core statements."""
+    if not providers:
+        return
+    parsed = {pid: parse_skills(raw) for pid, raw in providers.items()}
+    ids = _skill_ids(conn, set().union(*parsed.values()))
+    conn.execute(delete(ProviderSkill).where(ProviderSkill.provider_id.in_(list(providers))))
+    rows = [{"provider_id": pid, "skill_id": ids[n]} for pid, names in parsed.items() for n in names]
+    if rows:
+        conn.execute(insert(ProviderSkill), rows)
+
+
+@event.listens_for(Provider, "after_insert")
+def _provider_inserted(mapper, conn: Connection, target: Provider) -> None:
+    sync_provider_skills(conn, {target.id: target.skills})
+
+
+@event.listens_for(Provider, "after_update")
+def _provider_updated(mapper, conn: Connection, target: Provider) -> None:
+    if inspect(target).attrs.skills.history.has_changes():
+        sync_provider_skills(conn, {target.id: target.skills})
+
+
+def backfill(session: Session) -> int:
+    """Populate ProviderSkill for databases created before the table existed. No-op once populated."""
+    if session.exec(select(func.count()).select_from(ProviderSkill)).one():
+        return 0
+    providers = dict(session.exec(select(Provider.id, Provider.skills)).all())
+    sync_provider_skills(session.connection(), providers)
+    session.commit()
+    return len(providers)
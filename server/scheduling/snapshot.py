@@ -0,0 +1,241 @@
+"""
+Compact, read-only scheduler inputs, read as plain SQL rows instead of ORM instances.
+
+An ORM Shift carries instance state, an instrumented __dict__ and an identity-map entry; a full run
+loads every shift of its horizon, so that overhead is most of its memory. Here instead:
+- ShiftColumns: a horizon's shifts as parallel arrays in (starts, id) order: ids, family ids,
+  start/end times, ZIP and required-skills codes (into small lists of the distinct values), max_miles
+- ShiftRow / ProviderRow / FamilyRow: __slots__ records with just the fields the engine reads,
+  interchangeable with Shift / Provider / Family there. ShiftColumns.rows() makes them one at a
+  time, so only the shifts that get picked outlive the loop
+- Snapshot: the columns plus the EligibilityIndex and families for one run
+Picks go back through claims.claim(): one INSERT ... RETURNING per batch, nothing kept in the session.
+"""
+from __future__ import annotations
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+
+from server.models import Family, Provider, Shift
+
+if TYPE_CHECKING:
+    from server.scheduling.eligibility import EligibilityIndex
+
+CHUNK = 5000  # rows fetched and converted per step
+
+
+class ShiftRow:
+    __slots__ = ("id", "family_id", "starts", "ends", "zip", "required_skills", "max_miles")
+
+    def __init__(self, id: int, family_id: int, starts: datetime, ends: datetime, zip: str,
+                 required_skills: str, max_miles: Optional[float] = None):
+        self.id = id
+        self.family_id = family_id
+        self.starts = starts
+        self.ends = ends
+        self.zip = zip
+        self.required_skills = required_skills
+        self.max_miles = max_miles
+
+    def __repr__(self) -> str:
+        return f"ShiftRow(id={self.id}, starts={self.starts}, zip={self.zip})"
+
+
+def horizon(start: Optional[datetime] = None, end: Optional[datetime] = None, *columns):
+    #shifts (or these columns of them) starting in [start, end), open-ended where a bound is None (ix_shift_starts)
+    stmt = select(*columns) if columns else select(Shift)
+    if start is not None:
+        stmt = stmt.where(Shift.starts >= start)
+    if end is not None:
+        stmt = stmt.where(Shift.starts < end)
+    return stmt
+
+
+SHIFT_COLUMNS = (Shift.id, Shift.family_id, Shift.starts, Shift.ends, Shift.zip, Shift.required_skills, Shift.max_miles)
+
+
+class ProviderRow:
+    __slots__ = ("id", "name", "home_zip", "skills", "active")
+
+    def __init__(self, id: int, name: str, home_zip: str, skills: str, active: bool = True):
+        self.id = id
+        self.name = name
+        self.home_zip = home_zip
+        self.skills = skills
+        self.active = active
+
+    def __repr__(self) -> str:
+        return f"ProviderRow(id={self.id}, name={self.name!r})"
+
+
+class FamilyRow:
+    __slots__ = ("id", "name", "zip", "continuity_preference")
+
+    def __init__(self, id: int, name: str, zip: str, continuity_preference: str):
+        self.id = id
+        self.name = name
+        self.zip = zip
+        self.continuity_preference = continuity_preference
+
+
+def load_providers(session: Session, ids: Optional[Iterable[int]] = None) -> List[ProviderRow]:
+    #active providers (just these, if ids is given) in table order
+    stmt = select(Provider.id, Provider.name, Provider.home_zip, Provider.skills, Provider.active).where(
+        Provider.active == True
+    )
+    if ids is not None:
+        stmt = stmt.where(Provider.id.in_(list(ids)))
+    return [ProviderRow(*r) for r in session.exec(stmt).all()]
+
+
+def load_families(session: Session, ids: Optional[Iterable[int]] = None) -> Dict[int, FamilyRow]:
+    stmt = select(Family.id, Family.name, Family.zip, Family.continuity_preference)
+    if ids is not None:
+        stmt = stmt.where(Family.id.in_(list(ids)))
+    return {r[0]: FamilyRow(*r) for r in session.exec(stmt).all()}
+
+
+def _codes(values: List, table: Dict) -> np.ndarray:
+    #value -> small int, numbering new values as they turn up
+    return np.fromiter((table.setdefault(v, len(table)) for v in values), dtype=np.int32, count=len(values))
+
+
+class ShiftColumns:
+    """
+    Shifts as parallel arrays, about 50 bytes a shift:
+    ids, family_ids (int64) | starts, ends (datetime64[us]) | zip_codes into zips, need_codes into needs (int32)
+    | max_miles (float64, nan = no limit)
+    """
+
+    _ARRAYS = ("ids", "family_ids", "starts", "ends", "zip_codes", "need_codes", "max_miles")
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.family_ids = np.empty(0, dtype=np.int64)
+        self.starts = np.empty(0, dtype="datetime64[us]")
+        self.ends = np.empty(0, dtype="datetime64[us]")
+        self.zip_codes = np.empty(0, dtype=np.int32)
+        self.need_codes = np.empty(0, dtype=np.int32)
+        self.max_miles = np.empty(0, dtype=np.float64)
+        self.zips: List[str] = []
+        self.needs: List[str] = []
+
+    @classmethod
+    def load(cls, session: Session, start: Optional[datetime] = None, end: Optional[datetime] = None) -> "ShiftColumns":
+        """Shifts starting in [start, end) (open-ended where None), in (starts, id) order; read CHUNK rows at a time."""
+        cols = cls()
+        zips: Dict[str, int] = {}
+        needs: Dict[str, int] = {}
+        parts: Dict[str, List[np.ndarray]] = {name: [] for name in cls._ARRAYS}
+        result = session.connection().execute(
+            horizon(start, end, *SHIFT_COLUMNS).order_by(Shift.starts, Shift.id).execution_options(yield_per=CHUNK)
+        )
+        for chunk in result.partitions():
+            ids, fams, starts, ends, zs, reqs, caps = zip(*chunk)
+            parts["ids"].append(np.array(ids, dtype=np.int64))
+            parts["family_ids"].append(np.array(fams, dtype=np.int64))
+            parts["starts"].append(np.array(starts, dtype="datetime64[us]"))
+            parts["ends"].append(np.array(ends, dtype="datetime64[us]"))
+            parts["zip_codes"].append(_codes(zs, zips))
+            parts["need_codes"].append(_codes(reqs, needs))
+            parts["max_miles"].append(np.array([np.nan if c is None else c for c in caps], dtype=np.float64))
+        for name, pieces in parts.items():
+            if pieces:
+                setattr(cols, name, np.concatenate(pieces))
+        cols.zips, cols.needs = list(zips), list(needs)
+        return cols
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self._ARRAYS)
+
+    def span(self) -> Optional[Tuple[datetime, datetime]]:
+        #(first start, last end), or None when empty
+        if not len(self):
+            return None
+        return self.starts.min().item(), self.ends.max().item()
+
+    def family_set(self) -> Set[int]:
+        return set(np.unique(self.family_ids).tolist())
+
+    def take(self, positions: np.ndarray) -> "ShiftColumns":
+        #just these positions, as columns of their own (the zips / needs lists are shared)
+        out = ShiftColumns()
+        for name in self._ARRAYS:
+            setattr(out, name, getattr(self, name)[positions])
+        out.zips, out.needs = self.zips, self.needs
+        return out
+
+    def open_positions(self, assigned: Set[int]) -> np.ndarray:
+        #positions of the shifts whose id isn't in assigned, ascending
+        if not assigned:
+            return np.arange(len(self))
+        return np.flatnonzero(~np.isin(self.ids, np.fromiter(assigned, dtype=np.int64)))
+
+    def count_open(self, assigned: Set[int]) -> int:
+        return len(self.open_positions(assigned))
+
+    def rows(self, positions: Optional[np.ndarray] = None) -> Iterator[ShiftRow]:
+        """ShiftRow records in order (just these positions, if given), built CHUNK at a time."""
+        n = len(self) if positions is None else len(positions)
+        for lo in range(0, n, CHUNK):
+            at = slice(lo, lo + CHUNK) if positions is None else positions[lo:lo + CHUNK]
+            caps = self.max_miles[at]
+            for sid, fam, s, e, z, need, cap in zip(
+                self.ids[at].tolist(), self.family_ids[at].tolist(),
+                self.starts[at].tolist(), self.ends[at].tolist(),
+                self.zip_codes[at].tolist(), self.need_codes[at].tolist(),
+                np.where(np.isnan(caps), None, caps).tolist(),
+            ):
+                yield ShiftRow(sid, fam, s, e, self.zips[z], self.needs[need], cap)
+
+
+class Snapshot:
+    """
+    Everything one scheduler run reads, loaded up front:
+    shifts (ShiftColumns), index (EligibilityIndex of ProviderRows) and families (FamilyRow by id).
+    With a horizon, the index holds just the bookings the shifts can touch and their families' history.
+    """
+
+    def __init__(self, shifts: ShiftColumns, index: "EligibilityIndex", families: Dict[int, FamilyRow],
+                 build_ms: float = 0.0):
+        self.shifts = shifts
+        self.index = index
+        self.families = families
+        self.build_ms = build_ms
+
+    @classmethod
+    def load(
+        cls, session: Session, start: Optional[datetime] = None, end: Optional[datetime] = None,
+        extra: Sequence[ShiftRow] = (),
+    ) -> "Snapshot":
+        """
+        extra: shifts that aren't in the table (what-if runs, see scheduling.whatif); they aren't
+        added to shifts, but the index also covers their times and their families' history.
+        """
+        from server.scheduling.eligibility import EligibilityIndex
+
+        t = time.perf_counter()
+        shifts = ShiftColumns.load(session, start, end)
+        spans = ([shifts.span()] if len(shifts) else []) + [(sh.starts, sh.ends) for sh in extra]
+        if start is None and end is None:
+            index = EligibilityIndex.load(session)
+            families = load_families(session)
+        elif not spans:
+            index, families = EligibilityIndex([]), {}
+        else:
+            family_ids = shifts.family_set() | {sh.family_id for sh in extra}
+            window = (min(s for s, _ in spans), max(e for _, e in spans))
+            index = EligibilityIndex.load(session, window=window, family_ids=family_ids)
+            families = load_families(session, family_ids)
+        return cls(shifts, index, families, (time.perf_counter() - t) * 1000)
+
+    def zips(self) -> List[str]:
+        #every ZIP the run can measure between: provider homes and shift locations
+        return [p.home_zip for p in self.index.providers] + self.shifts.zips
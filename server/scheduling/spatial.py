@@ -0,0 +1,115 @@
+from __future__ import annotations
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from server.scheduling.geo import EARTH_RADIUS_MI, ZipGeo, normalize_zip
+from server.scheduling.snapshot import ProviderRow
+
+# Providers by home location: a KD-tree over the distinct home ZIP centroids of a roster, as unit vectors.
+# Straight-line (chord) distance between unit vectors orders points exactly like great-circle distance,
+# so nearest-k and radius queries on the tree are exact; miles are then read from ZipGeo as everywhere else.
+# Providers share ZIPs, so the tree holds one point per ZIP and each point lists its providers.
+FIRST_BATCH = 8  # ZIP points fetched by the first step of walk(); each further step fetches 4x as many
+MAX_CACHED_ORIGINS = 1024  # point_miles() rows kept per locator (shift ZIPs repeat a lot)
+
+
+def _unit(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    #radians -> (n, 3) points on the unit sphere
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def _chord(miles: float) -> float:
+    #great-circle miles -> straight-line distance on the unit sphere
+    return float(2.0 * np.sin(min(miles / (2.0 * EARTH_RADIUS_MI), np.pi / 2)))
+
+
+class ProviderLocator:
+    """
+    Nearest providers to a ZIP without scoring the whole roster.
+    Positions refer to the providers sequence it was built from (e.g. an EligibilityIndex pool), so
+    callers can combine them with per-position masks. Providers whose home ZIP is unknown aren't in
+    the tree; they are `unplaced`, at an unknown (inf) distance from everywhere.
+    - walk() / nearest() / within(): tree queries, for searches over a whole roster
+    - point_of + point_miles(): the same ZIP buckets as arrays, for callers that filter the roster first
+      (most of a pool isn't free for any given shift, so walking out past the busy ones costs more
+      than one vectorized distance row per shift ZIP)
+    """
+
+    def __init__(self, providers: Sequence[ProviderRow], geo: ZipGeo):
+        self.geo = geo
+        members: Dict[str, List[int]] = {}
+        self.unplaced: List[int] = []
+        for pos, p in enumerate(providers):
+            z = normalize_zip(p.home_zip)
+            if z in geo.row:
+                members.setdefault(z, []).append(pos)
+            else:
+                self.unplaced.append(pos)
+        self.zips = list(members)
+        self.members = [members[z] for z in self.zips]  # ascending positions per point
+        self.point_of = np.full(len(providers), -1, dtype=np.int64)
+        for i, positions in enumerate(self.members):
+            self.point_of[positions] = i
+        self._miles: Dict[str, np.ndarray] = {}
+        rows = np.array([geo.row[z] for z in self.zips], dtype=np.int64)
+        self._tree = cKDTree(_unit(geo.lat[rows], geo.lon[rows])) if self.zips else None
+
+    def __len__(self) -> int:
+        return len(self.zips)
+
+    def _origin(self, zip_code: str) -> Optional[np.ndarray]:
+        i = self.geo.row.get(normalize_zip(zip_code))
+        if i is None:
+            return None
+        return _unit(self.geo.lat[i:i + 1], self.geo.lon[i:i + 1])[0]
+
+    def point_miles(self, zip_code: str) -> np.ndarray:
+        #miles from zip_code to every point (inf if zip_code is unknown), memoized per ZIP
+        z = normalize_zip(zip_code)
+        found = self._miles.get(z)
+        if found is None:
+            if len(self._miles) >= MAX_CACHED_ORIGINS:
+                self._miles.clear()
+            found = self._miles[z] = self.geo.distances_from(z, self.zips)
+        return found
+
+    def walk(self, zip_code: str, max_miles: Optional[float] = None) -> Iterator[Tuple[float, List[int]]]:
+        """
+        (miles, positions) per home ZIP, nearest first, until the roster or max_miles runs out.
+        Fetches points in growing batches, so stopping after the first few touches only those.
+        Nothing for an unknown ZIP.
+        """
+        origin = self._origin(zip_code)
+        if origin is None or self._tree is None:
+            return
+        bound = np.inf if max_miles is None else _chord(max_miles) * (1 + 1e-9)
+        done, k = 0, FIRST_BATCH
+        while done < len(self.zips):
+            k = min(k, len(self.zips))
+            dist, idx = self._tree.query(origin, k=k, distance_upper_bound=bound)
+            dist, idx = np.atleast_1d(dist)[done:], np.atleast_1d(idx)[done:]
+            idx = idx[np.isfinite(dist)]
+            if len(idx):
+                miles = self.geo.distances_from(zip_code, [self.zips[i] for i in idx])
+                for i, m in zip(idx, miles):
+                    if max_miles is not None and m > max_miles:
+                        return
+                    yield float(m), self.members[i]
+            if len(idx) < k - done:
+                return  # the rest are past max_miles
+            done, k = k, k * 4
+
+    def nearest(self, zip_code: str, k: int, max_miles: Optional[float] = None) -> List[Tuple[int, float]]:
+        #the k nearest (position, miles), ties in position order
+        out: List[Tuple[int, float]] = []
+        for miles, positions in self.walk(zip_code, max_miles):
+            out.extend((pos, miles) for pos in positions[:k - len(out)])
+            if len(out) >= k:
+                break
+        return out
+
+    def within(self, zip_code: str, max_miles: float) -> List[Tuple[int, float]]:
+        #every (position, miles) within max_miles, nearest first
+        return [(pos, miles) for miles, positions in self.walk(zip_code, max_miles) for pos in positions]
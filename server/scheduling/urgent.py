@@ -0,0 +1,61 @@
+from __future__ import annotations
+from typing import List, NamedTuple, Optional
+import threading
+
+from sqlmodel import Session, select
+
+from server.models import Family, Shift
+from server.scheduling.eligibility import EligibilityIndex
+from server.scheduling.geo import ZipGeo
+from server.scheduling.optimal import CONTINUITY_BONUS
+from server.scheduling.snapshot import ProviderRow
+
+# Queues this process's urgent reservations in Python rather than on the database lock (see lock_family)
+reserve_lock = threading.Lock()
+
+
+def lock_family(session: Session, family_id: int) -> None:
+    """
+    Open the reservation's transaction holding a lock every other reservation for this family waits on,
+    in any process or worker: check-then-insert can't interleave. Held until commit or rollback.
+    Postgres: the family row, FOR UPDATE. SQLite has no row locks: BEGIN IMMEDIATE takes the database
+    write lock up front (busy_timeout makes the others wait), so the check reads after any earlier reservation.
+    Call it before the session has written anything.
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        session.exec(select(Family.id).where(Family.id == family_id).with_for_update()).first()
+    else:
+        session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+
+class Candidate(NamedTuple):
+    provider: ProviderRow
+    miles: float
+    past_visits: int
+    score: float
+
+
+def rank_candidates(
+    index: EligibilityIndex,
+    shift: Shift,
+    geo: ZipGeo,
+    k: int = 5,
+    family_id: Optional[int] = None,
+) -> List[Candidate]:
+    """
+    Top-k qualified, available, conflict-free providers for one shift, read from a warm index.
+    Score is miles minus CONTINUITY_BONUS when the provider has served this family before,
+    so a familiar face a few miles further out still ranks first. shift.max_miles, if set, caps the miles.
+    """
+    #candidates come nearest first, and a score is never below miles - CONTINUITY_BONUS: stop once the
+    #next one can't beat the k-th best, so only the providers near the shift get a conflict check
+    seen = index.history.get(family_id, {}) if family_id is not None else {}
+    ranked: List[Candidate] = []
+    for p, m in index.by_distance(shift, geo, shift.max_miles):
+        if len(ranked) >= k and m - CONTINUITY_BONUS > ranked[-1].score:
+            break
+        visits = seen.get(p.id, (0, None))[0]
+        ranked.append(Candidate(p, m, visits, m - (CONTINUITY_BONUS if visits else 0.0)))
+        ranked.sort(key=lambda c: (c.score, -c.past_visits, c.provider.id))
+        del ranked[k:]
+    return ranked
@@ -0,0 +1,144 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+from datetime import datetime
+import threading
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session as SASession
+from sqlmodel import Session, select
+
+from server.models import Provider, ProviderAvailability, Shift, Assignment
+from server.scheduling.eligibility import EligibilityIndex
+
+
+class ShiftWindow(NamedTuple):
+    #the four Shift fields EligibilityIndex.book()/unbook() read
+    id: int
+    family_id: Optional[int]
+    starts: datetime
+    ends: datetime
+
+
+class WarmIndex:
+    """
+    Process-wide EligibilityIndex that stays loaded between requests.
+    Kept current from committed ORM writes (see the session hooks below):
+    - Assignment insert/delete/re-point -> book/unbook in place
+    - Provider / ProviderAvailability writes -> that provider is re-read on next use
+    - Shift window edits or deletes -> full rebuild on next use (rare)
+    Core-level bulk writes bypass the hooks; callers doing those should call invalidate().
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._index: Optional[EligibilityIndex] = None
+        self._stale_providers: Set[int] = set()
+
+    @property
+    def loaded(self) -> bool:
+        return self._index is not None
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self._index = None
+            self._stale_providers.clear()
+
+    def get(self, session: Session) -> EligibilityIndex:
+        #callers hold self.lock while they read the returned index
+        with self.lock:
+            if self._index is None:
+                self._index = EligibilityIndex.load(session)
+                self._stale_providers.clear()
+            elif self._stale_providers:
+                self._index.refresh_providers(session, self._stale_providers)
+                self._stale_providers.clear()
+            return self._index
+
+    def apply(self, changes: Iterable[tuple]) -> None:
+        with self.lock:
+            idx = self._index
+            if idx is None:
+                return
+            for kind, *args in changes:
+                if kind == "book":
+                    idx.book(*args)
+                elif kind == "unbook":
+                    idx.unbook(*args)
+                elif kind == "provider":
+                    self._stale_providers.add(args[0])
+                elif kind == "rebuild":
+                    self._index = None
+                    self._stale_providers.clear()
+                    return
+
+
+warm_index = WarmIndex()
+
+
+# ---- session hooks: collect changes during flush, apply them only once the transaction commits ----
+
+def _windows(session: SASession, shift_ids: Set[int]) -> Dict[int, ShiftWindow]:
+    if not shift_ids:
+        return {}
+    rows = session.connection().execute(
+        select(Shift.id, Shift.family_id, Shift.starts, Shift.ends).where(Shift.id.in_(list(shift_ids)))
+    ).all()
+    return {r[0]: ShiftWindow(*r) for r in rows}
+
+
+@event.listens_for(SASession, "after_flush")
+def _collect(session: SASession, flush_context) -> None:
+    if not warm_index.loaded:
+        return
+    books: List[tuple] = []    # (provider_id, shift_id)
+    unbooks: List[tuple] = []
+    changes: List[tuple] = []
+
+    for obj in session.new:
+        if isinstance(obj, Assignment):
+            books.append((obj.provider_id, obj.shift_id))
+        elif isinstance(obj, (Provider, ProviderAvailability)):
+            changes.append(("provider", obj.id if isinstance(obj, Provider) else obj.provider_id))
+    for obj in session.deleted:
+        if isinstance(obj, Assignment):
+            unbooks.append((obj.provider_id, obj.shift_id))
+        elif isinstance(obj, ProviderAvailability):
+            changes.append(("provider", obj.provider_id))
+        elif isinstance(obj, (Provider, Shift)):
+            changes.append(("rebuild",))
+    for obj in session.dirty:
+        if isinstance(obj, Assignment):
+            state = inspect(obj)
+            pid_hist, sid_hist = state.attrs.provider_id.history, state.attrs.shift_id.history
+            if pid_hist.has_changes() or sid_hist.has_changes():
+                old_pid = (pid_hist.deleted or [obj.provider_id])[0]
+                old_sid = (sid_hist.deleted or [obj.shift_id])[0]
+                unbooks.append((old_pid, old_sid))
+                books.append((obj.provider_id, obj.shift_id))
+        elif isinstance(obj, Provider):
+            changes.append(("provider", obj.id))
+        elif isinstance(obj, ProviderAvailability):
+            changes.append(("provider", obj.provider_id))
+        elif isinstance(obj, Shift):
+            state = inspect(obj)
+            if state.attrs.starts.history.has_changes() or state.attrs.ends.history.has_changes():
+                changes.append(("rebuild",))
+
+    if books or unbooks:
+        wins = _windows(session, {sid for _, sid in books + unbooks if sid is not None})
+        changes += [("unbook", pid, wins[sid]) for pid, sid in unbooks if sid in wins]
+        changes += [("book", pid, wins[sid]) for pid, sid in books if sid in wins]
+    if changes:
+        session.info.setdefault("warm_changes", []).extend(changes)
+
+
+@event.listens_for(SASession, "after_commit")
+def _apply(session: SASession) -> None:
+    changes = session.info.pop("warm_changes", None)
+    if changes:
+        warm_index.apply(changes)
+
+
+@event.listens_for(SASession, "after_rollback")
+def _discard(session: SASession) -> None:
+    session.info.pop("warm_changes", None)
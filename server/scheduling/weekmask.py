@@ -0,0 +1,97 @@
+from __future__ import annotations
+from typing import Iterable, Sequence, Tuple
+from datetime import datetime, time
+from functools import lru_cache
+
+import numpy as np
+
+# Weekly availability as a bitmap: 7 x 96 fifteen-minute slots, slot 0 = Monday 00:00-00:15.
+# A provider's ProviderAvailability rows compile into one 672-bit int, a shift into the slots it touches,
+# and "available for the whole shift" is (week & need) == need - overnight and Sunday-into-Monday included.
+# Conservative at both ends: a window only counts for slots it fully contains, a shift needs every slot it touches.
+SLOT_SECONDS = 15 * 60
+SLOTS_PER_DAY = 24 * 3600 // SLOT_SECONDS
+WEEK_SLOTS = 7 * SLOTS_PER_DAY
+WORDS = (WEEK_SLOTS + 63) // 64  # 672 bits -> 11 uint64 words, 84 bytes per provider
+FULL = (1 << WEEK_SLOTS) - 1
+
+
+def _seconds(t: time) -> int:
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+
+def _span(first: int, count: int) -> int:
+    #count consecutive slots from first, wrapping past Sunday midnight back to Monday
+    if count <= 0:
+        return 0
+    if count >= WEEK_SLOTS:
+        return FULL
+    m = ((1 << count) - 1) << (first % WEEK_SLOTS)
+    return (m | (m >> WEEK_SLOTS)) & FULL
+
+
+def window_mask(weekday: int, start: time, end: time) -> int:
+    """
+    Slots one ProviderAvailability row covers. A window ending at or before its start
+    (22:00-06:00, 18:00-00:00) runs past midnight into the next day.
+    Only slots the window fully contains are set.
+    """
+    s, e = _seconds(start), _seconds(end)
+    if e <= s:
+        e += 24 * 3600
+    first = -(-s // SLOT_SECONDS)
+    return _span(weekday * SLOTS_PER_DAY + first, e // SLOT_SECONDS - first)
+
+
+def week_mask(windows: Iterable[Tuple[int, time, time]]) -> int:
+    #a provider's whole week from (weekday, start, end) rows; adjacent windows join up
+    m = 0
+    for weekday, start, end in windows:
+        m |= window_mask(weekday, start, end)
+    return m
+
+
+@lru_cache(maxsize=8192)
+def _shift_span(weekday: int, start_s: int, length_s: int) -> int:
+    first = start_s // SLOT_SECONDS
+    last = -(-(start_s + max(length_s, 1)) // SLOT_SECONDS)
+    return _span(weekday * SLOTS_PER_DAY + first, last - first)
+
+
+def shift_mask(starts: datetime, ends: datetime) -> int:
+    """Every slot [starts, ends) touches, across midnight and the week boundary; memoized per weekly pattern."""
+    return _shift_span(starts.weekday(), _seconds(starts.time()), int((ends - starts).total_seconds()))
+
+
+def covers(week: int, need: int) -> bool:
+    return week & need == need
+
+
+def to_words(mask: int) -> np.ndarray:
+    return np.frombuffer(mask.to_bytes(WORDS * 8, "little"), dtype="<u8")
+
+
+class WeekMatrix:
+    """
+    Many providers' week masks side by side, for "who is free for this window?" as one vectorized AND.
+    Stored word-major, (WORDS, n): a shift touches one to three of the 11 words, and each of those
+    is a contiguous row compared against all n providers at once.
+    """
+
+    __slots__ = ("words",)
+
+    def __init__(self, masks: Sequence[int]):
+        raw = b"".join(m.to_bytes(WORDS * 8, "little") for m in masks)
+        self.words = np.ascontiguousarray(np.frombuffer(raw, dtype="<u8").reshape(len(masks), WORDS).T)
+
+    def __len__(self) -> int:
+        return self.words.shape[1]
+
+    def free(self, need: int) -> np.ndarray:
+        #bool per column: does that provider's week cover every slot in need
+        need_words = to_words(need)
+        ok = np.ones(len(self), dtype=bool)
+        for w in np.flatnonzero(need_words):
+            nw = need_words[w]
+            ok &= (self.words[w] & nw) == nw
+        return ok
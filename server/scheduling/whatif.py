@@ -0,0 +1,271 @@
+"""
+What-if runs (POST /schedule/simulate): the scheduler against hypothetical changes, with no DB writes.
+
+One Snapshot is loaded per request and shared by every scenario. A scenario plans on a ScenarioIndex,
+a copy-on-write view of the snapshot's index:
+- reads go through to the base; a provider's bookings or a family's continuity history are copied
+  into the scenario the first time it books or unbooks them, and assigned shift ids are layered
+- deactivated providers drop out of its roster; added/removed availability replaces just those
+  providers' week masks
+- scenarios that leave the roster and weeks alone share the base's derived caches (skill pools,
+  week matrices, locators), so those are built once
+Existing bookings in the horizon stay, except that provisional ones are released first (as a real run
+would), and bookings a scenario makes impossible (provider deactivated, or no longer available for
+the shift) are displaced and their shifts planned again. Extra shifts get negative ids and are planned
+with the rest in (starts, id) order.
+The base is never written once scenarios start, so they run side by side on a thread pool
+(SIMULATION_WORKERS) without copying it. Each is diffed against the baseline: the same run, no changes.
+"""
+from __future__ import annotations
+import heapq
+import os
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlmodel import Session
+
+from server.models import Assignment, Shift
+from server.scheduling.eligibility import EligibilityIndex
+from server.scheduling.geo import ZipGeo
+from server.scheduling.intervals import BusyIntervals
+from server.scheduling.optimal import plan_optimal
+from server.scheduling.planner import plan_greedy
+from server.scheduling.snapshot import SHIFT_COLUMNS, ShiftRow, Snapshot, horizon
+
+SIMULATION_WORKERS = int(os.getenv("SIMULATION_WORKERS", "4"))
+MAX_SCENARIOS = 16
+DIFF_LIMIT = 500  # entries listed per kind of change; the counts are always complete
+
+_pool = ThreadPoolExecutor(max_workers=SIMULATION_WORKERS, thread_name_prefix="simulation")
+
+
+class _LayeredSet:
+    #a set read through to base, with this layer's additions and removals kept on the side
+    __slots__ = ("base", "added", "removed")
+
+    def __init__(self, base: Set[int]):
+        self.base = base
+        self.added: Set[int] = set()
+        self.removed: Set[int] = set()
+
+    def __contains__(self, item) -> bool:
+        return item in self.added or (item in self.base and item not in self.removed)
+
+    def add(self, item) -> None:
+        self.removed.discard(item)
+        if item not in self.base:
+            self.added.add(item)
+
+    def discard(self, item) -> None:
+        self.added.discard(item)
+        if item in self.base:
+            self.removed.add(item)
+
+    def update(self, items: Iterable) -> None:
+        for item in items:
+            self.add(item)
+
+    def __iter__(self) -> Iterator:
+        yield from self.added
+        for item in self.base:
+            if item not in self.removed:
+                yield item
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.base) - len(self.removed)
+
+
+class ScenarioIndex(EligibilityIndex):
+    """
+    Copy-on-write view of an EligibilityIndex for one scenario (see module doc).
+    The base's skill bits must already know every need the scenario plans for (simulate() registers
+    them up front), so concurrent scenarios only ever read it.
+    """
+
+    def __init__(self, base: EligibilityIndex, deactivate: Set[int] = frozenset(), weeks: Optional[Dict[int, int]] = None):
+        # no super().__init__(): every field reads through to base
+        self.base = base
+        self.bits, self.masks, self.window = base.bits, base.masks, base.window
+        self._roster = base._roster
+        if deactivate:
+            self.providers = [p for p in base.providers if p.id not in deactivate]
+            self.by_id = {p.id: p for p in self.providers}
+        else:
+            self.providers, self.by_id = base.providers, base.by_id
+        self.week = ChainMap(dict(weeks or {}), base.week)
+        if deactivate or weeks:
+            self._pools, self._pool_weeks, self._locators = {}, {}, {}
+        else:
+            self._pools, self._pool_weeks, self._locators = base._pools, base._pool_weeks, base._locators
+        self.busy = ChainMap({}, base.busy)
+        self.history = ChainMap({}, base.history)
+        self.assigned = _LayeredSet(base.assigned)
+
+    def _own(self, provider_id: Optional[int], family_id: Optional[int]) -> None:
+        #copy this provider's bookings and this family's history into the scenario before they change
+        if provider_id is not None and provider_id not in self.busy.maps[0]:
+            found = self.base.busy.get(provider_id)
+            self.busy.maps[0][provider_id] = found.copy() if found is not None else BusyIntervals()
+        if family_id is not None and family_id not in self.history.maps[0]:
+            self.history.maps[0][family_id] = dict(self.base.history.get(family_id, {}))
+
+    def _record(self, shift_id: Optional[int], provider_id: Optional[int], family_id: Optional[int],
+                starts: Optional[datetime], ends: Optional[datetime]) -> None:
+        if provider_id is not None and starts is not None:
+            self._own(provider_id, family_id)
+        super()._record(shift_id, provider_id, family_id, starts, ends)
+
+    def unbook(self, provider_id: int, shift: Shift) -> None:
+        self._own(provider_id, shift.family_id)
+        super().unbook(provider_id, shift)
+
+
+@dataclass
+class Scenario:
+    name: str
+    deactivate: Set[int] = field(default_factory=set)
+    weeks: Dict[int, int] = field(default_factory=dict)  # provider_id -> replacement weekly bitmap
+    extra: List[ShiftRow] = field(default_factory=list)  # hypothetical shifts, negative ids
+
+
+@dataclass
+class Outcome:
+    scenario: Scenario
+    providers: Dict[int, int]  # shift id -> provider id, bookings kept plus picks
+    miles: Dict[int, float]    # shift id -> miles, picks only
+    displaced: List[Tuple[int, int]]  # (shift id, provider id) bookings the scenario undid
+    shifts: int
+
+    @property
+    def filled(self) -> int:
+        return len(self.providers)
+
+    @property
+    def fill_rate(self) -> float:
+        return round(self.filled / self.shifts, 4) if self.shifts else 1.0
+
+
+Booking = Tuple[ShiftRow, int, str]  # (shift, provider id, status)
+
+
+def horizon_bookings(session: Session, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Booking]:
+    #the non-declined assignments of shifts starting in [start, end), in (starts, id) order
+    stmt = (
+        horizon(start, end, *SHIFT_COLUMNS, Assignment.provider_id, Assignment.status)
+        .join(Assignment, Assignment.shift_id == Shift.id)
+        .where(Assignment.status != "declined", Assignment.provider_id.is_not(None))
+        .order_by(Shift.starts, Shift.id)
+    )
+    return [(ShiftRow(*r[:7]), r[7], r[8]) for r in session.exec(stmt).all()]
+
+
+def _order(sh: ShiftRow) -> Tuple[datetime, int]:
+    return sh.starts, sh.id
+
+
+def _run(snap: Snapshot, open_pos: np.ndarray, held: List[Tuple[ShiftRow, int]], scenario: Scenario,
+         geo: ZipGeo, mode: str) -> Outcome:
+    index = ScenarioIndex(snap.index, scenario.deactivate, scenario.weeks)
+    displaced: List[Tuple[ShiftRow, int]] = []
+    for sh, pid in held:
+        if pid in scenario.deactivate or (pid in scenario.weeks and not index.is_available(pid, sh)):
+            index.unbook(pid, sh)
+            displaced.append((sh, pid))
+    providers = {sh.id: pid for sh, pid in held}
+    for sh, pid in displaced:
+        if providers.get(sh.id) == pid:
+            del providers[sh.id]
+    # a shift someone else still covers stays covered
+    replan = []
+    for sh, _ in displaced:
+        if sh.id in providers:
+            index.assigned.add(sh.id)
+        elif not replan or replan[-1].id != sh.id:
+            replan.append(sh)
+
+    shifts = heapq.merge(snap.shifts.rows(open_pos), replan, sorted(scenario.extra, key=_order), key=_order)
+    if mode == "optimal":
+        planned = plan_optimal(index, list(shifts), snap.families, geo)
+    else:
+        planned = plan_greedy(index, shifts, snap.families, geo)
+    miles = {}
+    for pk in planned:
+        providers[pk.shift.id] = pk.provider.id
+        miles[pk.shift.id] = pk.miles
+    return Outcome(
+        scenario, providers, miles, [(sh.id, pid) for sh, pid in displaced], len(snap.shifts) + len(scenario.extra),
+    )
+
+
+def _miles(m: Optional[float]) -> Optional[float]:
+    return None if m is None or m == float("inf") else round(m, 1)
+
+
+def _summary(out: Outcome) -> dict:
+    return {"shifts": out.shifts, "filled": out.filled, "fill_rate": out.fill_rate}
+
+
+def _diff(base: Outcome, out: Outcome) -> dict:
+    #what the scenario changes about the baseline plan, for the horizon's real shifts, plus its extra shifts
+    before, after = base.providers, out.providers
+    unfilled = sorted(sid for sid in before if sid not in after)
+    newly_filled = sorted(sid for sid in after if sid > 0 and sid not in before)
+    reassigned = sorted(sid for sid in after if sid in before and after[sid] != before[sid])
+    extra = [
+        {"index": i, "provider_id": after.get(sh.id), "miles": _miles(out.miles.get(sh.id))}
+        for i, sh in enumerate(out.scenario.extra)
+    ]
+    return {
+        "name": out.scenario.name,
+        **_summary(out),
+        "fill_rate_change": round(out.fill_rate - base.fill_rate, 4),
+        "changes": {
+            "displaced": len(out.displaced),
+            "unfilled": len(unfilled),
+            "newly_filled": len(newly_filled),
+            "reassigned": len(reassigned),
+        },
+        "displaced": [{"shift_id": sid, "provider_id": pid} for sid, pid in out.displaced[:DIFF_LIMIT]],
+        "unfilled": [{"shift_id": sid, "provider_id": before[sid]} for sid in unfilled[:DIFF_LIMIT]],
+        "newly_filled": [
+            {"shift_id": sid, "provider_id": after[sid], "miles": _miles(out.miles.get(sid))}
+            for sid in newly_filled[:DIFF_LIMIT]
+        ],
+        "reassigned": [
+            {"shift_id": sid, "from": before[sid], "to": after[sid], "miles": _miles(out.miles.get(sid))}
+            for sid in reassigned[:DIFF_LIMIT]
+        ],
+        "extra_shifts": extra,
+    }
+
+
+def simulate(snap: Snapshot, bookings: List[Booking], scenarios: List[Scenario], geo: ZipGeo,
+             mode: str = "greedy") -> dict:
+    """
+    Plan the baseline and each scenario on snap (see module doc); nothing is written anywhere.
+    snap must cover the scenarios' extra shifts (Snapshot.load(..., extra=...)) and geo their ZIPs.
+    snap.index is prepared here (provisional bookings released) and is only read after that.
+    """
+    base = snap.index
+    held: List[Tuple[ShiftRow, int]] = []
+    for sh, pid, status in bookings:
+        if status == "provisional":
+            base.unbook(pid, sh)
+        else:
+            held.append((sh, pid))
+    base.assigned.update(sh.id for sh, _ in held)  # released from a shift another booking still covers
+    for need in snap.shifts.needs + [sh.required_skills for sc in scenarios for sh in sc.extra]:
+        base.bits.need(need)
+    open_pos = snap.shifts.open_positions(base.assigned)
+
+    baseline = _run(snap, open_pos, held, Scenario("baseline"), geo, mode)
+    futures = [_pool.submit(_run, snap, open_pos, held, sc, geo, mode) for sc in scenarios]
+    return {
+        "mode": mode,
+        "baseline": _summary(baseline),
+        "scenarios": [_diff(baseline, fut.result()) for fut in futures],
+    }
@@ -0,0 +1,158 @@
+"""
+/ai/autogen generation against a local stand-in for the OpenAI server: an HTTP server on a free port
+answering /v1/chat/completions with the rows each prompt asks for, optionally after a delay.
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import AsyncOpenAI
+
+from server.routers import ai
+
+
+class StandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.delay = 0.0
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        srv = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with srv.lock:
+            srv.calls += 1
+            srv.in_flight += 1
+            srv.max_in_flight = max(srv.max_in_flight, srv.in_flight)
+        try:
+            time.sleep(srv.delay)
+            n_p, n_s = map(int, re.search(r"Generate (\d+) providers and (\d+) shifts", body["messages"][1]["content"]).groups())
+            content = json.dumps({
+                "providers": [
+                    {"name": f"Stand In {i}", "home_zip": "98107", "skills": "Doula", "active": True} for i in range(n_p)
+                ],
+                "shifts": [
+                    {"starts": "2026-01-05T13:00:00Z", "ends": "2026-01-05T21:00:00Z", "zip": "98107",
+                     "required_skills": "Doula"} for _ in range(n_s)
+                ],
+            })
+            reply = json.dumps({
+                "id": "chatcmpl-standin", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(reply)))
+            self.end_headers()
+            self.wfile.write(reply)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (timeout test)
+        finally:
+            with srv.lock:
+                srv.in_flight -= 1
+
+
+@pytest.fixture
+def standin(monkeypatch):
+    srv = StandIn()
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(ai, "_replies", ai._ReplyCache(ai.LLM_CACHE_SIZE))
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _request(n_providers: int, n_shifts: int) -> ai.AutoGenRequest:
+    # fixed window, so the same request makes the same prompts
+    return ai.AutoGenRequest(n_providers=n_providers, n_shifts=n_shifts,
+                             start=datetime(2026, 1, 5), end=datetime(2026, 1, 12))
+
+
+def _run(monkeypatch, srv: StandIn, coro_fn):
+    #a client per event loop: httpx connections can't move between loops
+    async def main():
+        client = AsyncOpenAI(api_key="test", base_url=srv.base_url, timeout=ai.LLM_TIMEOUT, max_retries=0)
+        monkeypatch.setattr(ai, "_client", client)
+        try:
+            return await coro_fn()
+        finally:
+            await client.close()
+    return asyncio.run(main())
+
+
+def test_timeout_falls_back_to_local_generator(standin, monkeypatch):
+    standin.delay = 2.0
+    monkeypatch.setattr(ai, "LLM_TIMEOUT", 0.3)
+    calls = []
+    real = ai._fallback_fake_data
+    monkeypatch.setattr(ai, "_fallback_fake_data", lambda payload: calls.append(payload) or real(payload))
+
+    t = time.perf_counter()
+    data, used_ai = _run(monkeypatch, standin, lambda: ai._generate(_request(5, 10)))
+    assert time.perf_counter() - t < 1.5
+    assert not used_ai
+    assert calls
+    assert (len(data["providers"]), len(data["shifts"])) == (5, 10)
+
+
+def test_chunks_respect_chunk_rows_and_concurrency(standin, monkeypatch):
+    standin.delay = 0.2
+    monkeypatch.setattr(ai, "LLM_CHUNK_ROWS", 10)
+    monkeypatch.setattr(ai, "LLM_CONCURRENCY", 2)
+
+    data, used_ai = _run(monkeypatch, standin, lambda: ai._generate(_request(20, 40)))
+    assert used_ai
+    assert standin.calls == 6  # 60 rows / 10 per chunk
+    assert standin.max_in_flight == 2
+    assert (len(data["providers"]), len(data["shifts"])) == (20, 40)
+
+
+def test_identical_prompt_is_served_from_cache(standin, monkeypatch):
+    first, _ = _run(monkeypatch, standin, lambda: ai._generate(_request(3, 6)))
+    calls = standin.calls
+    second, used_ai = _run(monkeypatch, standin, lambda: ai._generate(_request(3, 6)))
+    assert used_ai
+    assert standin.calls == calls
+    assert second == first
+
+
+def test_slow_generation_does_not_block_concurrent_request(standin, monkeypatch):
+    standin.delay = 1.0
+    slow_payload, fast_payload = _request(4, 4), _request(2, 2)
+
+    async def both():
+        slow = asyncio.ensure_future(ai._generate(slow_payload))
+        await asyncio.sleep(0.1)  # the slow call is in flight
+        standin.delay = 0.0
+        t = time.perf_counter()
+        fast, _ = await ai._generate(fast_payload)
+        fast_s = time.perf_counter() - t
+        return fast_s, slow.done(), await slow, fast
+
+    fast_s, slow_done_first, (slow, slow_ai), fast = _run(monkeypatch, standin, both)
+    assert fast_s < 0.5
+    assert not slow_done_first
+    assert slow_ai
+    assert len(fast["providers"]) == 2 and len(slow["providers"]) == 4